@@ -0,0 +1,195 @@
+"""
+Motor local de disponibilidade: horários livres por profissional.
+
+Combina o horário de funcionamento do salão (mesmo do KNOWLEDGE do prompt),
+a duração do serviço (`duracaoEmMinutos`) e os agendamentos de `/agendamentos`
+para calcular os próximos horários válidos, sem que o LLM precise fazer a
+aritmética de intervalos em várias chamadas de ferramenta.
+
+Datas sem fuso da API são interpretadas no horário de Brasília.
+"""
+import os
+from datetime import date, datetime, time, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+from zoneinfo import ZoneInfo
+
+from dotenv import load_dotenv
+
+from app.agent.search import fold
+
+load_dotenv()
+
+BRAZIL_TZ = ZoneInfo("America/Sao_Paulo")
+
+# weekday() -> (abertura, fechamento); Segunda à Sábado 14h–22h, Domingo 14h–20h
+BUSINESS_HOURS: Dict[int, Tuple[time, time]] = {
+    **{weekday: (time(14, 0), time(22, 0)) for weekday in range(6)},
+    6: (time(14, 0), time(20, 0)),
+}
+
+SLOT_STEP_MINUTES = int(os.getenv("SLOT_STEP_MINUTES", "30"))
+# Antecedência mínima para um horário sugerido a partir de agora
+SLOT_LEAD_MINUTES = int(os.getenv("SLOT_LEAD_MINUTES", "60"))
+DEFAULT_DURATION_MINUTES = int(os.getenv("SLOT_DEFAULT_DURATION_MINUTES", "60"))
+
+Interval = Tuple[datetime, datetime]
+
+
+def parse_datetime(value: Any) -> Optional[datetime]:
+    """ISO da API (com ou sem fuso) em datetime com fuso de Brasília."""
+    if isinstance(value, datetime):
+        parsed = value
+    elif isinstance(value, date):
+        parsed = datetime.combine(value, time.min)
+    else:
+        try:
+            parsed = datetime.fromisoformat(str(value).strip().replace("Z", "+00:00"))
+        except ValueError:
+            return None
+    if parsed.tzinfo is None:
+        return parsed.replace(tzinfo=BRAZIL_TZ)
+    return parsed.astimezone(BRAZIL_TZ)
+
+
+def format_datetime(value: datetime) -> str:
+    """Mesmo formato aceito por criar_agendamento_tool (horário local, sem fuso)."""
+    return value.astimezone(BRAZIL_TZ).replace(tzinfo=None).isoformat(timespec="seconds")
+
+
+def _to_minutes(value: Any) -> Optional[int]:
+    try:
+        minutes = int(float(value))
+    except (TypeError, ValueError):
+        return None
+    return minutes if minutes > 0 else None
+
+
+def _is_cancelled(item: Dict[str, Any]) -> bool:
+    status = item.get("status")
+    if isinstance(status, dict):
+        status = status.get("nome") or status.get("descricao")
+    return "cancel" in fold(status)
+
+
+def _professional_id(item: Dict[str, Any]) -> Optional[str]:
+    profissional = item.get("profissional")
+    if isinstance(profissional, dict) and profissional.get("id") is not None:
+        return str(profissional["id"])
+    if item.get("profissionalId") is not None:
+        return str(item["profissionalId"])
+    return None
+
+
+def busy_intervals(agendamentos: Iterable[Dict[str, Any]]) -> Dict[str, List[Interval]]:
+    """Intervalos ocupados por profissional, ordenados e já mesclados."""
+    busy: Dict[str, List[Interval]] = {}
+    for item in agendamentos:
+        if not isinstance(item, dict) or _is_cancelled(item):
+            continue
+        profissional_id = _professional_id(item)
+        start = parse_datetime(item.get("dataHoraInicio"))
+        if profissional_id is None or start is None:
+            continue
+        end = parse_datetime(item.get("dataHoraFim")) if item.get("dataHoraFim") else None
+        if end is None or end <= start:
+            minutes = _to_minutes(item.get("duracaoEmMinutos")) or DEFAULT_DURATION_MINUTES
+            end = start + timedelta(minutes=minutes)
+        busy.setdefault(profissional_id, []).append((start, end))
+
+    for profissional_id, intervals in busy.items():
+        intervals.sort()
+        merged: List[Interval] = [intervals[0]]
+        for start, end in intervals[1:]:
+            if start <= merged[-1][1]:
+                merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+            else:
+                merged.append((start, end))
+        busy[profissional_id] = merged
+    return busy
+
+
+def _round_up(value: datetime, step: int) -> datetime:
+    value = value.replace(second=0, microsecond=0)
+    remainder = (value.hour * 60 + value.minute) % step
+    return value + timedelta(minutes=step - remainder) if remainder else value
+
+
+def free_slots(
+    busy: Sequence[Interval],
+    duration: int,
+    start: datetime,
+    days: int = 7,
+    limit: int = 3,
+    step: int = SLOT_STEP_MINUTES,
+) -> List[Interval]:
+    """Próximos `limit` horários livres de `duration` minutos a partir de `start`."""
+    slots: List[Interval] = []
+    length = timedelta(minutes=duration)
+    start = start.astimezone(BRAZIL_TZ)
+    pos = 0  # busy está ordenado: avança junto com o candidato
+
+    for offset in range(days):
+        day = start.date() + timedelta(days=offset)
+        hours = BUSINESS_HOURS.get(day.weekday())
+        if hours is None:
+            continue
+        opening = datetime.combine(day, hours[0], tzinfo=BRAZIL_TZ)
+        closing = datetime.combine(day, hours[1], tzinfo=BRAZIL_TZ)
+        candidate = _round_up(max(opening, start), step)
+
+        while candidate + length <= closing:
+            while pos < len(busy) and busy[pos][1] <= candidate:
+                pos += 1
+            if pos < len(busy) and busy[pos][0] < candidate + length:
+                # Conflito: pula para o fim do agendamento que ocupa o horário
+                candidate = _round_up(busy[pos][1], step)
+                continue
+            slots.append((candidate, candidate + length))
+            if len(slots) >= limit:
+                return slots
+            candidate += timedelta(minutes=step)
+    return slots
+
+
+def suggest_slots(
+    agendamentos: Iterable[Dict[str, Any]],
+    profissionais: Sequence[Dict[str, Any]],
+    duration: int,
+    start: Optional[datetime] = None,
+    days: int = 7,
+    limit: int = 3,
+    now: Optional[datetime] = None,
+) -> List[Dict[str, Any]]:
+    """Próximos `limit` horários (qualquer profissional da lista), do mais cedo ao mais tarde."""
+    now = (now or datetime.now(BRAZIL_TZ)).astimezone(BRAZIL_TZ)
+    earliest = now + timedelta(minutes=SLOT_LEAD_MINUTES)
+    start = max(start.astimezone(BRAZIL_TZ), earliest) if start else earliest
+
+    busy = busy_intervals(agendamentos)
+    candidates: List[Tuple[datetime, int, Dict[str, Any]]] = []
+    for order, profissional in enumerate(profissionais):
+        profissional_id = str(profissional.get("id"))
+        for slot_start, slot_end in free_slots(
+            busy.get(profissional_id, []), duration, start, days=days, limit=limit
+        ):
+            slot = {
+                "profissionalId": profissional_id,
+                "dataHoraInicio": format_datetime(slot_start),
+                "dataHoraFim": format_datetime(slot_end),
+            }
+            if profissional.get("nome"):
+                slot["profissional"] = profissional["nome"]
+            candidates.append((slot_start, order, slot))
+
+    candidates.sort(key=lambda c: (c[0], c[1]))
+    return [slot for _, _, slot in candidates[:limit]]
+
+
+__all__ = [
+    "BUSINESS_HOURS",
+    "busy_intervals",
+    "format_datetime",
+    "free_slots",
+    "parse_datetime",
+    "suggest_slots",
+]
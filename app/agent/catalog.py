@@ -0,0 +1,277 @@
+"""
+Cache compartilhado do catálogo do salão (serviços e profissionais).
+
+O catálogo muda raramente, então as respostas de /servicos, /profissionais e
+/profissionais/{id}/servicos são guardadas por ESTABELECIMENTO_ID com TTL e
+stale-while-revalidate, e persistidas em um snapshot compacto (JSON gzip)
+para que até um processo frio comece com o catálogo aquecido.
+
+O snapshot não é regravado a cada set: as mudanças são juntadas e gravadas
+uma vez CATALOG_SNAPSHOT_DELAY segundos depois (ou no fim do refresh_all e na
+saída do processo). Respostas HTTP 200 com {"error": ...} não entram no cache.
+"""
+import os
+import gzip
+import atexit
+import json
+import time
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlencode
+
+from dotenv import load_dotenv
+
+from app.utils.http_client import get_http_client
+from app.utils.logger import get_logger
+
+load_dotenv()
+
+logger = get_logger(__name__)
+
+CATALOG_TTL_SECONDS = float(os.getenv("CATALOG_TTL_SECONDS", str(6 * 3600)))
+CATALOG_STALE_SECONDS = float(os.getenv("CATALOG_STALE_SECONDS", str(7 * 24 * 3600)))
+CATALOG_REFRESH_SECONDS = float(os.getenv("CATALOG_REFRESH_SECONDS", str(30 * 60)))
+CATALOG_CACHE_DIR = os.getenv("CATALOG_CACHE_DIR", ".cache")
+CATALOG_PAGE_SIZE = int(os.getenv("CATALOG_PAGE_SIZE", "100"))
+CATALOG_MAX_PAGES = int(os.getenv("CATALOG_MAX_PAGES", "20"))
+CATALOG_SNAPSHOT_DELAY = float(os.getenv("CATALOG_SNAPSHOT_DELAY", "2"))
+
+SNAPSHOT_VERSION = 1
+
+Loader = Callable[[], Dict[str, Any]]
+
+
+def _is_error(value: Any) -> bool:
+    """Corpo de erro da API (mesmo com HTTP 200): não vai para o cache."""
+    return isinstance(value, dict) and value.get("error") is not None
+
+
+class CatalogCache:
+    """Cache TTL + stale-while-revalidate com snapshot em disco."""
+
+    def __init__(
+        self,
+        estabelecimento_id: str,
+        path: Optional[str] = None,
+        ttl: float = CATALOG_TTL_SECONDS,
+        stale_ttl: float = CATALOG_STALE_SECONDS,
+        clock: Callable[[], float] = time.time,
+        snapshot_delay: float = CATALOG_SNAPSHOT_DELAY,
+    ) -> None:
+        self.estabelecimento_id = estabelecimento_id or "default"
+        self.path = path or os.path.join(
+            CATALOG_CACHE_DIR, f"svim_catalog_{self.estabelecimento_id}.json.gz"
+        )
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self._clock = clock
+        self._entries: Dict[str, Tuple[float, Dict[str, Any]]] = {}
+        self._loaders: Dict[str, Loader] = {}
+        self._refreshing: set[str] = set()
+        self._lock = threading.RLock()
+        self._refresher: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self.snapshot_delay = snapshot_delay
+        self._dirty = False
+        self._snapshot_timer: Optional[threading.Timer] = None
+        self._snapshot_lock = threading.Lock()
+        self.load_snapshot()
+        atexit.register(self.flush_snapshot)
+
+    def get(self, key: str, loader: Loader) -> Dict[str, Any]:
+        """Devolve o valor do cache, revalidando em background se estiver velho."""
+        with self._lock:
+            self._loaders[key] = loader
+            entry = self._entries.get(key)
+
+        if entry is not None:
+            fetched_at, value = entry
+            age = self._clock() - fetched_at
+            if age < self.ttl:
+                return value
+            if age < self.ttl + self.stale_ttl:
+                self._refresh_in_background(key)
+                return value
+
+        value = loader()
+        if not _is_error(value):
+            self.set(key, value)
+        return value
+
+    def set(self, key: str, value: Dict[str, Any]) -> None:
+        with self._lock:
+            self._entries[key] = (self._clock(), value)
+        self._schedule_snapshot()
+
+    def _schedule_snapshot(self) -> None:
+        """Marca o snapshot como sujo; uma única gravação cobre os sets da janela."""
+        with self._lock:
+            self._dirty = True
+            if self._snapshot_timer is not None:
+                return
+            timer = self._snapshot_timer = threading.Timer(self.snapshot_delay, self.flush_snapshot)
+            timer.daemon = True
+        timer.start()
+
+    def flush_snapshot(self) -> None:
+        """Grava o snapshot agora se houver mudanças pendentes."""
+        with self._snapshot_lock:
+            with self._lock:
+                timer, self._snapshot_timer = self._snapshot_timer, None
+                dirty, self._dirty = self._dirty, False
+            if timer is not None:
+                timer.cancel()
+            if dirty:
+                self.save_snapshot()
+
+    def peek(self, key: str) -> Optional[Dict[str, Any]]:
+        """Valor atual do cache (mesmo que velho), sem disparar carga."""
+        with self._lock:
+            entry = self._entries.get(key)
+        return entry[1] if entry else None
+
+    def refresh(self, key: str) -> bool:
+        """Recarrega uma chave; em caso de erro mantém o valor anterior."""
+        loader = self._loaders.get(key)
+        if loader is None:
+            return False
+        try:
+            value = loader()
+            if _is_error(value):
+                logger.warning("[catalog] refresh com erro key=%s error=%s", key, value.get("error"))
+                return False
+            self.set(key, value)
+            return True
+        except Exception as exc:
+            logger.warning("[catalog] refresh falhou key=%s error=%s", key, exc)
+            return False
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def refresh_all(self) -> None:
+        with self._lock:
+            keys = list(self._loaders)
+        for key in keys:
+            self.refresh(key)
+        self.flush_snapshot()
+
+    def _refresh_in_background(self, key: str) -> None:
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+        threading.Thread(
+            target=self.refresh, args=(key,), name=f"catalog-refresh:{key}", daemon=True
+        ).start()
+
+    def start_background_refresh(self, interval: float = CATALOG_REFRESH_SECONDS) -> None:
+        """Mantém o catálogo atualizado periodicamente (processos residentes)."""
+        if self._refresher is not None and self._refresher.is_alive():
+            return
+        self._stop.clear()
+
+        def _loop() -> None:
+            while not self._stop.wait(interval):
+                self.refresh_all()
+
+        self._refresher = threading.Thread(target=_loop, name="catalog-refresher", daemon=True)
+        self._refresher.start()
+
+    def stop_background_refresh(self) -> None:
+        self._stop.set()
+
+    def load_snapshot(self) -> None:
+        try:
+            with gzip.open(self.path, "rt", encoding="utf-8") as fh:
+                snapshot = json.load(fh)
+        except FileNotFoundError:
+            return
+        except Exception as exc:
+            logger.warning("[catalog] snapshot inválido path=%s error=%s", self.path, exc)
+            return
+        if (
+            snapshot.get("version") != SNAPSHOT_VERSION
+            or snapshot.get("estabelecimento_id") != self.estabelecimento_id
+        ):
+            return
+        with self._lock:
+            for key, (fetched_at, value) in snapshot.get("entries", {}).items():
+                self._entries.setdefault(key, (float(fetched_at), value))
+        logger.info("[catalog] snapshot carregado entries=%s", len(self._entries))
+
+    def save_snapshot(self) -> None:
+        with self._lock:
+            snapshot = {
+                "version": SNAPSHOT_VERSION,
+                "estabelecimento_id": self.estabelecimento_id,
+                "entries": {k: [ts, v] for k, (ts, v) in self._entries.items()},
+            }
+        tmp_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with gzip.open(tmp_path, "wt", encoding="utf-8") as fh:
+                json.dump(snapshot, fh, ensure_ascii=False, separators=(",", ":"))
+            os.replace(tmp_path, self.path)
+        except OSError as exc:
+            logger.warning("[catalog] não foi possível salvar snapshot: %s", exc)
+
+
+def catalog_key(path: str, params: Optional[Dict[str, Any]] = None) -> str:
+    query = urlencode(sorted((k, v) for k, v in (params or {}).items() if v is not None))
+    return f"{path}?{query}" if query else path
+
+
+_caches: Dict[str, CatalogCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_catalog_cache() -> CatalogCache:
+    estabelecimento_id = os.getenv("ESTABELECIMENTO_ID", "") or "default"
+    with _caches_lock:
+        cache = _caches.get(estabelecimento_id)
+        if cache is None:
+            cache = _caches[estabelecimento_id] = CatalogCache(estabelecimento_id)
+        return cache
+
+
+def catalog_get(path: str, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """GET no catálogo da API passando pelo cache compartilhado."""
+    return get_catalog_cache().get(
+        catalog_key(path, params),
+        lambda: get_http_client().get(path, params=params),
+    )
+
+
+def catalog_get_all(
+    path: str,
+    params: Optional[Dict[str, Any]] = None,
+    page_size: int = CATALOG_PAGE_SIZE,
+) -> Tuple[Tuple[Dict[str, Any], ...], List[Dict[str, Any]]]:
+    """Todas as páginas de um recurso do catálogo (cada página vem do cache).
+
+    Devolve as respostas de cada página (para detectar recarga por identidade)
+    e a lista concatenada de itens.
+    """
+    pages: List[Dict[str, Any]] = []
+    items: List[Dict[str, Any]] = []
+    for page in range(1, CATALOG_MAX_PAGES + 1):
+        resp = catalog_get(path, {**(params or {}), "page": page, "pageSize": page_size})
+        pages.append(resp)
+        data = resp.get("data") if isinstance(resp, dict) else None
+        if not isinstance(data, list):
+            break
+        items.extend(data)
+        total = resp.get("total")
+        if len(data) < page_size or (isinstance(total, int) and len(items) >= total):
+            break
+    return tuple(pages), items
+
+
+__all__ = [
+    "CatalogCache",
+    "catalog_get",
+    "catalog_get_all",
+    "catalog_key",
+    "get_catalog_cache",
+]
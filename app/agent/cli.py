@@ -0,0 +1,86 @@
+"""
+Conversa com a Maria no terminal, com a resposta impressa enquanto é gerada.
+
+Os logs do agente ([SVIM] ...) vão para o stderr; o stdout recebe só o texto
+da resposta, pedaço a pedaço (via stream_turn).
+
+Uso:
+    python -m app.agent.cli "quero marcar um corte" [--client-id 1] [--session-id s1]
+    python -m app.agent.cli                  # modo interativo, uma mensagem por linha
+"""
+import sys
+import json
+import asyncio
+import argparse
+from contextlib import redirect_stdout
+from typing import Any, Dict, Optional, TextIO
+
+from app.agent.main import RATE_LIMIT_FALLBACK, is_rate_limit_error, stream_turn
+from app.utils.write_behind import get_write_behind
+
+
+async def chat(
+    message: str,
+    out: TextIO,
+    client_id: Optional[str] = None,
+    session_id: Optional[str] = None,
+) -> Dict[str, Any]:
+    """Escreve os deltas em `out` conforme chegam e devolve o resultado do turno."""
+    result: Dict[str, Any] = {}
+    streamed = False
+    try:
+        with redirect_stdout(sys.stderr):
+            async for event, data in stream_turn(
+                message, client_id=client_id, session_id=session_id
+            ):
+                if event == "delta":
+                    out.write(data["text"])
+                    out.flush()
+                    streamed = True
+                else:
+                    result = data
+    except Exception as exc:
+        if not is_rate_limit_error(exc):
+            raise
+        result = dict(RATE_LIMIT_FALLBACK)
+    if not streamed and result.get("reply"):
+        out.write(str(result["reply"]))
+    out.write("\n")
+    out.flush()
+    return result
+
+
+async def _repl(args: argparse.Namespace, out: TextIO) -> None:
+    loop = asyncio.get_running_loop()
+    while True:
+        line = await loop.run_in_executor(None, sys.stdin.readline)
+        if not line:
+            return
+        if line.strip():
+            await chat(line.strip(), out, args.client_id, args.session_id)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("message", nargs="?", help="sem mensagem, lê uma por linha do stdin")
+    parser.add_argument("--client-id", default="cli")
+    parser.add_argument("--session-id", default="cli")
+    parser.add_argument(
+        "--json", action="store_true", help="imprime também o resultado completo do turno"
+    )
+    args = parser.parse_args()
+
+    out = sys.stdout
+    try:
+        if args.message:
+            result = asyncio.run(chat(args.message, out, args.client_id, args.session_id))
+            if args.json:
+                print(json.dumps(result, ensure_ascii=False), file=out)
+        else:
+            asyncio.run(_repl(args, out))
+    finally:
+        get_write_behind().close()
+
+
+if __name__ == "__main__":
+    main()
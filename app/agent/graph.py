@@ -1,30 +1,43 @@
 import os
 import json
+import time
+import hashlib
+import threading
 from collections import defaultdict
-from typing import Any, Dict, List, Optional
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
 from dotenv import load_dotenv
 from typing_extensions import Annotated, TypedDict
 from datetime import datetime
 from zoneinfo import ZoneInfo
 
-from langchain_openai import ChatOpenAI
 from langchain_core.messages import BaseMessage, SystemMessage, ToolMessage, RemoveMessage
 from langchain_core.runnables import RunnableConfig
+from langchain_core.runnables.config import run_in_executor
 from langchain_core.tools import BaseTool
 
-from langgraph.graph import StateGraph, END
 from langgraph.graph.message import add_messages, REMOVE_ALL_MESSAGES
-from langgraph.prebuilt import create_react_agent
-from langgraph.checkpoint.memory import MemorySaver
-
-from app.agent.tools import (
-    criar_agendamento_tool,
-    listar_agendamentos_tool,
-    listar_servicos_tool,
-    listar_servicos_profissional_tool,
-    listar_profissionais_tool,
+
+from app.agent.router import (
+    MODEL,
+    ROUTE_AGENT,
+    ROUTE_SMALL,
+    SMALL_MODEL,
+    RouteStats,
+    awaits_answer,
+    classify_intent,
+    messages_cost,
+    route_for,
 )
-from app.utils.qdrant import QdrantMemory
+from app.agent.tool_result import ToolResult, id_key
+from app.agent.tool_state import ThreadToolState, ToolStateStore
+from app.utils.token_budget import ContextBudget
+from app.utils.write_behind import get_write_behind
+
+if TYPE_CHECKING:
+    from langchain_core.language_models import BaseChatModel
+    from langgraph.checkpoint.base import BaseCheckpointSaver
+    from langgraph.graph.state import CompiledStateGraph
+    from app.utils.qdrant import QdrantMemory
 
 load_dotenv()
 
@@ -37,30 +50,53 @@ qdrant_collection = os.getenv("QDRANT_COLLECTION", "svim_conversations")
 embedding_model = os.getenv("EMBEDDINGS_MODEL", "text-embedding-3-small")
 qdrant_vector_size = int(os.getenv("QDRANT_VECTOR_SIZE", "1536"))
 brazil_timezone = ZoneInfo("America/Sao_Paulo")
-now_in_brazil = datetime.now(brazil_timezone)
-
-# Format the time into an ISO 8601 string
-iso_format_brazil = now_in_brazil.isoformat()
 
 
-MAX_HISTORY_CHARS = 4000
-MAX_STORE_CHARS = 1500
+# Trecho de cada mensagem gravado na memória (embedding)
+MAX_STORE_TOKENS = int(os.getenv("MAX_STORE_TOKENS", "400"))
 MAX_TOOL_CALLS = int(os.getenv("MAX_TOOL_CALLS_PER_TOOL", "5"))
+PROMPT_CACHE_KEY = os.getenv("PROMPT_CACHE_KEY", "svim-maria")
+
+# Modelo, memória, agente e grafo são criados no primeiro uso (get_*): importar
+# este módulo não carrega openai/qdrant_client nem faz chamadas de rede.
+_lazy_lock = threading.RLock()
+_memory: Optional["QdrantMemory"] = None
+_memory_ready = False
+_model: Optional["BaseChatModel"] = None
+_small_model: Optional["BaseChatModel"] = None
+_tools: Optional[List[BaseTool]] = None
+_agent: Any = None
+_budget: Optional[ContextBudget] = None
+_tool_schema_tokens: Optional[int] = None
+_graph: Optional["CompiledStateGraph"] = None
+
+
+def get_memory() -> Optional["QdrantMemory"]:
+    """QdrantMemory do processo, ou None se QDRANT_URL não estiver definido."""
+    global _memory, _memory_ready
+    if _memory_ready:
+        return _memory
+    with _lazy_lock:
+        if not _memory_ready:
+            if os.getenv("QDRANT_URL"):
+                from app.utils.qdrant import QdrantMemory
+
+                _memory = QdrantMemory(
+                    collection_name=qdrant_collection,
+                    embedding_model=embedding_model,
+                    vector_size=qdrant_vector_size,
+                )
+                get_write_behind().register("memory", _memory.store_batch)
+            _memory_ready = True
+    return _memory
 
-memory: Optional[QdrantMemory] = None
 
-if os.getenv("QDRANT_URL"):
-    memory = QdrantMemory(
-        collection_name=qdrant_collection,
-        embedding_model=embedding_model,
-        vector_size=qdrant_vector_size,
-    )
+# Contadores, cache e ids por thread_id: LRU + TTL com teto de memória
+_tool_state = ToolStateStore()
 
-_tool_call_counts: defaultdict[str, defaultdict[str, int]] = defaultdict(
-    lambda: defaultdict(int)
-)
-_tool_cache: defaultdict[str, dict[str, Any]] = defaultdict(dict)
-_tool_last_ids: defaultdict[str, dict[str, set[str]]] = defaultdict(dict)
+
+def tool_state_stats() -> Dict[str, Any]:
+    return _tool_state.stats()
 
 
 def _thread_id_from_config(config: RunnableConfig | None) -> str:
@@ -72,163 +108,129 @@ def _thread_id_from_config(config: RunnableConfig | None) -> str:
 
 
 def _reset_tool_counts(thread_id: str) -> None:
-    _tool_call_counts.pop(thread_id, None)
-    _tool_cache.pop(thread_id, None)
-    _tool_last_ids.pop(thread_id, None)
+    _tool_state.reset(thread_id)
     print(f"[SVIM] tool counters reset for thread_id={thread_id!r}")
 
 
+# Listagens cujos ids valem para servicoId / profissionalId em criar_agendamento_tool
+_SERVICO_ID_TOOLS = ("listar_servicos_tool", "listar_servicos_profissional_tool")
+_PROFISSIONAL_ID_TOOLS = (
+    "listar_profissionais_tool",
+    "listar_profissionais_servico_tool",
+    "sugerir_horarios_tool",
+)
+
+# Ferramentas cujos ids são guardados para validar o agendamento, e o campo
+# lido de cada item de `data`; as demais (ex.: agendamentos) não pagam a extração.
+_ID_FIELDS = {
+    "listar_servicos_tool": "id",
+    "listar_servicos_profissional_tool": "id",
+    "listar_profissionais_tool": "id",
+    "listar_profissionais_servico_tool": "id",
+    "sugerir_horarios_tool": "profissionalId",
+}
+
+
 def _limit_tool_calls(tool: BaseTool) -> BaseTool:
-    """Wrap tool to guard against repeated calls in uma única solicitação."""
+    """Wrap tool to guard against repeated calls in uma única solicitação.
+
+    invoke e ainvoke compartilham _begin/_finish; só a chamada da ferramenta
+    difere. A resposta vira um ToolResult uma vez (erro e ids saem do payload)
+    e o texto para o LLM é gerado só ao montar a ToolMessage.
+    """
     original_invoke = tool.invoke
     original_ainvoke = tool.ainvoke
+    id_field = _ID_FIELDS.get(tool.name)
+
+    def _message(call_id: str, result: ToolResult, label: str | None = "result") -> ToolMessage:
+        content = result.content
+        if label:
+            preview = content[:400].replace("\n", " ")
+            print(f"[SVIM] tool {label} name={tool.name} result={preview}")
+        return ToolMessage(
+            content=content,
+            name=tool.name,
+            tool_call_id=call_id,
+            status="error" if result.is_error else "success",
+        )
 
-    def _store_ids(thread_id: str, tool_name: str, resp: Any) -> None:
-        if not isinstance(resp, str):
-            return
-        try:
-            parsed = json.loads(resp)
-        except Exception:
+    def _store_ids(thread_id: str, result: ToolResult) -> None:
+        if id_field is None:
             return
-        if not isinstance(parsed, dict) or parsed.get("error"):
-            return
-        data = parsed.get("data")
-        if not isinstance(data, list):
-            return
-        ids = {str(item.get("id")) for item in data if isinstance(item, dict) and item.get("id")}
-        if not ids:
-            return
-        _tool_last_ids[thread_id][tool_name] = ids
+        ids = result.ids(id_field)
+        if ids:
+            _tool_state.put_ids(thread_id, tool.name, ids)
 
-    def _validate_agendamento_args(thread_id: str, payload: dict[str, Any]) -> ToolMessage | None:
+    def _validate_agendamento_args(thread_id: str, payload: dict[str, Any]) -> dict[str, Any] | None:
         servico_id = str(payload.get("servicoId") or "")
         profissional_id = str(payload.get("profissionalId") or "")
 
-        servico_ids = set()
-        servico_ids.update(_tool_last_ids[thread_id].get("listar_servicos_tool", set()))
-        servico_ids.update(_tool_last_ids[thread_id].get("listar_servicos_profissional_tool", set()))
-        profissional_ids = _tool_last_ids[thread_id].get("listar_profissionais_tool", set())
+        state = _tool_state.peek(thread_id)
+        servico_ids = state.known_ids(_SERVICO_ID_TOOLS) if state else set()
+        profissional_ids = state.known_ids(_PROFISSIONAL_ID_TOOLS) if state else set()
 
         print(
             "[SVIM] agendamento validate "
             f"servico_id={servico_id!r} profissional_id={profissional_id!r} "
-            f"servicos_listar={len(_tool_last_ids[thread_id].get('listar_servicos_tool', set()))} "
-            f"servicos_profissional={len(_tool_last_ids[thread_id].get('listar_servicos_profissional_tool', set()))} "
-            f"profissionais={len(profissional_ids)}"
+            f"servicos={len(servico_ids)} profissionais={len(profissional_ids)}"
         )
 
         if not servico_ids:
-            return ToolMessage(
-                content=json.dumps(
-                    {
-                        "error": "SERVICO_ID_NAO_LISTADO",
-                        "message": "Liste os serviços e use o id do serviço retornado.",
-                    },
-                    ensure_ascii=False,
-                    separators=(",", ":"),
-                ),
-                name=tool.name,
-                tool_call_id=str(payload.get("id") or thread_id),
-                status="error",
-            )
+            return {
+                "error": "SERVICO_ID_NAO_LISTADO",
+                "message": "Liste os serviços e use o id do serviço retornado.",
+            }
         if not profissional_ids:
-            return ToolMessage(
-                content=json.dumps(
-                    {
-                        "error": "PROFISSIONAL_ID_NAO_LISTADO",
-                        "message": "Liste os profissionais e use o id do profissional retornado.",
-                    },
-                    ensure_ascii=False,
-                    separators=(",", ":"),
-                ),
-                name=tool.name,
-                tool_call_id=str(payload.get("id") or thread_id),
-                status="error",
-            )
-
-        if servico_id not in servico_ids:
-            return ToolMessage(
-                content=json.dumps(
-                    {
-                        "error": "SERVICO_ID_INVALIDO",
-                        "message": "servicoId precisa ser um id retornado pela listagem",
-                        "value": servico_id,
-                    },
-                    ensure_ascii=False,
-                    separators=(",", ":"),
-                ),
-                name=tool.name,
-                tool_call_id=str(payload.get("id") or thread_id),
-                status="error",
-            )
-        if profissional_id not in profissional_ids:
-            return ToolMessage(
-                content=json.dumps(
-                    {
-                        "error": "PROFISSIONAL_ID_INVALIDO",
-                        "message": "profissionalId precisa ser um id retornado pela listagem",
-                        "value": profissional_id,
-                    },
-                    ensure_ascii=False,
-                    separators=(",", ":"),
-                ),
-                name=tool.name,
-                tool_call_id=str(payload.get("id") or thread_id),
-                status="error",
-            )
+            return {
+                "error": "PROFISSIONAL_ID_NAO_LISTADO",
+                "message": "Liste os profissionais e use o id do profissional retornado.",
+            }
+        if id_key(servico_id) not in servico_ids:
+            return {
+                "error": "SERVICO_ID_INVALIDO",
+                "message": "servicoId precisa ser um id retornado pela listagem",
+                "value": servico_id,
+            }
+        if id_key(profissional_id) not in profissional_ids:
+            return {
+                "error": "PROFISSIONAL_ID_INVALIDO",
+                "message": "profissionalId precisa ser um id retornado pela listagem",
+                "value": profissional_id,
+            }
         return None
 
-    def _is_error_response(resp: Any) -> bool:
-        if isinstance(resp, ToolMessage):
-            return getattr(resp, "status", "") == "error"
-        if isinstance(resp, str):
-            try:
-                parsed = json.loads(resp)
-                return isinstance(parsed, dict) and bool(parsed.get("error"))
-            except Exception:
-                return False
-        return False
-
-    def _exceeded(thread_id: str) -> bool:
-        return _tool_call_counts[thread_id][tool.name] >= MAX_TOOL_CALLS
-
-    def _bump(thread_id: str) -> None:
-        _tool_call_counts[thread_id][tool.name] += 1
+    def _exceeded(state: ThreadToolState | None) -> bool:
+        return state is not None and state.count(tool.name) >= MAX_TOOL_CALLS
 
-    def limited_invoke(
-        input: Any,
-        config: RunnableConfig | None = None,
-        **kwargs: Any,
-    ):
+    def _begin(
+        input: Any, config: RunnableConfig | None
+    ) -> tuple[str, str, Any, str | None, ToolMessage | None]:
+        """(thread_id, call_id, args, cache_key, resposta imediata ou None)."""
         thread_id = _thread_id_from_config(config)
-        call_id = input.get("id") if isinstance(input, dict) else thread_id
+        call_id = (input.get("id") if isinstance(input, dict) else None) or thread_id
+        args = input
         cache_key = None
         if isinstance(input, dict):
-            payload = input.get("args") if "args" in input else input
+            args = input.get("args") if "args" in input else input
             try:
-                cache_key = json.dumps(payload, sort_keys=True, ensure_ascii=False)
+                cache_key = json.dumps(args, sort_keys=True, ensure_ascii=False)
             except Exception:
-                cache_key = str(payload)
-            if tool.name == "criar_agendamento_tool" and isinstance(payload, dict):
-                validation = _validate_agendamento_args(thread_id, payload)
+                cache_key = str(args)
+            if tool.name == "criar_agendamento_tool" and isinstance(args, dict):
+                validation = _validate_agendamento_args(thread_id, args)
                 if validation:
-                    validation.tool_call_id = call_id  # type: ignore[assignment]
-                    return validation
+                    return thread_id, call_id, args, cache_key, _message(
+                        call_id, ToolResult(validation, tool.name), label=None
+                    )
 
         # Cache hit: devolve ToolMessage imediato
-        if cache_key and cache_key in _tool_cache[thread_id].get(tool.name, {}):
-            cached_content = _tool_cache[thread_id][tool.name][cache_key]
-            preview = str(cached_content).replace("\n", " ")[:400]
-            print(f"[SVIM] tool cached name={tool.name} result={preview}")
-            return ToolMessage(
-                content=cached_content,
-                name=tool.name,
-                tool_call_id=call_id,
-                status="success",
-            )
+        state = _tool_state.peek(thread_id)
+        cached = state.cached(tool.name, cache_key) if state and cache_key else None
+        if cached is not None:
+            return thread_id, call_id, args, cache_key, _message(call_id, cached, "cached")
 
-        if _exceeded(thread_id):
-            content = json.dumps(
+        if _exceeded(state):
+            limit = ToolResult(
                 {
                     "error": "TOOL_LIMIT",
                     "message": (
@@ -236,176 +238,72 @@ def _limit_tool_calls(tool: BaseTool) -> BaseTool:
                         f"para a ferramenta {tool.name}"
                     ),
                 },
-                ensure_ascii=False,
-                separators=(",", ":"),
+                tool.name,
             )
-            return ToolMessage(
-                content=content,
-                name=tool.name,
-                tool_call_id=call_id,
-                status="error",
-            )
-        try:
-            resp = original_invoke(input, config=config, **kwargs)
-        except Exception as exc:
-            _reset_tool_counts(thread_id)
-            print(
-                f"[SVIM] tool error reset (exception) name={tool.name} thread_id={thread_id!r}"
-            )
-            content = json.dumps(
-                {
-                    "error": "TOOL_EXCEPTION",
-                    "message": str(exc),
-                },
-                ensure_ascii=False,
-                separators=(",", ":"),
-            )
-            return ToolMessage(
-                content=content,
-                name=tool.name,
-                tool_call_id=call_id,
-                status="error",
-            )
-        if isinstance(resp, ToolMessage):
-            if _is_error_response(resp):
-                _reset_tool_counts(thread_id)
-                print(
-                    f"[SVIM] tool error reset (toolmessage) name={tool.name} thread_id={thread_id!r}"
-                )
-                preview = str(resp.content).replace("\n", " ")[:400]
-                print(f"[SVIM] tool result name={tool.name} result={preview}")
-                return resp
-            _bump(thread_id)
-            preview = str(resp.content).replace("\n", " ")[:400]
-            print(f"[SVIM] tool result name={tool.name} result={preview}")
-            return resp
-        if not isinstance(resp, (str, list)):
-            resp = json.dumps(resp, ensure_ascii=False, separators=(",", ":"))
-        if _is_error_response(resp):
+            return thread_id, call_id, args, cache_key, _message(call_id, limit, label=None)
+        return thread_id, call_id, args, cache_key, None
+
+    def _failed(thread_id: str, call_id: str, exc: Exception) -> ToolMessage:
+        _reset_tool_counts(thread_id)
+        print(f"[SVIM] tool error reset (exception) name={tool.name} thread_id={thread_id!r}")
+        return _message(
+            call_id,
+            ToolResult({"error": "TOOL_EXCEPTION", "message": str(exc)}, tool.name),
+            label=None,
+        )
+
+    def _finish(thread_id: str, call_id: str, cache_key: str | None, raw: Any) -> ToolMessage:
+        if isinstance(raw, ToolResult):
+            result = raw
+        elif isinstance(raw, ToolMessage):
+            result = ToolResult.from_content(raw.content, tool.name, failed=raw.status == "error")
+        else:
+            result = ToolResult.from_content(raw, tool.name)
+
+        if result.is_error:
             _reset_tool_counts(thread_id)
-            print(
-                f"[SVIM] tool error reset (error payload) name={tool.name} thread_id={thread_id!r}"
-            )
-            preview = str(resp).replace("\n", " ")[:400]
-            print(f"[SVIM] tool result name={tool.name} result={preview}")
-            return ToolMessage(content=resp, name=tool.name, tool_call_id=call_id)
-        _store_ids(thread_id, tool.name, resp)
-        _bump(thread_id)
-        preview = str(resp).replace("\n", " ")[:400]
-        print(f"[SVIM] tool result name={tool.name} result={preview}")
+            print(f"[SVIM] tool error reset (error payload) name={tool.name} thread_id={thread_id!r}")
+            return _message(call_id, result)
+        _store_ids(thread_id, result)
+        _tool_state.bump(thread_id, tool.name)
         # Cache only respostas sem error
+        if cache_key and isinstance(result.payload, dict):
+            _tool_state.put_cache(thread_id, tool.name, cache_key, result)
+        return _message(call_id, result)
+
+    def limited_invoke(
+        input: Any,
+        config: RunnableConfig | None = None,
+        **kwargs: Any,
+    ):
+        thread_id, call_id, args, cache_key, early = _begin(input, config)
+        if early is not None:
+            return early
         try:
-            parsed = json.loads(resp) if isinstance(resp, str) else None
-            if isinstance(parsed, dict) and not parsed.get("error") and cache_key:
-                _tool_cache[thread_id].setdefault(tool.name, {})[cache_key] = resp
-        except Exception:
-            pass
-        return ToolMessage(content=resp, name=tool.name, tool_call_id=call_id)
+            # Só os args: a ferramenta devolve o ToolResult cru, sem virar ToolMessage
+            raw = original_invoke(args, config=config, **kwargs)
+        except Exception as exc:
+            return _failed(thread_id, call_id, exc)
+        return _finish(thread_id, call_id, cache_key, raw)
 
     async def limited_ainvoke(
         input: Any,
         config: RunnableConfig | None = None,
         **kwargs: Any,
     ):
-        thread_id = _thread_id_from_config(config)
-        call_id = input.get("id") if isinstance(input, dict) else thread_id
-        cache_key = None
-        if isinstance(input, dict):
-            payload = input.get("args") if "args" in input else input
-            try:
-                cache_key = json.dumps(payload, sort_keys=True, ensure_ascii=False)
-            except Exception:
-                cache_key = str(payload)
-            if tool.name == "criar_agendamento_tool" and isinstance(payload, dict):
-                validation = _validate_agendamento_args(thread_id, payload)
-                if validation:
-                    validation.tool_call_id = call_id  # type: ignore[assignment]
-                    return validation
-
-        if cache_key and cache_key in _tool_cache[thread_id].get(tool.name, {}):
-            cached_content = _tool_cache[thread_id][tool.name][cache_key]
-            preview = str(cached_content).replace("\n", " ")[:400]
-            print(f"[SVIM] tool cached name={tool.name} result={preview}")
-            return ToolMessage(
-                content=cached_content,
-                name=tool.name,
-                tool_call_id=call_id,
-                status="success",
-            )
-
-        if _exceeded(thread_id):
-            content = json.dumps(
-                {
-                    "error": "TOOL_LIMIT",
-                    "message": (
-                        f"Limite de {MAX_TOOL_CALLS} chamadas atingido "
-                        f"para a ferramenta {tool.name}"
-                    ),
-                },
-                ensure_ascii=False,
-                separators=(",", ":"),
-            )
-            return ToolMessage(
-                content=content,
-                name=tool.name,
-                tool_call_id=call_id,
-                status="error",
-            )
+        thread_id, call_id, args, cache_key, early = _begin(input, config)
+        if early is not None:
+            return early
         try:
-            resp = await original_ainvoke(input, config=config, **kwargs)
+            if getattr(tool, "coroutine", None) is None:
+                # O ainvoke padrão de tool síncrona chama self.invoke (este wrapper)
+                # e contaria/cachearia a chamada duas vezes.
+                raw = await run_in_executor(config, original_invoke, args, config, **kwargs)
+            else:
+                raw = await original_ainvoke(args, config=config, **kwargs)
         except Exception as exc:
-            _reset_tool_counts(thread_id)
-            print(
-                f"[SVIM] tool error reset (exception) name={tool.name} thread_id={thread_id!r}"
-            )
-            content = json.dumps(
-                {
-                    "error": "TOOL_EXCEPTION",
-                    "message": str(exc),
-                },
-                ensure_ascii=False,
-                separators=(",", ":"),
-            )
-            return ToolMessage(
-                content=content,
-                name=tool.name,
-                tool_call_id=call_id,
-                status="error",
-            )
-        if isinstance(resp, ToolMessage):
-            if _is_error_response(resp):
-                _reset_tool_counts(thread_id)
-                print(
-                    f"[SVIM] tool error reset (toolmessage) name={tool.name} thread_id={thread_id!r}"
-                )
-                preview = str(resp.content).replace("\n", " ")[:400]
-                print(f"[SVIM] tool result name={tool.name} result={preview}")
-                return resp
-            _bump(thread_id)
-            preview = str(resp.content).replace("\n", " ")[:400]
-            print(f"[SVIM] tool result name={tool.name} result={preview}")
-            return resp
-        if not isinstance(resp, (str, list)):
-            resp = json.dumps(resp, ensure_ascii=False, separators=(",", ":"))
-        if _is_error_response(resp):
-            _reset_tool_counts(thread_id)
-            print(
-                f"[SVIM] tool error reset (error payload) name={tool.name} thread_id={thread_id!r}"
-            )
-            preview = str(resp).replace("\n", " ")[:400]
-            print(f"[SVIM] tool result name={tool.name} result={preview}")
-            return ToolMessage(content=resp, name=tool.name, tool_call_id=call_id)
-        _store_ids(thread_id, tool.name, resp)
-        _bump(thread_id)
-        preview = str(resp).replace("\n", " ")[:400]
-        print(f"[SVIM] tool result name={tool.name} result={preview}")
-        try:
-            parsed = json.loads(resp) if isinstance(resp, str) else None
-            if isinstance(parsed, dict) and not parsed.get("error") and cache_key:
-                _tool_cache[thread_id].setdefault(tool.name, {})[cache_key] = resp
-        except Exception:
-            pass
-        return ToolMessage(content=resp, name=tool.name, tool_call_id=call_id)
+            return _failed(thread_id, call_id, exc)
+        return _finish(thread_id, call_id, cache_key, raw)
 
     # StructuredTool é um Pydantic model; usar object.__setattr__ evita erro de campo desconhecido.
     object.__setattr__(tool, "invoke", limited_invoke)  # type: ignore[method-assign]
@@ -413,6 +311,9 @@ def _limit_tool_calls(tool: BaseTool) -> BaseTool:
     return tool
 
 
+# Prefixo estático (persona, regras, knowledge): idêntico byte a byte para todos
+# os clientes e turnos, para o cache automático de prefixo do provedor acertar.
+# Nada por turno ou por cliente entra aqui; isso vai em _turn_context.
 SYSTEM_PROMPT = f"""
 Você é a Maria, assistente do salão {svim} e ajuda clientes a gerenciarem seus horários para atendimento.
 
@@ -438,13 +339,13 @@ PASSOS PARA O AGENDAMENTO
 - Capturar a preferência de profissional do cliente
     - Verificar se o profissional realiza o serviço escolhido
     - Se não realizar, informar ao cliente e pedir para escolher outro profissional ou serviço
-    - Listar os profissionais que realizam o serviço escolhido
+    - Listar os profissionais que realizam o serviço escolhido com listar_profissionais_servico_tool (uma chamada só)
     - Verificar se o profissional escolhido está disponível no dia e horário desejado
     - Extrair do resultado o ID do profissional escolhido
 - Capturar o dia e horário desejado
     - Verificar se o horário está dentro do horário de funcionamento da {svim}
     - Verificar se o horário está disponível com o profissional escolhido
-    - Se não estiver disponível, sugerir próximos 3 horários disponíveis
+    - Se não estiver disponível, sugerir próximos 3 horários disponíveis com sugerir_horarios_tool (ela já considera funcionamento, duração e agenda)
 - Utilize os dados coletaos para o agendamento:
 {{
     "servicoId": "str",
@@ -461,16 +362,12 @@ PASSOS PARA O AGENDAMENTO
 REGRAS:
 - Nunca chame a mesma ferramenta mais de {MAX_TOOL_CALLS} vezes por solicitação do cliente; se precisar de mais dados, peça ao cliente.
 - Se já tiver a lista, não repita; apenas pergunte qual item o cliente quer.
-- Não realize agendamentos em datas anteriores a hoje: {iso_format_brazil}.
+- Quando `data` vier como {{"columns": [...], "rows": [[...]]}}, cada linha é um item com os valores na ordem das colunas ("servico.id" = campo id de servico).
+- Não realize agendamentos em datas anteriores a hoje (veja DATA/HORA ATUAL).
 - Nunca informe valores/preços ao cliente, a menos que ele pergunte diretamente.
 - Quando precisar do valor internamente para criar o agendamento, liste serviços com incluirValor=true, mas não mencione o valor ao cliente.
 - Nunca diga que você é um sistema/IA/agente ou mencione limitações técnicas. Se algo falhar, peça para o cliente tentar novamente mais tarde ou ligar diretamente para a loja. Telefone (11) 9.4301-7117.
 
-CLIENTE:
-ID: {cliente_id}
-Nome: {cliente_nome}
-WhatsApp: {cliente_whatsapp}
-
 KNOWLEDGE:
 - Atendimento da {svim}:
 Segunda à Sábado: 14h às 22h
@@ -485,30 +382,142 @@ Rua Rua Pamplona, 1707, Loja 111, Jardim Paulista, São Paulo, SP - 01405-002
 https://maps.google.com/maps?daddr=Rua%20Rua%20Pamplona,%201707,%20Loja%20111,%20Jardim%20Paulista,%20S%C3%A3o%20Paulo,%20SP%20-%2001405-002
 """
 
-model = ChatOpenAI(
-    model="gpt-4.1",
-    max_tokens=600,
-    temperature=0.2,
-)
+def prompt_prefix_fingerprint() -> str:
+    """Hash do prefixo estático (schemas das tools + SYSTEM_PROMPT).
 
-TOOLS = [
-    _limit_tool_calls(criar_agendamento_tool),
-    _limit_tool_calls(listar_agendamentos_tool),
-    _limit_tool_calls(listar_servicos_tool),
-    _limit_tool_calls(listar_servicos_profissional_tool),
-    _limit_tool_calls(listar_profissionais_tool),
-]
-
-agent = create_react_agent(
-    model,
-    tools=TOOLS,
-)
+    Muda só em deploy; se mudar entre processos da mesma versão, o cache de
+    prompt não está sendo aproveitado.
+    """
+    from langchain_core.utils.function_calling import convert_to_openai_tool
+
+    schemas = json.dumps(
+        [convert_to_openai_tool(t) for t in get_tools()],
+        ensure_ascii=False,
+        sort_keys=True,
+    )
+    return hashlib.sha256(f"{schemas}\x1f{SYSTEM_PROMPT}".encode("utf-8")).hexdigest()[:16]
+
+
+def _chat_model(model: str, max_tokens: int, cache_key: str) -> "BaseChatModel":
+    from langchain_openai import ChatOpenAI
+
+    from app.utils.rate_limit import openai_async_http_client, openai_http_client
+
+    return ChatOpenAI(
+        model=model,
+        max_tokens=max_tokens,
+        temperature=0.2,
+        # usage_metadata (tokens em cache) também nas respostas em streaming
+        stream_usage=True,
+        # Mesma chave para todo o prefixo estático: roteia para o mesmo cache
+        model_kwargs={"prompt_cache_key": cache_key},
+        # Fila, retry e concorrência ficam no limitador compartilhado (rate_limit.py)
+        max_retries=0,
+        http_client=openai_http_client(),
+        http_async_client=openai_async_http_client(),
+    )
+
+
+def get_model() -> "BaseChatModel":
+    """Modelo do agente com ferramentas (MODEL)."""
+    global _model
+    with _lazy_lock:
+        if _model is None:
+            fingerprint = prompt_prefix_fingerprint()
+            print(f"[SVIM] prompt prefix fingerprint={fingerprint} model={MODEL}")
+            _model = _chat_model(MODEL, 600, f"{PROMPT_CACHE_KEY}-{fingerprint}")
+        return _model
+
+
+def get_small_model() -> "BaseChatModel":
+    """Modelo pequeno, sem ferramentas, dos turnos simples (SMALL_MODEL)."""
+    global _small_model
+    with _lazy_lock:
+        if _small_model is None:
+            fingerprint = prompt_prefix_fingerprint()
+            _small_model = _chat_model(SMALL_MODEL, 300, f"{PROMPT_CACHE_KEY}-small-{fingerprint}")
+        return _small_model
+
+
+def get_tools() -> List[BaseTool]:
+    global _tools
+    with _lazy_lock:
+        if _tools is None:
+            from app.agent.tools import (
+                criar_agendamento_tool,
+                listar_agendamentos_tool,
+                listar_servicos_tool,
+                listar_servicos_profissional_tool,
+                listar_profissionais_tool,
+                listar_profissionais_servico_tool,
+                sugerir_horarios_tool,
+            )
+
+            _tools = [
+                _limit_tool_calls(criar_agendamento_tool),
+                _limit_tool_calls(listar_agendamentos_tool),
+                _limit_tool_calls(listar_servicos_tool),
+                _limit_tool_calls(listar_servicos_profissional_tool),
+                _limit_tool_calls(listar_profissionais_tool),
+                _limit_tool_calls(listar_profissionais_servico_tool),
+                _limit_tool_calls(sugerir_horarios_tool),
+            ]
+        return _tools
+
+
+def get_context_budget() -> ContextBudget:
+    global _budget
+    with _lazy_lock:
+        if _budget is None:
+            _budget = ContextBudget()
+        return _budget
+
+
+def tool_schema_tokens() -> int:
+    """Tokens dos schemas das ferramentas (iguais em toda chamada ao modelo)."""
+    global _tool_schema_tokens
+    if _tool_schema_tokens is None:
+        _tool_schema_tokens = get_context_budget().counter.count_tools(get_tools())
+    return _tool_schema_tokens
+
+
+def fit_model_input(state: Dict[str, Any]) -> Dict[str, Any]:
+    """pre_model_hook do agente: corta respostas de tools que estourariam o orçamento."""
+    messages, report = get_context_budget().fit_model_input(
+        state["messages"], fixed_extra=tool_schema_tokens()
+    )
+    print(
+        f"[SVIM] model input tokens={report['input']} tools={report['tools']} "
+        f"trimmed_tool_msgs={report['trimmed_tool_messages']}"
+    )
+    return {"llm_input_messages": messages}
+
+
+def get_agent() -> Any:
+    global _agent
+    with _lazy_lock:
+        if _agent is None:
+            from langgraph.prebuilt import create_react_agent
+
+            _agent = create_react_agent(
+                get_model(),
+                tools=get_tools(),
+                pre_model_hook=fit_model_input,
+            )
+        return _agent
 
 
 class State(TypedDict):
     cliente_id: str | None
+    cliente_nome: str | None
+    cliente_whatsapp: str | None
     session_id: str | None
     history: str | None
+    intent: str | None
+    route: str | None
+    route_started: float | None
+    # O turno anterior chamou ferramentas sem concluir o agendamento: o router não usa o modelo pequeno
+    booking_in_progress: bool | None
     messages: Annotated[list[BaseMessage], add_messages]
 
 
@@ -529,10 +538,30 @@ def _to_text(content: Any) -> str:
     return str(content)
 
 
-def load_context(state: State) -> State:
+def _turn_context(state: State) -> str:
+    """Bloco por turno: data/hora atual e dados do cliente da conversa.
+
+    Calculado a cada invocação para que um processo residente (app.agent.server)
+    não use uma data congelada nem os dados de outro cliente.
+    """
+    now_in_brazil = datetime.now(brazil_timezone).replace(second=0, microsecond=0)
+    cliente = state.get("cliente_id")
+    if not cliente or cliente == "anon":
+        cliente = cliente_id
+    return (
+        f"DATA/HORA ATUAL: {now_in_brazil.isoformat(timespec='minutes')}\n\n"
+        "CLIENTE:\n"
+        f"ID: {cliente}\n"
+        f"Nome: {state.get('cliente_nome') or cliente_nome}\n"
+        f"WhatsApp: {state.get('cliente_whatsapp') or cliente_whatsapp}"
+    )
+
+
+async def load_context(state: State) -> State:
     thread_id = state.get("session_id") or state.get("cliente_id") or "anon"
     _reset_tool_counts(str(thread_id))
 
+    memory = get_memory()
     if memory is None:
         return state
 
@@ -547,11 +576,15 @@ def load_context(state: State) -> State:
     if last_user:
         query = _to_text(last_user.content)
 
-    context_messages = memory.get_hybrid_context(
+    # Com checkpoint do thread, a conversa recente já está em state["messages"];
+    # a recência do Qdrant só é necessária quando o thread começa do zero.
+    resumed = sum(1 for m in state.get("messages", []) if m.type == "human") > 1
+
+    context_messages = await memory.aget_hybrid_context(
         session_id=session_id,
         user_id=user_id,
         query=query,
-        recent_k=4,
+        recent_k=0 if resumed else 4,
         semantic_k=2,
     )
 
@@ -563,21 +596,46 @@ def load_context(state: State) -> State:
 
 def inject_system(state: State) -> State:
     msgs = state["messages"]
-    history = (state.get("history") or "")[:MAX_HISTORY_CHARS]
 
-    print(
-        f"[SVIM] system chars={len(SYSTEM_PROMPT)} "
-        f"history chars={len(history)} "
-        f"msgs chars={sum(len(getattr(m, 'content', '') or '') for m in msgs)}"
+    turn_block = _turn_context(state)
+    fixed: List[BaseMessage] = [
+        SystemMessage(content=SYSTEM_PROMPT),
+        SystemMessage(content=turn_block),
+    ]
+    # Só conversa: mensagens de tool e AIs que apenas chamam tools saem, senão
+    # a API rejeitaria tool_calls sem as respectivas respostas.
+    conversation = [
+        m
+        for m in msgs
+        if m.type == "human" or (m.type == "ai" and not getattr(m, "tool_calls", None))
+    ]
+    history, conversation, report = get_context_budget().fit_turn(
+        fixed,
+        state.get("history") or "",
+        conversation,
+        fixed_extra=tool_schema_tokens(),
     )
 
-    new_msgs: List[BaseMessage] = [SystemMessage(content=SYSTEM_PROMPT)]
+    print(
+        f"[SVIM] context tokens fixed={report['fixed']} "
+        f"history={report['history']} conversation={report['conversation']} "
+        f"tools_reserve={report['tools_reserve']} dropped_msgs={report['dropped_messages']}"
+    )
 
     if history:
-        new_msgs.append(
-            SystemMessage(content=f"Contexto recente do cliente:\n{history}")
-        )
-    new_msgs.extend(m for m in msgs if m.type in ("human", "ai"))
+        turn_block = f"{turn_block}\n\nContexto recente do cliente:\n{history}"
+
+    # Ordem amigável ao cache: prefixo estático, conversa anterior (só cresce no
+    # fim entre turnos), bloco dinâmico do turno e, por último, a mensagem atual.
+    current: List[BaseMessage] = []
+    if conversation and conversation[-1].type == "human":
+        current = [conversation.pop()]
+    new_msgs: List[BaseMessage] = [
+        SystemMessage(content=SYSTEM_PROMPT),
+        *conversation,
+        SystemMessage(content=turn_block),
+        *current,
+    ]
 
     def _preview(msg: BaseMessage, limit: int = 80) -> str:
         content = (getattr(msg, "content", "") or "").replace("\n", " ")
@@ -595,12 +653,144 @@ def inject_system(state: State) -> State:
         "messages": [RemoveMessage(REMOVE_ALL_MESSAGES), *new_msgs],
         "history": history,
         "cliente_id": state.get("cliente_id"),
+        "cliente_nome": state.get("cliente_nome"),
+        "cliente_whatsapp": state.get("cliente_whatsapp"),
         "session_id": state.get("session_id"),
     }
 
 
+# Vai junto da mensagem do cliente na rota sem ferramentas
+SMALL_ROUTE_NOTE = (
+    "Responda só com o que está no prompt e na conversa: nesta resposta você não "
+    "consulta serviços, profissionais nem agenda. Não confirme nem invente "
+    "agendamentos, horários ou valores; se o cliente quiser agendar, pergunte qual serviço deseja."
+)
+
+
+def route_turn(state: State) -> State:
+    """Classifica a mensagem do cliente e escolhe a rota (agente ou modelo pequeno)."""
+    messages = state["messages"]
+    current = next((i for i in range(len(messages) - 1, -1, -1) if messages[i].type == "human"), None)
+    intent = classify_intent(_to_text(messages[current].content) if current is not None else "")
+    previous_ai = next(
+        (m for m in reversed(messages[:current or 0]) if m.type == "ai"), None
+    )
+    # Respostas como "amanhã de tarde" ou "tá bom" só fazem sentido no fluxo do agente
+    booking_context = bool(state.get("booking_in_progress")) or (
+        previous_ai is not None and awaits_answer(_to_text(previous_ai.content))
+    )
+    route = route_for(intent, booking_context)
+    print(f"[SVIM] route intent={intent} booking_context={booking_context} route={route}")
+    return {"intent": intent, "route": route, "route_started": time.perf_counter()}
+
+
+def select_route(state: State) -> str:
+    return "respond" if state.get("route") == ROUTE_SMALL else "agent"
+
+
+def _responder(model: Optional["BaseChatModel"] = None) -> Any:
+    """Nó da rota simples: uma chamada ao modelo pequeno, sem ferramentas."""
+
+    async def respond(state: State) -> State:
+        messages = list(state["messages"])
+        position = len(messages) - 1 if messages and messages[-1].type == "human" else len(messages)
+        messages.insert(position, SystemMessage(content=SMALL_ROUTE_NOTE))
+        reply = await (model or get_small_model()).ainvoke(messages)
+        return {"messages": [reply]}
+
+    return respond
+
+
+_route_stats = RouteStats()
+
+
+def route_stats() -> Dict[str, Any]:
+    """Turnos, latência e custo por rota e contagem de intenções do processo."""
+    return _route_stats.stats()
+
+
+def _record_route(state: State) -> None:
+    started = state.get("route_started")
+    if started is None:
+        return
+    route = state.get("route") or ROUTE_AGENT
+    latency_ms = (time.perf_counter() - started) * 1000
+    cost = turn_cost(state["messages"])
+    _route_stats.record(route, state.get("intent"), latency_ms, cost)
+    print(f"[SVIM] route={route} latency_ms={latency_ms:.0f} cost_usd={cost:.6f}")
+
+
+def _turn_messages(messages: List[BaseMessage]) -> List[BaseMessage]:
+    """Mensagens do turno atual: da última mensagem humana em diante."""
+    for i in range(len(messages) - 1, -1, -1):
+        if messages[i].type == "human":
+            return messages[i:]
+    return messages
+
+
+_usage_totals: Dict[str, int] = defaultdict(int)
+
+
+def turn_usage(messages: List[BaseMessage]) -> Dict[str, Any]:
+    """Tokens das chamadas ao modelo no turno, incluindo os lidos do cache de prompt."""
+    usage: Dict[str, Any] = {"calls": 0, "input_tokens": 0, "cached_tokens": 0, "output_tokens": 0}
+    for msg in _turn_messages(messages):
+        metadata = getattr(msg, "usage_metadata", None) if msg.type == "ai" else None
+        if not metadata:
+            continue
+        usage["calls"] += 1
+        usage["input_tokens"] += metadata.get("input_tokens", 0)
+        usage["output_tokens"] += metadata.get("output_tokens", 0)
+        usage["cached_tokens"] += (metadata.get("input_token_details") or {}).get("cache_read", 0) or 0
+    usage["cache_ratio"] = (
+        round(usage["cached_tokens"] / usage["input_tokens"], 3) if usage["input_tokens"] else 0.0
+    )
+    return usage
+
+
+def turn_cost(messages: List[BaseMessage]) -> float:
+    """Custo estimado (USD) das chamadas ao modelo no turno, pelo preço de cada modelo."""
+    return round(messages_cost(_turn_messages(messages)), 6)
+
+
+def usage_stats() -> Dict[str, Any]:
+    """Totais do processo (modo servidor) e razão de tokens servidos do cache."""
+    stats: Dict[str, Any] = dict(_usage_totals)
+    input_tokens = stats.get("input_tokens", 0)
+    stats["cache_ratio"] = round(stats.get("cached_tokens", 0) / input_tokens, 3) if input_tokens else 0.0
+    return stats
+
+
+def _record_usage(messages: List[BaseMessage]) -> None:
+    usage = turn_usage(messages)
+    for key in ("calls", "input_tokens", "cached_tokens", "output_tokens"):
+        _usage_totals[key] += usage[key]
+    print(
+        f"[SVIM] usage calls={usage['calls']} input={usage['input_tokens']} "
+        f"cached={usage['cached_tokens']} output={usage['output_tokens']} "
+        f"cache_ratio={usage['cache_ratio']} process_cache_ratio={usage_stats()['cache_ratio']}"
+    )
+
+
+# Ferramentas que concluem o agendamento: depois delas a conversa volta a ser roteada
+_BOOKING_DONE_TOOLS = frozenset({"criar_agendamento_tool"})
+
+
+def _booking_in_progress(turn_messages: List[Any]) -> bool:
+    """O turno usou ferramentas e não concluiu o agendamento: o próximo fica com o agente.
+
+    Vale só para o turno seguinte; um turno sem ferramentas (ou que criou o
+    agendamento) libera o roteamento de novo.
+    """
+    calls = {call.get("name") for m in turn_messages for call in (getattr(m, "tool_calls", None) or [])}
+    return bool(calls) and not calls & _BOOKING_DONE_TOOLS
+
+
 def save_context(state: State) -> State:
-    if memory is None:
+    _record_usage(state["messages"])
+    _record_route(state)
+    state["booking_in_progress"] = _booking_in_progress(_turn_messages(state["messages"]))
+    if get_memory() is None:
         return state
 
     user_id = state.get("cliente_id") or "anon"
@@ -608,38 +798,90 @@ def save_context(state: State) -> State:
 
     to_store: List[Dict[str, str]] = []
 
-    for msg in state["messages"]:
+    # O histórico anterior já foi gravado nos turnos passados (e volta pelo
+    # checkpointer); só as mensagens novas deste turno precisam de embedding.
+    for msg in _turn_messages(state["messages"]):
         if msg.type in ("human", "ai"):
+            content = get_context_budget().counter.truncate(
+                _to_text(msg.content), MAX_STORE_TOKENS, mark=False
+            )
+            if not content.strip():
+                continue
             role = "user" if msg.type == "human" else "assistant"
-            content = (msg.content or "")[:MAX_STORE_CHARS]
             to_store.append({"role": role, "content": content})
 
-    memory.store_messages(
-        user_id=user_id,
-        session_id=session_id,
-        messages=to_store,
+    # Embedding + upsert saem do caminho da resposta (write-behind em lote).
+    get_write_behind().submit(
+        "memory",
+        {
+            "user_id": user_id,
+            "session_id": session_id,
+            "messages": to_store,
+            "created_at": datetime.now(brazil_timezone).isoformat(),
+        },
     )
 
-    print(f"[SVIM] Stored {len(to_store)} msgs in Qdrant")
+    print(f"[SVIM] Queued up to {len(to_store)} new msgs for Qdrant")
     return state
 
 
-builder = StateGraph(State)
-
-builder.add_node("load_context", load_context)
-builder.add_node("inject_system", inject_system)
-builder.add_node("agent", agent)
-builder.add_node("save_context", save_context)
-
-builder.set_entry_point("load_context")
-builder.add_edge("load_context", "inject_system")
-builder.add_edge("inject_system", "agent")
-builder.add_edge("agent", "save_context")
-builder.add_edge("save_context", END)
-
 USE_LANGGRAPH_API = os.getenv("LANGGRAPH_API", "").lower() in ("1", "true", "yes")
 
-if USE_LANGGRAPH_API:
-    graph = builder.compile()
-else:
-    graph = builder.compile(checkpointer=MemorySaver())
+
+def build_graph(
+    agent: Any = None,
+    checkpointer: Optional["BaseCheckpointSaver"] = None,
+    small_model: Optional["BaseChatModel"] = None,
+) -> "CompiledStateGraph":
+    """Monta e compila o grafo; agent/checkpointer/small_model podem ser injetados (benchmarks)."""
+    from langgraph.graph import StateGraph, END
+
+    builder = StateGraph(State)
+
+    builder.add_node("load_context", load_context)
+    builder.add_node("inject_system", inject_system)
+    builder.add_node("router", route_turn)
+    builder.add_node("agent", agent if agent is not None else get_agent())
+    builder.add_node("respond", _responder(small_model))
+    builder.add_node("save_context", save_context)
+
+    builder.set_entry_point("load_context")
+    builder.add_edge("load_context", "inject_system")
+    builder.add_edge("inject_system", "router")
+    builder.add_conditional_edges("router", select_route, ["agent", "respond"])
+    builder.add_edge("agent", "save_context")
+    builder.add_edge("respond", "save_context")
+    builder.add_edge("save_context", END)
+
+    if USE_LANGGRAPH_API:
+        return builder.compile()
+    if checkpointer is None:
+        from app.utils.checkpointer import create_checkpointer
+
+        checkpointer = create_checkpointer()
+    return builder.compile(checkpointer=checkpointer)
+
+
+def get_graph() -> "CompiledStateGraph":
+    global _graph
+    with _lazy_lock:
+        if _graph is None:
+            _graph = build_graph()
+        return _graph
+
+
+_LAZY_ATTRS = {
+    "graph": get_graph,
+    "agent": get_agent,
+    "model": get_model,
+    "small_model": get_small_model,
+    "memory": get_memory,
+    "TOOLS": get_tools,
+}
+
+
+def __getattr__(name: str) -> Any:
+    # Mantém `graph.py:graph` (langgraph.json) e `from app.agent.graph import graph`.
+    if name in _LAZY_ATTRS:
+        return _LAZY_ATTRS[name]()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
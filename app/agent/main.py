@@ -2,51 +2,94 @@ import os
 import json
 import asyncio
 import traceback
-from typing import Any, Dict
+from datetime import datetime, UTC
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
 
-from kestra import Kestra
 from dotenv import load_dotenv
-from langchain_core.messages import HumanMessage
-from openai import RateLimitError
+from langchain_core.messages import AIMessageChunk, HumanMessage
 
-from app.agent.graph import graph
+from app.agent.graph import get_graph, turn_cost, turn_usage
 from app.utils.db import get_connection
-from app.utils.session_logger import log_interaction, upsert_session
+from app.utils.rate_limit import turn_deadline
+from app.utils.session_logger import log_interactions, upsert_sessions
+from app.utils.write_behind import get_write_behind
 
 load_dotenv()
 
+RATE_LIMIT_FALLBACK: Dict[str, Any] = {
+    "reply": "Tive um pico de carga agora 😥 Pode tentar novamente em alguns instantes?"
+}
 
-async def run_once() -> Dict[str, Any]:
-    message = os.environ.get("MESSAGE")
 
+def is_rate_limit_error(exc: BaseException) -> bool:
+    """RateLimitError da OpenAI, sem importar o SDK antes de ele ser usado."""
+    from openai import RateLimitError
+
+    return isinstance(exc, RateLimitError)
+
+
+def _write_sessions(items: List[Dict[str, Any]]) -> None:
+    """Handler write-behind: upsert das sessões de vários turnos numa conexão."""
+    with get_connection() as conn:
+        upsert_sessions(conn, items)
+
+
+def _write_interactions(items: List[Dict[str, Any]]) -> None:
+    """Handler write-behind: logs de vários turnos numa conexão (independe do upsert)."""
+    with get_connection() as conn:
+        log_interactions(conn, items)
+
+
+if os.getenv("DATABASE_URL"):
+    # Tipos separados: falha no upsert da sessão não derruba nem reenvia os logs
+    get_write_behind().register("session", _write_sessions)
+    get_write_behind().register("interaction", _write_interactions)
+
+
+def _turn_input(
+    message: str,
+    client_id: Optional[str],
+    session_id: Optional[str],
+    client_nome: Optional[str],
+    client_whatsapp: Optional[str],
+) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """(estado inicial, config) do grafo para uma mensagem do cliente."""
     if not message:
         raise ValueError("SVIM_MESSAGE não foi definido nas variáveis de ambiente")
 
-    client_id = (os.getenv("CLIENT_ID") or "").strip() or None
-    session_id = (os.getenv("SESSION_ID") or "").strip() or None
-
     print(f"[SVIM] Incoming MESSAGE={message!r}")
     print(f"[SVIM] Incoming CLIENT_ID={client_id!r} SESSION_ID={session_id!r}")
     print(
         f"[SVIM] thread_id={(session_id or client_id or 'anon')!r} checkpoint_ns='svim'"
     )
 
-    state = await graph.ainvoke(
-        {
-            "messages": [HumanMessage(content=message)],
-            "cliente_id": client_id or "anon",
-            "session_id": session_id,  # pode ser None
-        },
-        config={
-            "configurable": {
-                "thread_id": session_id or client_id or "anon",
-                "checkpoint_ns": "svim",
-            }
-        },
-    )
+    state = {
+        "messages": [HumanMessage(content=message)],
+        "cliente_id": client_id or "anon",
+        "cliente_nome": client_nome,
+        "cliente_whatsapp": client_whatsapp,
+        "session_id": session_id,  # pode ser None
+    }
+    config = {
+        "configurable": {
+            "thread_id": session_id or client_id or "anon",
+            "checkpoint_ns": "svim",
+        }
+    }
+    return state, config
+
 
+def _turn_result(
+    state: Dict[str, Any],
+    message: str,
+    client_id: Optional[str],
+    session_id: Optional[str],
+) -> Dict[str, Any]:
+    """Resultado do turno a partir do estado final; registra a interação no Postgres."""
     messages = state.get("messages", [])
     ai_msg = next((m for m in reversed(messages) if getattr(m, "type", "") == "ai"), None)
+    usage = turn_usage(messages)
+    usage["cost_usd"] = turn_cost(messages)
 
     result = {
         "reply": ai_msg.content if ai_msg else None,
@@ -54,48 +97,152 @@ async def run_once() -> Dict[str, Any]:
         "history": state.get("history"),
         "cliente_id": state.get("cliente_id"),
         "session_id": session_id,
+        # Intenção e rota (agente ou modelo pequeno) escolhidas pelo router
+        "intent": state.get("intent"),
+        "route": state.get("route"),
+        # Tokens e custo do turno, com os servidos do cache de prompt (cache_ratio)
+        "usage": usage,
     }
 
     if os.getenv("DATABASE_URL"):
-        try:
-            with get_connection() as conn:
-                upsert_session(
-                    conn,
-                    user_identifier=client_id or "unknown",
-                    session_id=session_id or "unknown",
-                )
-                log_interaction(
-                    conn,
-                    user_id=client_id,
-                    session_id=session_id,
-                    intent=None,
-                    request_json={
-                        "message": message,
-                        "cliente_id": client_id,
-                        "session_id": session_id,
-                    },
-                    response_json=result,
-                )
-        except Exception as db_exc:
-            print(f"[SVIM] DB log error: {db_exc}")
+        write_behind = get_write_behind()
+        write_behind.submit(
+            "session",
+            {
+                "user_identifier": client_id or "unknown",
+                "session_id": session_id or "unknown",
+            },
+        )
+        write_behind.submit(
+            "interaction",
+            {
+                "user_id": client_id,
+                "session_id": session_id,
+                "intent": state.get("intent"),
+                "request_json": {
+                    "message": message,
+                    "cliente_id": client_id,
+                    "session_id": session_id,
+                },
+                "response_json": result,
+                "created_at": datetime.now(UTC).isoformat(),
+            },
+        )
 
     return result
 
 
+async def run_turn(
+    message: str,
+    client_id: Optional[str] = None,
+    session_id: Optional[str] = None,
+    client_nome: Optional[str] = None,
+    client_whatsapp: Optional[str] = None,
+) -> Dict[str, Any]:
+    """Processa uma mensagem do cliente e devolve o resultado do turno."""
+    state, config = _turn_input(message, client_id, session_id, client_nome, client_whatsapp)
+    # Fila e retries da OpenAI (rate_limit.py) dividem um prazo único por turno
+    with turn_deadline():
+        final = await get_graph().ainvoke(state, config=config)
+    return _turn_result(final, message, client_id, session_id)
+
+
+class _ReplyBuffer:
+    """Texto de cada chamada do modelo, liberado só quando ela termina sem tool calls.
+
+    A OpenAI pode mandar texto ("Vou verificar...") e depois tool calls na
+    mesma chamada; esse texto é de um passo intermediário do ReAct e não vai
+    para o cliente. Uma chamada termina quando chega um chunk de outra
+    chamada (outro id), um evento "values" ou o fim do stream.
+    """
+
+    def __init__(self) -> None:
+        self._id: Optional[str] = None
+        self._pieces: List[str] = []
+        self._has_tool_calls = False
+
+    def add(self, chunk: Any) -> List[str]:
+        """Registra um chunk do modelo; devolve o texto de chamadas já encerradas."""
+        if not isinstance(chunk, AIMessageChunk):
+            return []
+        released = self.flush() if chunk.id != self._id else []
+        self._id = chunk.id
+        if chunk.tool_call_chunks:
+            self._has_tool_calls = True
+            self._pieces = []
+        elif not self._has_tool_calls and isinstance(chunk.content, str) and chunk.content:
+            self._pieces.append(chunk.content)
+        return released
+
+    def flush(self) -> List[str]:
+        """Encerra a chamada atual e devolve o texto dela (vazio se teve tool calls)."""
+        released = [] if self._has_tool_calls else self._pieces
+        self._id, self._pieces, self._has_tool_calls = None, [], False
+        return released
+
+
+async def stream_turn(
+    message: str,
+    client_id: Optional[str] = None,
+    session_id: Optional[str] = None,
+    client_nome: Optional[str] = None,
+    client_whatsapp: Optional[str] = None,
+) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+    """Como run_turn, mas emite o texto do assistente enquanto o modelo gera.
+
+    Produz ("delta", {"text": ...}) com os pedaços da resposta de cada chamada
+    do modelo que não pediu ferramentas e, depois do save_context,
+    ("done", resultado), com o mesmo resultado de run_turn.
+    """
+    state, config = _turn_input(message, client_id, session_id, client_nome, client_whatsapp)
+    final: Dict[str, Any] = {}
+    buffer = _ReplyBuffer()
+    with turn_deadline():
+        # subgraphs=True: os tokens do LLM saem do subgrafo ReAct ("agent")
+        async for namespace, mode, event in get_graph().astream(
+            state,
+            config=config,
+            stream_mode=["messages", "values"],
+            subgraphs=True,
+        ):
+            if mode == "values":
+                if not namespace:
+                    final = event
+                released = buffer.flush()
+            else:
+                released = buffer.add(event[0])
+            for text in released:
+                yield "delta", {"text": text}
+    for text in buffer.flush():
+        yield "delta", {"text": text}
+    yield "done", _turn_result(final, message, client_id, session_id)
+
+
+async def run_once() -> Dict[str, Any]:
+    """Entrypoint do container: lê a mensagem e o cliente das variáveis de ambiente."""
+    return await run_turn(
+        message=os.environ.get("MESSAGE") or "",
+        client_id=(os.getenv("CLIENT_ID") or "").strip() or None,
+        session_id=(os.getenv("SESSION_ID") or "").strip() or None,
+        client_nome=(os.getenv("CLIENT_NOME") or "").strip() or None,
+        client_whatsapp=(os.getenv("CLIENT_WHATSAPP") or "").strip() or None,
+    )
+
+
 def main():
+    from kestra import Kestra
+
     try:
         result = asyncio.run(run_once())
         Kestra.outputs(result)
         print(json.dumps(result, ensure_ascii=False))
 
-    except RateLimitError as e:
-        fallback = {
-            "reply": "Tive um pico de carga agora 😥 Pode tentar novamente em alguns instantes?"
-        }
-        Kestra.outputs(fallback)
-        print(json.dumps(fallback, ensure_ascii=False))
-
     except Exception as e:
+        if is_rate_limit_error(e):
+            fallback = dict(RATE_LIMIT_FALLBACK)
+            Kestra.outputs(fallback)
+            print(json.dumps(fallback, ensure_ascii=False))
+            return
         print("PYTHON_CRASH:", e)
         traceback.print_exc()
         raise
@@ -0,0 +1,140 @@
+"""
+Índice invertido serviço -> profissionais que o realizam.
+
+Evita o N+1 do agente (listar_profissionais_tool e depois
+listar_servicos_profissional_tool por profissional): o índice é montado
+buscando `/profissionais/{id}/servicos` de todos os profissionais em
+paralelo (pelo cache do catálogo) e recarregado periodicamente em
+background; a consulta "quem faz o serviço X" vira um lookup em memória.
+"""
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from app.agent.catalog import CATALOG_REFRESH_SECONDS, catalog_get_all
+from app.utils.logger import get_logger
+
+load_dotenv()
+
+logger = get_logger(__name__)
+
+PROFESSIONAL_INDEX_CONCURRENCY = int(os.getenv("PROFESSIONAL_INDEX_CONCURRENCY", "8"))
+
+# Carrega (profissionais, serviços do profissional) a partir do catálogo
+ListProfessionals = Callable[[], List[Dict[str, Any]]]
+ListServices = Callable[[Any], List[Dict[str, Any]]]
+
+
+def _catalog_professionals() -> List[Dict[str, Any]]:
+    return catalog_get_all("/profissionais")[1]
+
+
+def _catalog_services(profissional_id: Any) -> List[Dict[str, Any]]:
+    return catalog_get_all(f"/profissionais/{profissional_id}/servicos")[1]
+
+
+class ProfessionalIndex:
+    """Mapa servicoId -> profissionais, reconstruído por inteiro e trocado atomicamente."""
+
+    def __init__(
+        self,
+        list_professionals: ListProfessionals = _catalog_professionals,
+        list_services: ListServices = _catalog_services,
+        concurrency: int = PROFESSIONAL_INDEX_CONCURRENCY,
+    ) -> None:
+        self._list_professionals = list_professionals
+        self._list_services = list_services
+        self.concurrency = concurrency
+        self._by_service: Optional[Dict[str, List[Dict[str, Any]]]] = None
+        self.built_at: Optional[float] = None
+        self._build_lock = threading.Lock()
+        self._refresher: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def _services_of(self, profissional: Dict[str, Any]) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+        try:
+            return profissional, self._list_services(profissional["id"])
+        except Exception as exc:
+            logger.warning(
+                "[professional-index] serviços indisponíveis profissional=%s error=%s",
+                profissional.get("id"),
+                exc,
+            )
+            return profissional, []
+
+    def build(self) -> None:
+        """Busca os serviços de todos os profissionais em paralelo e troca o índice."""
+        with self._build_lock:
+            self._build_locked()
+
+    def _build_locked(self) -> None:
+        started = time.perf_counter()
+        profissionais = [
+            p for p in self._list_professionals() if isinstance(p, dict) and p.get("id") is not None
+        ]
+        by_service: Dict[str, List[Dict[str, Any]]] = {}
+        workers = max(1, min(self.concurrency, len(profissionais)))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="professional-index") as pool:
+            for profissional, servicos in pool.map(self._services_of, profissionais):
+                for servico in servicos:
+                    if isinstance(servico, dict) and servico.get("id") is not None:
+                        by_service.setdefault(str(servico["id"]), []).append(profissional)
+        self._by_service = by_service
+        self.built_at = time.time()
+        logger.info(
+            "[professional-index] construído profissionais=%s servicos=%s em %.0fms",
+            len(profissionais),
+            len(by_service),
+            (time.perf_counter() - started) * 1000,
+        )
+
+    def lookup(self, servico_id: Any) -> List[Dict[str, Any]]:
+        """Profissionais que realizam o serviço (constrói o índice no primeiro uso)."""
+        if self._by_service is None:
+            with self._build_lock:
+                # Um build em background pode ter terminado enquanto esperávamos
+                if self._by_service is None:
+                    self._build_locked()
+        return list((self._by_service or {}).get(str(servico_id), []))
+
+    def start_background_refresh(self, interval: float = CATALOG_REFRESH_SECONDS) -> None:
+        """Constrói já em background e reconstrói a cada `interval` segundos."""
+        if self._refresher is not None and self._refresher.is_alive():
+            return
+        self._stop.clear()
+
+        def _loop() -> None:
+            while True:
+                try:
+                    self.build()
+                except Exception as exc:
+                    logger.warning("[professional-index] refresh falhou: %s", exc)
+                if self._stop.wait(interval):
+                    return
+
+        self._refresher = threading.Thread(target=_loop, name="professional-index", daemon=True)
+        self._refresher.start()
+
+    def stop_background_refresh(self) -> None:
+        self._stop.set()
+
+
+_indexes: Dict[str, ProfessionalIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_professional_index() -> ProfessionalIndex:
+    """Um índice por ESTABELECIMENTO_ID, como o cache do catálogo."""
+    estabelecimento_id = os.getenv("ESTABELECIMENTO_ID", "") or "default"
+    with _indexes_lock:
+        index = _indexes.get(estabelecimento_id)
+        if index is None:
+            index = _indexes[estabelecimento_id] = ProfessionalIndex()
+        return index
+
+
+__all__ = ["ProfessionalIndex", "get_professional_index"]
@@ -0,0 +1,214 @@
+"""
+Roteamento do turno: intenção da mensagem do cliente e modelo que responde.
+
+Classificação por regras (sem chamada a modelo, custo ~µs) sobre a última
+mensagem do cliente:
+- saudacao / agradecimento: mensagem só com cumprimentos, despedidas ou
+  agradecimentos ("oi", "boa tarde", "obrigada!", "valeu, até mais")
+- informacao: perguntas respondidas pelo KNOWLEDGE do prompt (funcionamento,
+  endereço, pagamento, estacionamento...) sem nenhum sinal de agendamento
+- agendamento: todo o resto (serviços, profissionais, datas, preços,
+  confirmações curtas como "sim"), que vai para o agente com ferramentas
+
+As três primeiras vão para o modelo pequeno (SMALL_MODEL) sem ferramentas, a
+não ser que a conversa esteja no meio de um agendamento (a Maria fez uma
+pergunta na resposta anterior ou o turno anterior usou ferramentas sem
+concluir o agendamento): aí, e na
+dúvida, o turno fica com o agente. Latência e custo de cada rota ficam em
+route_stats() (/health).
+"""
+import os
+import json
+import threading
+from collections import defaultdict
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from app.agent.aliases import SERVICE_ALIASES
+from app.agent.search import fold
+
+load_dotenv()
+
+MODEL = os.getenv("MODEL", "gpt-4.1")
+SMALL_MODEL = os.getenv("SMALL_MODEL", "gpt-4.1-mini")
+MODEL_ROUTING = os.getenv("MODEL_ROUTING", "true").lower() not in ("0", "false", "no")
+# Mensagens mais longas que isso sempre vão para o agente
+ROUTER_MAX_WORDS = int(os.getenv("ROUTER_MAX_WORDS", "16"))
+
+ROUTE_AGENT = "agent"
+ROUTE_SMALL = "small"
+
+INTENT_GREETING = "saudacao"
+INTENT_THANKS = "agradecimento"
+INTENT_INFO = "informacao"
+INTENT_BOOKING = "agendamento"
+SMALL_INTENTS = frozenset({INTENT_GREETING, INTENT_THANKS, INTENT_INFO})
+
+# Cumprimentos de mais de uma palavra; fora deles, "dia", "tarde", "amanha",
+# "bom"... são respostas de agendamento ("amanhã de tarde", "tá bom")
+_GREETING_PHRASES = (
+    "bom dia", "boa tarde", "boa noite", "tudo bem", "tudo bom",
+    "ate mais", "ate logo", "ate breve", "ate amanha",
+)
+_GREETING_WORDS = frozenset({
+    "oi", "oie", "ola", "opa", "eai", "hey", "hello", "td", "como", "vai", "voce",
+    "vc", "maria", "tchau", "beijos", "bjs", "abraco",
+})
+_THANKS_WORDS = frozenset({
+    "obrigada", "obrigado", "obg", "brigada", "brigado", "valeu", "vlw",
+    "agradeco", "grata", "grato", "gratidao", "thanks",
+})
+# Palavras neutras que podem acompanhar cumprimentos/agradecimentos
+_FILLER_WORDS = frozenset({
+    "e", "ai", "a", "o", "muito", "mto", "muitissimo", "pela", "pelo", "ajuda",
+    "atencao", "de", "nada", "tb", "tambem", "entao", "ta", "hein",
+})
+
+# Trechos (texto já sem acento) de perguntas respondidas pelo KNOWLEDGE
+_INFO_HINTS = (
+    "funcionamento", "abre", "abrem", "aberto", "aberta", "fecha", "fecham", "fechado",
+    "endereco", "onde fica", "onde voces ficam", "localizacao", "como chego", "como chegar",
+    "pagamento", "pagar", "pix", "cartao", "dinheiro", "debito", "credito",
+    "estacionamento", "estacionar", "wifi", "wi fi", "telefone", "idioma", "ingles",
+    "acessibilidade", "deficiente", "cadeirante", "criancas",
+)
+# Qualquer um destes manda o turno para o agente (precisa de ferramentas/dados)
+_BOOKING_HINTS = (
+    "agend", "marca", "marcar", "reserv", "disponiv", "vaga", "cancel", "remarc",
+    "desmarc", "profission", "servico", "preco", "valor", "quanto", "custa",
+    "horario livre", "horarios livres", "encaixe",
+)
+_SERVICE_WORDS = frozenset(
+    word for alias in SERVICE_ALIASES for word in fold(alias).split() if len(word) > 3
+)
+
+
+def classify_intent(text: Any) -> str:
+    """Intenção da mensagem do cliente (uma das INTENT_*)."""
+    folded = fold(text)
+    words = folded.split()
+    # Vazia (só emoji, ex. 👍 confirmando) ou longa: o agente decide
+    if not words or len(words) > ROUTER_MAX_WORDS:
+        return INTENT_BOOKING
+    padded = f" {folded} "
+    if any(hint in folded for hint in _BOOKING_HINTS) or _SERVICE_WORDS.intersection(words):
+        return INTENT_BOOKING
+    rest = padded
+    for phrase in _GREETING_PHRASES:
+        rest = rest.replace(f" {phrase} ", " ")
+    vocabulary = set(rest.split())
+    if vocabulary <= _GREETING_WORDS | _THANKS_WORDS | _FILLER_WORDS:
+        return INTENT_THANKS if vocabulary & _THANKS_WORDS else INTENT_GREETING
+    if any(f" {hint} " in padded for hint in _INFO_HINTS):
+        return INTENT_INFO
+    return INTENT_BOOKING
+
+
+def awaits_answer(ai_text: Any) -> bool:
+    """A última resposta da Maria fez uma pergunta: a mensagem atual é a resposta."""
+    return "?" in str(ai_text or "")
+
+
+def route_for(intent: str, booking_context: bool = False) -> str:
+    """Rota do turno; com agendamento em andamento (booking_context) fica sempre no agente."""
+    if MODEL_ROUTING and not booking_context and intent in SMALL_INTENTS:
+        return ROUTE_SMALL
+    return ROUTE_AGENT
+
+
+# USD por 1M de tokens (entrada, entrada em cache, saída); MODEL_PRICES_JSON
+# ({"modelo": [entrada, cache, saída]}) sobrescreve ou acrescenta modelos.
+MODEL_PRICES: Dict[str, Tuple[float, float, float]] = {
+    "gpt-4.1": (2.00, 0.50, 8.00),
+    "gpt-4.1-mini": (0.40, 0.10, 1.60),
+    "gpt-4.1-nano": (0.10, 0.025, 0.40),
+    "gpt-4o": (2.50, 1.25, 10.00),
+    "gpt-4o-mini": (0.15, 0.075, 0.60),
+}
+MODEL_PRICES.update(
+    {name: tuple(prices) for name, prices in json.loads(os.getenv("MODEL_PRICES_JSON") or "{}").items()}
+)
+
+
+def model_prices(model_name: Optional[str]) -> Optional[Tuple[float, float, float]]:
+    """Preço do modelo; aceita nomes com data ("gpt-4.1-mini-2025-04-14")."""
+    if not model_name:
+        return None
+    matches = [name for name in MODEL_PRICES if model_name == name or model_name.startswith(f"{name}-")]
+    return MODEL_PRICES[max(matches, key=len)] if matches else None
+
+
+def message_cost(message: Any) -> float:
+    """Custo em USD de uma resposta do modelo (0.0 sem usage ou preço conhecido)."""
+    usage = getattr(message, "usage_metadata", None)
+    model_name = (getattr(message, "response_metadata", None) or {}).get("model_name")
+    prices = model_prices(model_name)
+    if not usage or prices is None:
+        return 0.0
+    cached = (usage.get("input_token_details") or {}).get("cache_read", 0) or 0
+    fresh = usage.get("input_tokens", 0) - cached
+    price_in, price_cached, price_out = prices
+    return (fresh * price_in + cached * price_cached + usage.get("output_tokens", 0) * price_out) / 1_000_000
+
+
+def messages_cost(messages: Iterable[Any]) -> float:
+    return sum(message_cost(m) for m in messages if getattr(m, "type", "") == "ai")
+
+
+class RouteStats:
+    """Totais por rota (turnos, latência, custo) e contagem de intenções do processo."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._routes: Dict[str, Dict[str, float]] = defaultdict(
+            lambda: {"turns": 0, "latency_ms": 0.0, "max_latency_ms": 0.0, "cost_usd": 0.0}
+        )
+        self._intents: Dict[str, int] = defaultdict(int)
+
+    def record(self, route: str, intent: Optional[str], latency_ms: float, cost_usd: float) -> None:
+        with self._lock:
+            totals = self._routes[route]
+            totals["turns"] += 1
+            totals["latency_ms"] += latency_ms
+            totals["max_latency_ms"] = max(totals["max_latency_ms"], latency_ms)
+            totals["cost_usd"] += cost_usd
+            self._intents[intent or "desconhecida"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            routes = {
+                route: {
+                    "turns": int(totals["turns"]),
+                    "avg_latency_ms": round(totals["latency_ms"] / totals["turns"], 1),
+                    "max_latency_ms": round(totals["max_latency_ms"], 1),
+                    "cost_usd": round(totals["cost_usd"], 6),
+                    "avg_cost_usd": round(totals["cost_usd"] / totals["turns"], 6),
+                }
+                for route, totals in self._routes.items()
+            }
+            return {"routes": routes, "intents": dict(self._intents)}
+
+    def clear(self) -> None:
+        with self._lock:
+            self._routes.clear()
+            self._intents.clear()
+
+
+__all__ = [
+    "INTENT_BOOKING",
+    "INTENT_GREETING",
+    "INTENT_INFO",
+    "INTENT_THANKS",
+    "MODEL",
+    "ROUTE_AGENT",
+    "ROUTE_SMALL",
+    "RouteStats",
+    "SMALL_MODEL",
+    "awaits_answer",
+    "classify_intent",
+    "message_cost",
+    "messages_cost",
+    "model_prices",
+    "route_for",
+]
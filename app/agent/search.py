@@ -0,0 +1,207 @@
+"""
+Índice local de busca sobre o catálogo de serviços.
+
+Substitui o filtro remoto `/servicos?nome=`: tokens sem acento, índice
+invertido, casamento aproximado por trigramas/distância de edição e
+expansão de sinônimos (SERVICE_ALIASES). A API só é usada para recarregar
+o catálogo que alimenta o índice.
+"""
+import re
+import unicodedata
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from app.agent.aliases import SERVICE_ALIASES
+from app.agent.stop_words import STOPWORDS
+
+# Pesos por tipo de casamento do token da busca com o token do serviço
+EXACT_WEIGHT = 1.0
+PREFIX_WEIGHT = 0.8
+ALIAS_WEIGHT = 0.7
+FUZZY_WEIGHT = 0.6
+# Peso do campo em que o token aparece
+NAME_FIELD_WEIGHT = 1.0
+CATEGORY_FIELD_WEIGHT = 0.5
+
+MIN_PREFIX_LEN = 3
+MIN_FUZZY_SIMILARITY = 0.3
+
+_NON_ALNUM = re.compile(r"[^a-z0-9]+")
+
+
+def fold(text: Any) -> str:
+    """Minúsculas, sem acentos e apenas [a-z0-9] separados por espaço."""
+    text = unicodedata.normalize("NFD", str(text or "").lower())
+    text = "".join(c for c in text if unicodedata.category(c) != "Mn")
+    return _NON_ALNUM.sub(" ", text).strip()
+
+
+def tokenize(text: Any) -> List[str]:
+    return [t for t in fold(text).split() if t not in STOPWORDS]
+
+
+def trigrams(token: str) -> set[str]:
+    padded = f"  {token} "
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+def edit_distance(a: str, b: str, limit: int) -> int:
+    """Levenshtein com corte: devolve limit + 1 assim que passa do limite."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(
+                min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb))
+            )
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+
+def _max_edits(token: str) -> int:
+    return 1 if len(token) <= 5 else 2
+
+
+def _build_aliases() -> Dict[str, List[str]]:
+    """Normaliza as chaves de SERVICE_ALIASES com o mesmo tokenizer do índice."""
+    aliases: Dict[str, List[str]] = {}
+    for phrase, canonical in SERVICE_ALIASES.items():
+        key = " ".join(tokenize(phrase))
+        target = tokenize(canonical)
+        if key and target and target != key.split():
+            aliases.setdefault(key, target)
+    return aliases
+
+
+ALIASES = _build_aliases()
+
+
+class ServiceIndex:
+    """Índice invertido em memória sobre os serviços do catálogo."""
+
+    def __init__(self, services: Iterable[Dict[str, Any]]) -> None:
+        self.services: List[Dict[str, Any]] = [s for s in services if isinstance(s, dict)]
+        # token -> {posição do serviço: peso do campo}
+        self._postings: Dict[str, Dict[int, float]] = defaultdict(dict)
+        self._trigrams: Dict[str, set[str]] = defaultdict(set)
+        self._categories: List[str] = []
+
+        for pos, service in enumerate(self.services):
+            self._categories.append(fold(service.get("categoria")))
+            for field, weight in (("categoria", CATEGORY_FIELD_WEIGHT), ("nome", NAME_FIELD_WEIGHT)):
+                for token in tokenize(service.get(field)):
+                    postings = self._postings[token]
+                    postings[pos] = max(postings.get(pos, 0.0), weight)
+
+        for token in self._postings:
+            for gram in trigrams(token):
+                self._trigrams[gram].add(token)
+
+    def __len__(self) -> int:
+        return len(self.services)
+
+    def _expand(self, token: str) -> List[Tuple[str, float]]:
+        """Tokens do vocabulário que casam com o token da busca, com peso."""
+        if token in self._postings:
+            return [(token, EXACT_WEIGHT)]
+
+        matches: Dict[str, float] = {}
+        if len(token) >= MIN_PREFIX_LEN:
+            for candidate in self._postings:
+                if candidate.startswith(token):
+                    matches[candidate] = PREFIX_WEIGHT
+
+        grams = trigrams(token)
+        candidates: Dict[str, int] = defaultdict(int)
+        for gram in grams:
+            for candidate in self._trigrams.get(gram, ()):
+                candidates[candidate] += 1
+        limit = _max_edits(token)
+        for candidate, shared in candidates.items():
+            similarity = shared / len(grams | trigrams(candidate))
+            if similarity < MIN_FUZZY_SIMILARITY:
+                continue
+            if edit_distance(token, candidate, limit) <= limit:
+                weight = FUZZY_WEIGHT * (0.5 + similarity / 2)
+                matches[candidate] = max(matches.get(candidate, 0.0), weight)
+        return list(matches.items())
+
+    def _query_terms(self, query: str) -> List[List[Tuple[str, float]]]:
+        """Uma lista de alternativas (token, peso) por termo da busca."""
+        tokens = tokenize(query)
+
+        phrase_alias = ALIASES.get(" ".join(tokens))
+        if phrase_alias:
+            # A frase inteira é um sinônimo conhecido: busca pelo termo canônico.
+            terms = [self._expand(a) for a in phrase_alias]
+            if all(terms):
+                return terms
+
+        terms = [self._expand(t) for t in tokens]
+        for i, token in enumerate(tokens):
+            for a in ALIASES.get(token, ()):
+                terms[i].extend((tok, w * ALIAS_WEIGHT) for tok, w in self._expand(a))
+        return terms
+
+    def search(
+        self,
+        query: Optional[str] = None,
+        categoria: Optional[str] = None,
+        limit: Optional[int] = None,
+    ) -> List[Dict[str, Any]]:
+        """Serviços ordenados por relevância para `query`, filtrados por categoria."""
+        allowed: Optional[set[int]] = None
+        if categoria:
+            wanted = fold(categoria)
+            allowed = {pos for pos, cat in enumerate(self._categories) if wanted and wanted in cat}
+            if not allowed:
+                allowed = self._positions_for(categoria)
+
+        if not query or not tokenize(query):
+            positions = sorted(allowed) if allowed is not None else range(len(self.services))
+            results = [self.services[p] for p in positions]
+            return results[:limit] if limit else results
+
+        scores: Dict[int, float] = defaultdict(float)
+        matched_terms: Dict[int, int] = defaultdict(int)
+        terms = self._query_terms(query)
+        for alternatives in terms:
+            best: Dict[int, float] = {}
+            for token, weight in alternatives:
+                for pos, field_weight in self._postings.get(token, {}).items():
+                    if allowed is not None and pos not in allowed:
+                        continue
+                    best[pos] = max(best.get(pos, 0.0), weight * field_weight)
+            for pos, score in best.items():
+                scores[pos] += score
+                matched_terms[pos] += 1
+
+        total_terms = max(len(terms), 1)
+        ranked = sorted(
+            scores,
+            key=lambda pos: (
+                -matched_terms[pos] / total_terms,
+                -scores[pos],
+                len(tokenize(self.services[pos].get("nome"))),
+                fold(self.services[pos].get("nome")),
+            ),
+        )
+        results = [self.services[pos] for pos in ranked]
+        return results[:limit] if limit else results
+
+    def _positions_for(self, text: str) -> set[int]:
+        positions: set[int] = set()
+        for alternatives in self._query_terms(text):
+            for token, _ in alternatives:
+                positions.update(
+                    pos for pos in self._postings.get(token, {})
+                    if token in tokenize(self._categories[pos])
+                )
+        return positions
+
+
+__all__ = ["ServiceIndex", "edit_distance", "fold", "tokenize"]
@@ -0,0 +1,308 @@
+"""
+Servidor HTTP residente do agente Maria.
+
+Mantém o grafo compilado, os clientes (OpenAI, Qdrant, HTTP) e os caches
+aquecidos entre mensagens, em vez de subir um container por mensagem.
+
+Uso:
+    python -m app.agent.server
+
+Rotas:
+    POST /invoke         payload do webhook (user_id, name, phone, session_id, message)
+    POST /invoke/stream  mesmo payload; resposta em SSE (chunked) com o texto parcial
+    GET  /health         disponibilidade, tokens, rotas, estado das ferramentas e limitador da OpenAI
+"""
+import os
+import json
+import asyncio
+import signal
+import traceback
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from app.agent.catalog import get_catalog_cache
+from app.agent.graph import get_graph, route_stats, tool_state_stats, usage_stats
+from app.agent.professional_index import get_professional_index
+from app.agent.main import RATE_LIMIT_FALLBACK, is_rate_limit_error, run_turn, stream_turn
+from app.utils.db import aclose_pools
+from app.utils.logger import get_logger
+from app.utils.rate_limit import rate_limit_stats
+from app.utils.write_behind import get_write_behind
+
+load_dotenv()
+
+logger = get_logger(__name__)
+
+SERVER_HOST = os.getenv("SERVER_HOST", "0.0.0.0")
+SERVER_PORT = int(os.getenv("SERVER_PORT", "8080"))
+MAX_BODY_BYTES = int(os.getenv("SERVER_MAX_BODY_BYTES", str(64 * 1024)))
+READ_TIMEOUT = float(os.getenv("SERVER_READ_TIMEOUT", "30"))
+
+_REASONS = {
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    413: "Payload Too Large",
+    500: "Internal Server Error",
+}
+
+# Turnos do mesmo thread_id são serializados: o checkpointer e os contadores
+# de ferramentas são indexados por thread e não suportam turnos intercalados.
+_session_locks: Dict[str, asyncio.Lock] = {}
+_session_users: defaultdict[str, int] = defaultdict(int)
+
+
+class _BadRequest(Exception):
+    def __init__(self, status: int, message: str) -> None:
+        super().__init__(message)
+        self.status = status
+
+
+def _clean(value: Any) -> Optional[str]:
+    if value is None:
+        return None
+    return str(value).strip() or None
+
+
+def _parse_payload(body: bytes) -> Dict[str, Optional[str]]:
+    """Converte o corpo do webhook nos argumentos de run_turn."""
+    try:
+        payload = json.loads(body or b"{}")
+    except ValueError:
+        raise _BadRequest(400, "JSON inválido")
+    if not isinstance(payload, dict):
+        raise _BadRequest(400, "O corpo precisa ser um objeto JSON")
+
+    message = _clean(payload.get("message"))
+    if not message:
+        raise _BadRequest(400, "Campo 'message' é obrigatório")
+
+    return {
+        "message": message,
+        "client_id": _clean(payload.get("user_id")),
+        "session_id": _clean(payload.get("session_id")),
+        "client_nome": _clean(payload.get("name")),
+        "client_whatsapp": _clean(payload.get("phone")),
+    }
+
+
+@asynccontextmanager
+async def _session_turn(payload: Dict[str, Optional[str]]) -> AsyncIterator[None]:
+    thread_id = payload.get("session_id") or payload.get("client_id") or "anon"
+    lock = _session_locks.setdefault(thread_id, asyncio.Lock())
+    _session_users[thread_id] += 1
+    try:
+        async with lock:
+            yield
+    finally:
+        _session_users[thread_id] -= 1
+        if _session_users[thread_id] <= 0:
+            _session_users.pop(thread_id, None)
+            _session_locks.pop(thread_id, None)
+
+
+async def handle_invoke(payload: Dict[str, Optional[str]]) -> Dict[str, Any]:
+    try:
+        async with _session_turn(payload):
+            return await run_turn(**payload)  # type: ignore[arg-type]
+    except Exception as exc:
+        if is_rate_limit_error(exc):
+            return dict(RATE_LIMIT_FALLBACK)
+        raise
+
+
+async def handle_stream(
+    payload: Dict[str, Optional[str]],
+) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+    """Eventos de stream_turn; falhas viram um evento final em vez de derrubar a conexão."""
+    try:
+        async with _session_turn(payload):
+            async for event in stream_turn(**payload):  # type: ignore[arg-type]
+                yield event
+    except Exception as exc:
+        if is_rate_limit_error(exc):
+            yield "done", dict(RATE_LIMIT_FALLBACK)
+            return
+        print("PYTHON_CRASH:", exc)
+        traceback.print_exc()
+        yield "error", {"error": "INTERNAL_ERROR"}
+
+
+async def _read_request(
+    reader: asyncio.StreamReader,
+) -> Optional[Tuple[str, str, Dict[str, str], bytes]]:
+    request_line = await reader.readline()
+    if not request_line:
+        return None
+    try:
+        method, target, _version = request_line.decode("latin-1").split()
+    except ValueError:
+        raise _BadRequest(400, "Linha de requisição inválida")
+
+    headers: Dict[str, str] = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+
+    try:
+        length = int(headers.get("content-length") or 0)
+    except ValueError:
+        raise _BadRequest(400, "Content-Length inválido")
+    if length < 0:
+        raise _BadRequest(400, "Content-Length inválido")
+    if length > MAX_BODY_BYTES:
+        raise _BadRequest(413, "Corpo da requisição muito grande")
+    body = await reader.readexactly(length) if length else b""
+    return method.upper(), target.split("?", 1)[0], headers, body
+
+
+def _write_response(
+    writer: asyncio.StreamWriter,
+    status: int,
+    payload: Dict[str, Any],
+    keep_alive: bool,
+) -> None:
+    body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+    head = (
+        f"HTTP/1.1 {status} {_REASONS.get(status, '')}\r\n"
+        "Content-Type: application/json; charset=utf-8\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n"
+        "\r\n"
+    )
+    writer.write(head.encode("latin-1") + body)
+
+
+def _sse_event(event: str, data: Dict[str, Any]) -> bytes:
+    payload = json.dumps(data, ensure_ascii=False)
+    return f"event: {event}\ndata: {payload}\n\n".encode("utf-8")
+
+
+def _write_chunk(writer: asyncio.StreamWriter, data: bytes) -> None:
+    writer.write(f"{len(data):x}\r\n".encode("latin-1") + data + b"\r\n")
+
+
+async def _write_stream(
+    writer: asyncio.StreamWriter,
+    events: AsyncIterator[Tuple[str, Dict[str, Any]]],
+    keep_alive: bool,
+) -> None:
+    """Resposta text/event-stream em Transfer-Encoding chunked, um evento por chunk."""
+    head = (
+        "HTTP/1.1 200 OK\r\n"
+        "Content-Type: text/event-stream; charset=utf-8\r\n"
+        "Cache-Control: no-cache\r\n"
+        "Transfer-Encoding: chunked\r\n"
+        f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n"
+        "\r\n"
+    )
+    writer.write(head.encode("latin-1"))
+    await writer.drain()
+    async for event, data in events:
+        _write_chunk(writer, _sse_event(event, data))
+        # drain a cada evento: o texto parcial chega ao cliente sem esperar o turno
+        await writer.drain()
+    writer.write(b"0\r\n\r\n")
+
+
+async def _dispatch(method: str, path: str, body: bytes) -> Tuple[int, Dict[str, Any]]:
+    if path == "/health":
+        return 200, {
+            "status": "ok",
+            "usage": usage_stats(),
+            "tool_state": tool_state_stats(),
+            "routes": route_stats(),
+            "openai_rate_limit": rate_limit_stats(),
+        }
+    if path not in ("/invoke", "/invoke/stream"):
+        return 404, {"error": "NOT_FOUND"}
+    if method != "POST":
+        return 405, {"error": "METHOD_NOT_ALLOWED"}
+    result = await handle_invoke(_parse_payload(body))
+    return 200, result
+
+
+async def _handle_connection(
+    reader: asyncio.StreamReader,
+    writer: asyncio.StreamWriter,
+) -> None:
+    try:
+        while True:
+            keep_alive = False
+            try:
+                request = await asyncio.wait_for(_read_request(reader), READ_TIMEOUT)
+                if request is None:
+                    break
+                method, path, headers, body = request
+                keep_alive = headers.get("connection", "").lower() != "close"
+                if path == "/invoke/stream" and method == "POST":
+                    await _write_stream(writer, handle_stream(_parse_payload(body)), keep_alive)
+                    await writer.drain()
+                    if not keep_alive:
+                        break
+                    continue
+                status, payload = await _dispatch(method, path, body)
+            except (asyncio.TimeoutError, asyncio.IncompleteReadError):
+                break
+            except _BadRequest as exc:
+                status, payload = exc.status, {"error": str(exc)}
+            except Exception as exc:
+                print("PYTHON_CRASH:", exc)
+                traceback.print_exc()
+                status, payload = 500, {"error": "INTERNAL_ERROR"}
+
+            _write_response(writer, status, payload, keep_alive)
+            await writer.drain()
+            if not keep_alive:
+                break
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except ConnectionError:
+            pass
+
+
+async def serve(host: str = SERVER_HOST, port: int = SERVER_PORT) -> None:
+    catalog = get_catalog_cache()
+    catalog.start_background_refresh()
+    professional_index = get_professional_index()
+    professional_index.start_background_refresh()
+    # Processo residente: paga a inicialização preguiçosa antes do primeiro pedido.
+    await asyncio.to_thread(get_graph)
+    server = await asyncio.start_server(_handle_connection, host, port)
+    logger.info("[server] Maria ouvindo em http://%s:%s", host, port)
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except NotImplementedError:  # pragma: no cover - Windows
+            pass
+
+    async with server:
+        await stop.wait()
+    catalog.stop_background_refresh()
+    professional_index.stop_background_refresh()
+    await asyncio.to_thread(get_write_behind().close)
+    # Depois do write-behind, que ainda usa o pool para esvaziar a fila
+    await aclose_pools()
+    logger.info("[server] encerrado")
+
+
+def main() -> None:
+    asyncio.run(serve())
+
+
+if __name__ == "__main__":
+    main()
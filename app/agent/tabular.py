@@ -0,0 +1,108 @@
+"""
+Codificação tabular (colunas + linhas) das listas devolvidas pelas ferramentas.
+
+Em JSON de objetos cada item repete as chaves (`id`, `nome`, `categoria`,
+`duracaoEmMinutos`...); em tabela as chaves aparecem uma vez:
+
+    {"data":{"columns":["id","nome"],"rows":[[1,"Corte"],[2,"Escova"]]},"total":2}
+
+Objetos aninhados (ex.: `servico` de um agendamento) viram colunas com ponto
+(`servico.id`). O envelope continua JSON, então detecção de erro e cache das
+ferramentas não mudam. Ativado por ferramenta em TOOL_RESULT_TABULAR
+(nomes separados por vírgula, ou "all").
+"""
+import os
+from typing import Any, Dict, List, Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+TOOL_RESULT_TABULAR = {
+    name.strip() for name in os.getenv("TOOL_RESULT_TABULAR", "").split(",") if name.strip()
+}
+
+
+def is_tabular_tool(tool_name: Optional[str]) -> bool:
+    if not tool_name:
+        return False
+    return "all" in TOOL_RESULT_TABULAR or tool_name in TOOL_RESULT_TABULAR
+
+
+def is_table(data: Any) -> bool:
+    return (
+        isinstance(data, dict)
+        and isinstance(data.get("columns"), list)
+        and isinstance(data.get("rows"), list)
+    )
+
+
+def _flatten(item: Dict[str, Any], prefix: str = "") -> Dict[str, Any]:
+    flat: Dict[str, Any] = {}
+    for key, value in item.items():
+        if isinstance(value, dict) and value:
+            flat.update(_flatten(value, f"{prefix}{key}."))
+        else:
+            flat[f"{prefix}{key}"] = value
+    return flat
+
+
+def to_table(items: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Lista de objetos -> {"columns", "rows"}; colunas na ordem em que aparecem."""
+    flat = [_flatten(item) for item in items]
+    columns: Dict[str, None] = {}
+    for row in flat:
+        for key in row:
+            columns.setdefault(key, None)
+    return {
+        "columns": list(columns),
+        "rows": [[row.get(column) for column in columns] for row in flat],
+    }
+
+
+def from_table(table: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Inverso de to_table; células nulas são omitidas."""
+    columns = table.get("columns") or []
+    items: List[Dict[str, Any]] = []
+    for row in table.get("rows") or []:
+        item: Dict[str, Any] = {}
+        for column, value in zip(columns, row):
+            if value is None:
+                continue
+            *parents, leaf = str(column).split(".")
+            target = item
+            for parent in parents:
+                target = target.setdefault(parent, {})
+            target[leaf] = value
+        items.append(item)
+    return items
+
+
+def data_items(data: Any) -> Optional[List[Any]]:
+    """Itens de `data` em qualquer dos formatos (lista ou tabela); None se não for lista."""
+    if isinstance(data, list):
+        return data
+    if is_table(data):
+        return from_table(data)
+    return None
+
+
+def tabulate_payload(payload: Any) -> Any:
+    """Troca `data` (lista de objetos) pela tabela; erros e outros formatos passam intactos."""
+    if not isinstance(payload, dict) or payload.get("error"):
+        return payload
+    data = payload.get("data")
+    if not isinstance(data, list) or not data or not all(isinstance(i, dict) for i in data):
+        return payload
+    return {**payload, "data": to_table(data)}
+
+
+__all__ = [
+    "TOOL_RESULT_TABULAR",
+    "data_items",
+    "from_table",
+    "is_table",
+    "is_tabular_tool",
+    "tabulate_payload",
+    "to_table",
+]
@@ -0,0 +1,80 @@
+"""
+Resultado tipado das ferramentas do agente.
+
+As ferramentas devolvem um ToolResult com o payload já compactado; o wrapper
+de graph._limit_tool_calls lê erro e ids direto do payload (sem json.loads) e
+a serialização para o texto enviado ao LLM acontece uma única vez, em
+`content` (JSON compacto, ou tabela se a ferramenta estiver em
+TOOL_RESULT_TABULAR).
+"""
+import json
+from dataclasses import dataclass, field
+from typing import Any, Optional, Union
+
+from app.agent.tabular import data_items, is_tabular_tool, tabulate_payload
+
+# Ids numéricos da API como int (mais compactos em sets grandes); o resto como texto
+IdKey = Union[int, str]
+
+
+def id_key(value: Any) -> IdKey:
+    if isinstance(value, int) and not isinstance(value, bool):
+        return value
+    text = str(value).strip()
+    return int(text) if text.isdigit() else text
+
+
+@dataclass
+class ToolResult:
+    payload: Any
+    tool_name: Optional[str] = None
+    # Falha sinalizada fora do payload (ex.: ToolMessage com status="error")
+    failed: bool = False
+    _content: Optional[str] = field(default=None, repr=False, compare=False)
+
+    @classmethod
+    def from_content(
+        cls, content: Any, tool_name: Optional[str] = None, failed: bool = False
+    ) -> "ToolResult":
+        """Para respostas que já chegam como texto: faz o único json.loads."""
+        if not isinstance(content, str):
+            return cls(content, tool_name, failed)
+        try:
+            payload = json.loads(content)
+        except ValueError:
+            payload = None
+        return cls(payload, tool_name, failed, _content=content)
+
+    @property
+    def is_error(self) -> bool:
+        return self.failed or (isinstance(self.payload, dict) and bool(self.payload.get("error")))
+
+    def ids(self, id_field: str = "id") -> set[IdKey]:
+        """Ids (via id_key) dos itens de `data`, em lista ou tabela."""
+        if not isinstance(self.payload, dict) or self.is_error:
+            return set()
+        items = data_items(self.payload.get("data")) or []
+        return {
+            id_key(item[id_field])
+            for item in items
+            if isinstance(item, dict) and item.get(id_field)
+        }
+
+    @property
+    def content(self) -> str:
+        """Texto enviado ao LLM, serializado na primeira leitura e reaproveitado."""
+        if self._content is None:
+            payload = self.payload
+            if is_tabular_tool(self.tool_name):
+                payload = tabulate_payload(payload)
+            self._content = (
+                payload if isinstance(payload, str)
+                else json.dumps(payload, ensure_ascii=False, separators=(",", ":"))
+            )
+        return self._content
+
+    def __str__(self) -> str:
+        return self.content
+
+
+__all__ = ["IdKey", "ToolResult", "id_key"]
@@ -0,0 +1,193 @@
+"""
+Estado das ferramentas por thread (contadores, cache de respostas e ids listados).
+
+Substitui os defaultdicts globais de graph.py, que cresciam sem limite num
+processo residente: as threads ficam num LRU com TTL (desde o último uso) e
+teto de memória estimada (tamanho das respostas em cache + ids). Consultas
+não criam entradas; ids numéricos são guardados como int.
+"""
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Optional
+
+from dotenv import load_dotenv
+
+from app.agent.tool_result import IdKey, ToolResult, id_key
+
+load_dotenv()
+
+TOOL_STATE_MAX_THREADS = int(os.getenv("TOOL_STATE_MAX_THREADS", "2000"))
+TOOL_STATE_TTL_SECONDS = float(os.getenv("TOOL_STATE_TTL_SECONDS", "900"))
+TOOL_STATE_MAX_BYTES = int(os.getenv("TOOL_STATE_MAX_BYTES", str(32 * 1024 * 1024)))
+
+# Custo aproximado de cada id num frozenset (int pequeno + slot da tabela hash)
+_ID_BYTES = 64
+_ENTRY_BYTES = 512
+
+
+class ThreadToolState:
+    """Estado de um thread_id; só é alterado pelo ToolStateStore (sob o lock dele)."""
+
+    __slots__ = ("counts", "cache", "ids", "touched", "nbytes")
+
+    def __init__(self) -> None:
+        self.counts: Dict[str, int] = {}
+        self.cache: Dict[str, Dict[str, ToolResult]] = {}
+        self.ids: Dict[str, frozenset[IdKey]] = {}
+        self.touched = time.monotonic()
+        self.nbytes = _ENTRY_BYTES
+
+    def count(self, tool_name: str) -> int:
+        return self.counts.get(tool_name, 0)
+
+    def cached(self, tool_name: str, key: str) -> Optional[ToolResult]:
+        return self.cache.get(tool_name, {}).get(key)
+
+    def known_ids(self, tool_names: Iterable[str]) -> set[IdKey]:
+        known: set[IdKey] = set()
+        for name in tool_names:
+            known.update(self.ids.get(name, ()))
+        return known
+
+
+class ToolStateStore:
+    """LRU + TTL de ThreadToolState com teto de memória e estatísticas."""
+
+    def __init__(
+        self,
+        max_threads: int = TOOL_STATE_MAX_THREADS,
+        ttl_seconds: float = TOOL_STATE_TTL_SECONDS,
+        max_bytes: int = TOOL_STATE_MAX_BYTES,
+        clock: Any = time.monotonic,
+    ) -> None:
+        self.max_threads = max_threads
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self._clock = clock
+        self._threads: "OrderedDict[str, ThreadToolState]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._evictions = {"lru": 0, "ttl": 0, "memory": 0}
+
+    # -- leitura (não cria entradas) ---------------------------------------
+    def peek(self, thread_id: str) -> Optional[ThreadToolState]:
+        with self._lock:
+            state = self._threads.get(thread_id)
+            if state is None:
+                return None
+            if self._expired(state):
+                self._drop(thread_id, "ttl")
+                return None
+            return state
+
+    # -- escrita -----------------------------------------------------------
+    def bump(self, thread_id: str, tool_name: str) -> int:
+        with self._lock:
+            state = self._touch(thread_id)
+            state.counts[tool_name] = state.counts.get(tool_name, 0) + 1
+            return state.counts[tool_name]
+
+    def put_ids(self, thread_id: str, tool_name: str, ids: Iterable[IdKey]) -> None:
+        compact = frozenset(ids)
+        with self._lock:
+            state = self._touch(thread_id)
+            previous = state.ids.get(tool_name)
+            state.ids[tool_name] = compact
+            self._grow(state, (len(compact) - len(previous or ())) * _ID_BYTES)
+            self._enforce(thread_id)
+
+    def put_cache(self, thread_id: str, tool_name: str, key: str, result: ToolResult) -> None:
+        size = sys.getsizeof(key) + sys.getsizeof(result.content)
+        with self._lock:
+            state = self._touch(thread_id)
+            entries = state.cache.setdefault(tool_name, {})
+            previous = entries.get(key)
+            entries[key] = result
+            if previous is not None:
+                size -= sys.getsizeof(key) + sys.getsizeof(previous.content)
+            self._grow(state, size)
+            self._enforce(thread_id)
+
+    def reset(self, thread_id: str) -> None:
+        with self._lock:
+            if thread_id in self._threads:
+                self._drop(thread_id, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._threads.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "threads": len(self._threads),
+                "bytes": self._bytes,
+                "cache_entries": sum(
+                    len(entries) for state in self._threads.values() for entries in state.cache.values()
+                ),
+                "evictions": dict(self._evictions),
+            }
+
+    # -- interno (com o lock) ----------------------------------------------
+    def _expired(self, state: ThreadToolState) -> bool:
+        return self._clock() - state.touched > self.ttl_seconds
+
+    def _touch(self, thread_id: str) -> ThreadToolState:
+        state = self._threads.get(thread_id)
+        if state is not None and self._expired(state):
+            self._drop(thread_id, "ttl")
+            state = None
+        if state is None:
+            state = self._threads[thread_id] = ThreadToolState()
+            self._bytes += state.nbytes
+        else:
+            self._threads.move_to_end(thread_id)
+        state.touched = self._clock()
+        self._enforce(thread_id)
+        return state
+
+    def _grow(self, state: ThreadToolState, size: int) -> None:
+        state.nbytes += size
+        self._bytes += size
+
+    def _drop(self, thread_id: str, reason: Optional[str]) -> None:
+        state = self._threads.pop(thread_id)
+        self._bytes -= state.nbytes
+        if reason:
+            self._evictions[reason] += 1
+
+    def _enforce(self, current: str) -> None:
+        # Expirados saem primeiro (os mais antigos ficam no começo do LRU)
+        while self._threads:
+            oldest_id, oldest = next(iter(self._threads.items()))
+            if oldest_id == current or not self._expired(oldest):
+                break
+            self._drop(oldest_id, "ttl")
+        while len(self._threads) > self.max_threads:
+            oldest_id = next(iter(self._threads))
+            if oldest_id == current:
+                break
+            self._drop(oldest_id, "lru")
+        while self._bytes > self.max_bytes and len(self._threads) > 1:
+            oldest_id = next(iter(self._threads))
+            if oldest_id == current:
+                break
+            self._drop(oldest_id, "memory")
+        state = self._threads.get(current)
+        if self._bytes > self.max_bytes and state is not None and state.cache:
+            # Só sobrou a thread atual: abre mão do cache de respostas dela
+            freed = sum(
+                sys.getsizeof(key) + sys.getsizeof(result.content)
+                for entries in state.cache.values()
+                for key, result in entries.items()
+            )
+            state.cache.clear()
+            self._grow(state, -freed)
+            self._evictions["memory"] += 1
+
+
+__all__ = ["ThreadToolState", "ToolStateStore"]
@@ -1,32 +1,16 @@
-import json
-import re
-import unicodedata
+import threading
 from langchain_core.tools import tool
-from typing import Any, Dict, Iterable, Callable
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, Callable, List, Optional, Tuple
 
 from app.utils.http_client import get_http_client
-from app.agent.aliases import SERVICE_ALIASES
-from app.agent.stop_words import STOPWORDS
+from app.agent.availability import BRAZIL_TZ, format_datetime, parse_datetime, suggest_slots
+from app.agent.catalog import catalog_get, catalog_get_all
+from app.agent.professional_index import get_professional_index
+from app.agent.search import ServiceIndex
+from app.agent.tool_result import ToolResult
 from app.utils.logger import get_logger
 
-def _strip_accents(text: str) -> str:
-    return "".join(
-        c for c in unicodedata.normalize("NFD", text) if unicodedata.category(c) != "Mn"
-    )
-
-
-def _normalize_service_term(term: str | None) -> str | None:
-    if not term:
-        return term
-    text = _strip_accents(term.lower())
-    text = re.sub(r"[^a-z0-9\\s]", " ", text)
-    tokens = [t for t in text.split() if t and t not in STOPWORDS]
-    if not tokens:
-        return term
-    normalized = " ".join(tokens)
-    return SERVICE_ALIASES.get(normalized, normalized)
-
-
 def _trim_fields(item: Dict[str, Any], allowed_keys: Iterable[str]) -> Dict[str, Any]:
     """Keep only whitelisted keys from a dict."""
     return {
@@ -104,24 +88,25 @@ def _compact_response(
     return compacted
 
 
-def _tool_result(payload: Dict[str, Any]) -> str:
-    """Serializa o payload em JSON compacto para ser usado pelo agente."""
-    return json.dumps(payload, ensure_ascii=False, separators=(",", ":"))
+def _tool_result(payload: Dict[str, Any], tool_name: Optional[str] = None) -> ToolResult:
+    """Resultado tipado; o JSON (ou a tabela, se TOOL_RESULT_TABULAR) é gerado uma vez, na entrega ao LLM."""
+    return ToolResult(payload, tool_name)
 
 
 logger = get_logger(__name__)
 
+AGENDAMENTOS_PAGE_SIZE = 50
+
 @tool
-def listar_profissionais_tool(page: int = 1, pageSize: int = 50) -> str:
+def listar_profissionais_tool(page: int = 1, pageSize: int = 50) -> ToolResult:
     """Lista profissionais disponíveis de forma paginada."""
     params = {
         "page": page,
         "pageSize": pageSize,
     }
     logger.info("[tool] listar_profissionais_tool params=%s", params)
-    client = get_http_client()
-    resp = client.get("/profissionais", params=params)
-    return _tool_result(_compact_response(resp, _compact_professional))
+    resp = catalog_get("/profissionais", params=params)
+    return _tool_result(_compact_response(resp, _compact_professional), "listar_profissionais_tool")
 
 @tool
 def listar_servicos_profissional_tool(
@@ -129,7 +114,7 @@ def listar_servicos_profissional_tool(
     page: int = 1,
     pageSize: int = 50,
     incluirValor: bool = False,
-) -> str:
+) -> ToolResult:
     """Lista os serviços oferecidos por um profissional específico."""
     params = {
         "page": page,
@@ -147,12 +132,36 @@ def listar_servicos_profissional_tool(
         logger.warning("[tool] listar_servicos_profissional_tool missing profissionalId")
         return _tool_result({"error": "Profissional não informado"})
 
-    http = get_http_client()
-    resp = http.get(f"/profissionais/{profissionalId}/servicos", params=params)
+    resp = catalog_get(f"/profissionais/{profissionalId}/servicos", params=params)
     return _tool_result(
-        _compact_response(resp, lambda item: _compact_service(item, incluirValor))
+        _compact_response(resp, lambda item: _compact_service(item, incluirValor)),
+        "listar_servicos_profissional_tool",
     )
 
+_service_indexes: Dict[Any, Tuple[Tuple[Dict[str, Any], ...], ServiceIndex]] = {}
+_service_indexes_lock = threading.Lock()
+
+
+def get_service_index(somenteVisiveisCliente: bool | None = None) -> ServiceIndex:
+    """Índice local do catálogo; reconstruído só quando o catálogo é recarregado."""
+    params: Dict[str, Any] = {}
+    if somenteVisiveisCliente is not None:
+        params["somenteVisiveisCliente"] = bool(somenteVisiveisCliente)
+    pages, services = catalog_get_all("/servicos", params)
+
+    key = params.get("somenteVisiveisCliente")
+    with _service_indexes_lock:
+        cached = _service_indexes.get(key)
+        if cached is not None and len(cached[0]) == len(pages) and all(
+            a is b for a, b in zip(cached[0], pages)
+        ):
+            return cached[1]
+        index = ServiceIndex(services)
+        _service_indexes[key] = (pages, index)
+    logger.info("[tool] service index rebuilt services=%s", len(index))
+    return index
+
+
 @tool
 def listar_servicos_tool(
     nome: str | None = None,
@@ -161,27 +170,53 @@ def listar_servicos_tool(
     page: int | None = 1,
     pageSize: int | None = 50,
     incluirValor: bool = False,
-) -> str:
-    """Lista serviços filtrando por nome, categoria e visibilidade."""
-    params: Dict[str, Any] = {
+) -> ToolResult:
+    """Lista serviços filtrando por nome, categoria e visibilidade, do mais relevante ao menos relevante."""
+    logger.info(
+        "[tool] listar_servicos_tool nome=%r categoria=%r page=%s pageSize=%s",
+        nome,
+        categoria,
+        page,
+        pageSize,
+    )
+    index = get_service_index(somenteVisiveisCliente)
+    matches = index.search(nome, categoria=categoria)
+
+    page = max(page or 1, 1)
+    pageSize = max(pageSize or 50, 1)
+    start = (page - 1) * pageSize
+    resp: Dict[str, Any] = {
+        "data": matches[start : start + pageSize],
         "page": page,
         "pageSize": pageSize,
+        "total": len(matches),
     }
+    if not matches:
+        resp["message"] = (
+            "Nenhum serviço encontrado; pergunte ao cliente outro nome ou liste sem filtro"
+        )
+    return _tool_result(
+        _compact_response(resp, lambda item: _compact_service(item, incluirValor)),
+        "listar_servicos_tool",
+    )
 
-    if nome is not None:
-        params["nome"] = _normalize_service_term(nome)
-
-    if categoria is not None:
-        params["categoria"] = _normalize_service_term(categoria)
-
-    logger.info("[tool] listar_servicos_tool params=%s", params)
-    if somenteVisiveisCliente is not None:
-        params["somenteVisiveisCliente"] = bool(somenteVisiveisCliente)
-
-    http = get_http_client()
-    resp = http.get("/servicos", params=params)
+@tool
+def listar_profissionais_servico_tool(servicoId: str) -> ToolResult:
+    """Lista os profissionais que realizam um serviço (use o id retornado pela listagem de serviços)."""
+    logger.info("[tool] listar_profissionais_servico_tool servicoId=%s", servicoId)
+    if not str(servicoId or "").strip():
+        return _tool_result({"error": "ARGS_INVALIDOS", "missing": ["servicoId"]})
+
+    profissionais = get_professional_index().lookup(servicoId)
+    resp: Dict[str, Any] = {
+        "data": profissionais,
+        "servicoId": str(servicoId),
+        "total": len(profissionais),
+    }
+    if not profissionais:
+        resp["message"] = "Nenhum profissional realiza este serviço; sugira outro serviço ao cliente"
     return _tool_result(
-        _compact_response(resp, lambda item: _compact_service(item, incluirValor))
+        _compact_response(resp, _compact_professional), "listar_profissionais_servico_tool"
     )
 
 @tool
@@ -194,7 +229,7 @@ def criar_agendamento_tool(
     valor: str,
     observacoes: str | None = None,
     confirmado: bool | None = None,
-) -> str:
+) -> ToolResult:
     """Cria um agendamento a partir dos dados fornecidos."""
 
     required_fields = [
@@ -248,20 +283,129 @@ def criar_agendamento_tool(
 def listar_agendamentos_tool(
     dataInicio: str,
     dataFim: str,
-    page: int | None = 1,
-    pageSize: int | None = 50,
-) -> str:
+) -> ToolResult:
     """
-    Lista todos os agendamentos passando os paramentros de roda data de inicio, data do fim e id do cliente
+    Lista todos os agendamentos do período entre data de inicio e data do fim (todas as páginas).
     """
     params: Dict[str, Any] = {
         "dataInicio": dataInicio,
         "dataFim": dataFim,
-        "page": page,
-        "pageSize": pageSize,
     }
 
     logger.info("[tool] listar_agendamentos_tool params=%s", params)
     http = get_http_client()
-    resp = http.get("/agendamentos", params=params)
-    return _tool_result(_compact_response(resp, _compact_agendamento))
+    resp = http.get_all_pages("/agendamentos", params=params, page_size=AGENDAMENTOS_PAGE_SIZE)
+    return _tool_result(_compact_response(resp, _compact_agendamento), "listar_agendamentos_tool")
+
+
+def _fetch_agendamentos(dataInicio: str, dataFim: str) -> List[Dict[str, Any]]:
+    """Todos os agendamentos do intervalo (todas as páginas)."""
+    resp = get_http_client().get_all_pages(
+        "/agendamentos",
+        params={"dataInicio": dataInicio, "dataFim": dataFim},
+        page_size=AGENDAMENTOS_PAGE_SIZE,
+    )
+    data = resp.get("data") if isinstance(resp, dict) else None
+    return data if isinstance(data, list) else []
+
+def _find_service(servicoId: Any) -> Optional[Dict[str, Any]]:
+    wanted = str(servicoId)
+    return next(
+        (s for s in get_service_index().services if str(s.get("id")) == wanted),
+        None,
+    )
+
+
+@tool
+def sugerir_horarios_tool(
+    servicoId: str,
+    profissionalId: str | None = None,
+    dataInicio: str | None = None,
+    dias: int = 7,
+    quantidade: int = 3,
+    duracaoEmMinutos: int | None = None,
+) -> ToolResult:
+    """
+    Sugere os próximos horários livres para um serviço, já respeitando o horário
+    de funcionamento, a duração do serviço e os agendamentos existentes.
+    Sem profissionalId, considera todos os profissionais que realizam o serviço.
+    """
+    logger.info(
+        "[tool] sugerir_horarios_tool servicoId=%s profissionalId=%s dataInicio=%s dias=%s",
+        servicoId,
+        profissionalId,
+        dataInicio,
+        dias,
+    )
+    if not str(servicoId or "").strip():
+        return _tool_result({"error": "ARGS_INVALIDOS", "missing": ["servicoId"]})
+
+    servico = _find_service(servicoId)
+    duration = duracaoEmMinutos or (servico or {}).get("duracaoEmMinutos")
+    try:
+        duration = int(duration)
+    except (TypeError, ValueError):
+        return _tool_result(
+            {
+                "error": "DURACAO_DESCONHECIDA",
+                "message": "Informe duracaoEmMinutos do serviço retornado pela listagem",
+                "value": str(servicoId),
+            }
+        )
+
+    profissionais = get_professional_index().lookup(servicoId)
+    if profissionalId:
+        # Só ids do catálogo: os profissionalId dos horários sugeridos passam a
+        # valer em criar_agendamento_tool (graph._PROFISSIONAL_ID_TOOLS).
+        profissionais = [p for p in profissionais if str(p.get("id")) == str(profissionalId).strip()]
+        if not profissionais:
+            return _tool_result(
+                {
+                    "error": "PROFISSIONAL_ID_INVALIDO",
+                    "message": "Este profissional não realiza o serviço; use listar_profissionais_servico_tool",
+                    "value": str(profissionalId),
+                }
+            )
+    elif not profissionais:
+        return _tool_result(
+            {
+                "error": "SEM_PROFISSIONAL",
+                "message": "Nenhum profissional realiza este serviço",
+                "value": str(servicoId),
+            }
+        )
+
+    now = datetime.now(BRAZIL_TZ)
+    start = parse_datetime(dataInicio) if dataInicio else None
+    if dataInicio and start is None:
+        return _tool_result(
+            {"error": "DATA_INVALIDA", "message": "Use o formato AAAA-MM-DDTHH:MM:SS", "value": dataInicio}
+        )
+    dias = min(max(dias or 7, 1), 31)
+    quantidade = min(max(quantidade or 3, 1), 10)
+    window_start = max(start or now, now)
+    window_end = window_start + timedelta(days=dias)
+    # Desde o início do dia: um agendamento que começou antes de agora e ainda
+    # está em andamento também ocupa o profissional (suggest_slots corta em now)
+    fetch_start = window_start.replace(hour=0, minute=0, second=0, microsecond=0)
+
+    agendamentos = _fetch_agendamentos(
+        format_datetime(fetch_start), format_datetime(window_end)
+    )
+    slots = suggest_slots(
+        agendamentos,
+        profissionais,
+        duration,
+        start=start,
+        days=dias,
+        limit=quantidade,
+        now=now,
+    )
+    resp: Dict[str, Any] = {
+        "data": slots,
+        "servicoId": str(servicoId),
+        "duracaoEmMinutos": duration,
+    }
+    if not slots:
+        resp["message"] = f"Sem horários livres nos próximos {dias} dias; pergunte outra data ao cliente"
+    return _tool_result(resp, "sugerir_horarios_tool")
@@ -0,0 +1,226 @@
+"""
+Checkpointer durável do LangGraph (SQLite ou Postgres) com serialização comprimida.
+
+Com um processo por mensagem, o MemorySaver perdia o histórico do thread a
+cada turno. Aqui o estado fica em disco/banco e o próximo turno retoma com
+uma leitura indexada por thread_id.
+
+CHECKPOINTER: "memory" | "sqlite" | "postgres". Sem valor, usa Postgres se
+DATABASE_URL estiver definido, senão SQLite em CHECKPOINT_SQLITE_PATH.
+"""
+import os
+import zlib
+import asyncio
+import sqlite3
+from typing import Any, AsyncIterator, Iterator, Optional, Sequence
+
+from dotenv import load_dotenv
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+)
+from langgraph.checkpoint.memory import MemorySaver
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+
+from app.utils.logger import get_logger
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - depende do ambiente
+    zstandard = None  # type: ignore[assignment]
+
+load_dotenv()
+
+logger = get_logger(__name__)
+
+CHECKPOINTER = os.getenv("CHECKPOINTER", "").lower()
+CHECKPOINT_SQLITE_PATH = os.getenv("CHECKPOINT_SQLITE_PATH", ".cache/checkpoints.sqlite")
+CHECKPOINT_COMPRESS_MIN_BYTES = int(os.getenv("CHECKPOINT_COMPRESS_MIN_BYTES", "256"))
+
+
+class CompressedSerializer:
+    """SerializerProtocol que comprime (zstd, ou zlib) o payload do serializer interno.
+
+    O tipo gravado ganha um prefixo ("zstd:"/"zlib:"), então checkpoints antigos
+    sem compressão continuam legíveis.
+    """
+
+    def __init__(
+        self,
+        inner: Optional[Any] = None,
+        min_bytes: int = CHECKPOINT_COMPRESS_MIN_BYTES,
+        level: int = 3,
+    ) -> None:
+        self.inner = inner or JsonPlusSerializer()
+        self.min_bytes = min_bytes
+        self.level = level
+
+    def _compress(self, data: bytes) -> tuple[str, bytes]:
+        if zstandard is not None:
+            return "zstd", zstandard.ZstdCompressor(level=self.level).compress(data)
+        return "zlib", zlib.compress(data, self.level)
+
+    def dumps_typed(self, obj: Any) -> tuple[str, bytes]:
+        type_, data = self.inner.dumps_typed(obj)
+        if len(data) < self.min_bytes:
+            return type_, data
+        codec, compressed = self._compress(data)
+        return f"{codec}:{type_}", compressed
+
+    def loads_typed(self, data: tuple[str, bytes]) -> Any:
+        type_, payload = data
+        codec, sep, inner_type = type_.partition(":")
+        if sep and codec == "zstd":
+            if zstandard is None:  # pragma: no cover - depende do ambiente
+                raise RuntimeError("checkpoint comprimido com zstd, mas zstandard não está instalado")
+            return self.inner.loads_typed(
+                (inner_type, zstandard.ZstdDecompressor().decompress(payload))
+            )
+        if sep and codec == "zlib":
+            return self.inner.loads_typed((inner_type, zlib.decompress(payload)))
+        return self.inner.loads_typed(data)
+
+
+class ThreadedAsyncSaver(BaseCheckpointSaver):
+    """Expõe a API assíncrona de um checkpointer síncrono via threads.
+
+    SqliteSaver e PostgresSaver (com pool) são thread-safe, mas o SqliteSaver
+    não implementa os métodos async usados por graph.ainvoke.
+    """
+
+    def __init__(self, saver: BaseCheckpointSaver) -> None:
+        super().__init__(serde=saver.serde)
+        self.saver = saver
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        return self.saver.get_tuple(config)
+
+    def list(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> Iterator[CheckpointTuple]:
+        return self.saver.list(config, filter=filter, before=before, limit=limit)
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        return self.saver.put(config, checkpoint, metadata, new_versions)
+
+    def put_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        self.saver.put_writes(config, writes, task_id, task_path)
+
+    def delete_thread(self, thread_id: str) -> None:
+        self.saver.delete_thread(thread_id)
+
+    def get_next_version(self, current: Any, channel: None) -> Any:
+        return self.saver.get_next_version(current, channel)
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        return await asyncio.to_thread(self.saver.get_tuple, config)
+
+    async def alist(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        items = await asyncio.to_thread(
+            lambda: list(self.saver.list(config, filter=filter, before=before, limit=limit))
+        )
+        for item in items:
+            yield item
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        return await asyncio.to_thread(self.saver.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        await asyncio.to_thread(self.saver.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        await asyncio.to_thread(self.saver.delete_thread, thread_id)
+
+
+def create_sqlite_checkpointer(path: str = CHECKPOINT_SQLITE_PATH) -> BaseCheckpointSaver:
+    from langgraph.checkpoint.sqlite import SqliteSaver
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    conn = sqlite3.connect(path, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    saver = SqliteSaver(conn, serde=CompressedSerializer())
+    saver.setup()
+    return ThreadedAsyncSaver(saver)
+
+
+def create_postgres_checkpointer(db_url: Optional[str] = None) -> BaseCheckpointSaver:
+    from langgraph.checkpoint.postgres import PostgresSaver
+    from psycopg.rows import dict_row
+    from psycopg_pool import ConnectionPool
+
+    pool = ConnectionPool(
+        db_url or os.environ["DATABASE_URL"],
+        min_size=1,
+        max_size=int(os.getenv("DB_POOL_MAX_SIZE", "5")),
+        kwargs={"autocommit": True, "prepare_threshold": 0, "row_factory": dict_row},
+        open=True,
+    )
+    saver = PostgresSaver(pool, serde=CompressedSerializer())  # type: ignore[arg-type]
+    saver.setup()
+    return ThreadedAsyncSaver(saver)
+
+
+def create_checkpointer(kind: str = CHECKPOINTER) -> BaseCheckpointSaver:
+    """Checkpointer configurado por CHECKPOINTER (ver docstring do módulo)."""
+    kind = kind or ("postgres" if os.getenv("DATABASE_URL") else "sqlite")
+    try:
+        if kind == "postgres":
+            saver = create_postgres_checkpointer()
+        elif kind == "sqlite":
+            saver = create_sqlite_checkpointer()
+        else:
+            return MemorySaver()
+    except Exception as exc:
+        logger.error("[checkpointer] %s indisponível, usando MemorySaver: %s", kind, exc)
+        return MemorySaver()
+    logger.info("[checkpointer] usando %s", kind)
+    return saver
+
+
+__all__ = [
+    "CompressedSerializer",
+    "ThreadedAsyncSaver",
+    "create_checkpointer",
+    "create_postgres_checkpointer",
+    "create_sqlite_checkpointer",
+]
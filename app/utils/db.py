@@ -1,9 +1,28 @@
 import os
-from contextlib import contextmanager
-from typing import Iterator
+import asyncio
+import threading
+from contextlib import asynccontextmanager, contextmanager
+from typing import AsyncIterator, Iterator, Optional
 
 import psycopg
 
+try:  # psycopg[pool]; sem ele cada get_connection abre uma conexão nova
+    from psycopg_pool import AsyncConnectionPool, ConnectionPool
+except ImportError:  # pragma: no cover - depende do ambiente
+    AsyncConnectionPool = None  # type: ignore[assignment,misc]
+    ConnectionPool = None  # type: ignore[assignment,misc]
+
+
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", "1"))
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "5"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+
+_pool: Optional["ConnectionPool"] = None
+_async_pool: Optional["AsyncConnectionPool"] = None
+# Worker do write-behind e threads de requisição podem pedir o pool ao mesmo tempo
+_pool_lock = threading.Lock()
+_async_pool_lock = asyncio.Lock()
+
 
 def _get_db_url() -> str:
     db_url = os.getenv("DATABASE_URL", "")
@@ -12,16 +31,95 @@ def _get_db_url() -> str:
     return db_url
 
 
+def get_pool() -> Optional["ConnectionPool"]:
+    """Pool de conexões (autocommit) compartilhado pelo processo."""
+    global _pool
+    if ConnectionPool is None:
+        return None
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(
+                    _get_db_url(),
+                    min_size=DB_POOL_MIN_SIZE,
+                    max_size=DB_POOL_MAX_SIZE,
+                    timeout=DB_POOL_TIMEOUT,
+                    kwargs={"autocommit": True},
+                    open=True,
+                )
+    return _pool
+
+
+async def get_async_pool() -> Optional["AsyncConnectionPool"]:
+    global _async_pool
+    if AsyncConnectionPool is None:
+        return None
+    if _async_pool is None:
+        async with _async_pool_lock:
+            if _async_pool is None:
+                pool = AsyncConnectionPool(
+                    _get_db_url(),
+                    min_size=DB_POOL_MIN_SIZE,
+                    max_size=DB_POOL_MAX_SIZE,
+                    timeout=DB_POOL_TIMEOUT,
+                    kwargs={"autocommit": True},
+                    open=False,
+                )
+                await pool.open()
+                # Só publica depois de aberto: quem chega junto espera no lock
+                _async_pool = pool
+    return _async_pool
+
+
 @contextmanager
 def get_connection() -> Iterator[psycopg.Connection]:
     """
-    Context manager para obter conexão com autocommit.
+    Context manager para obter conexão com autocommit (emprestada do pool).
     Uso:
         with get_connection() as conn:
             ...
     """
+    pool = get_pool()
+    if pool is not None:
+        with pool.connection() as conn:
+            yield conn
+        return
+
     conn = psycopg.connect(_get_db_url(), autocommit=True)
     try:
         yield conn
     finally:
         conn.close()
+
+
+@asynccontextmanager
+async def get_async_connection() -> AsyncIterator[psycopg.AsyncConnection]:
+    """Versão assíncrona de get_connection."""
+    pool = await get_async_pool()
+    if pool is not None:
+        async with pool.connection() as conn:
+            yield conn
+        return
+
+    conn = await psycopg.AsyncConnection.connect(_get_db_url(), autocommit=True)
+    try:
+        yield conn
+    finally:
+        await conn.close()
+
+
+def close_pools() -> None:
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.close()
+
+
+async def aclose_pools() -> None:
+    global _async_pool
+    close_pools()
+    async with _async_pool_lock:
+        pool, _async_pool = _async_pool, None
+    if pool is not None:
+        await pool.close()
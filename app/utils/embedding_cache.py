@@ -0,0 +1,152 @@
+"""
+Cache de embeddings endereçado por conteúdo.
+
+Chave: sha256 de (modelo, dimensões, texto). Dois níveis:
+- memória: LRU limitado (EMBEDDING_CACHE_SIZE)
+- disco: SQLite local com vetores float32 (EMBEDDING_CACHE_PATH; vazio desativa),
+  limitado a EMBEDDING_CACHE_DISK_ITEMS linhas (saem as gravadas há mais tempo)
+
+Erros do SQLite (arquivo travado ou corrompido) contam como miss: o turno
+segue calculando o embedding.
+"""
+import os
+import array
+import hashlib
+import sqlite3
+import time
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence
+
+from dotenv import load_dotenv
+
+from app.utils.logger import get_logger
+
+load_dotenv()
+
+logger = get_logger(__name__)
+
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "5000"))
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", ".cache/embeddings.sqlite")
+EMBEDDING_CACHE_DISK_ITEMS = int(os.getenv("EMBEDDING_CACHE_DISK_ITEMS", "100000"))
+
+
+def embedding_key(model: str, dimensions: int, text: str) -> str:
+    return hashlib.sha256(f"{model}\x1f{dimensions}\x1f{text}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """LRU em memória com persistência opcional em SQLite."""
+
+    def __init__(
+        self,
+        model: str,
+        dimensions: int,
+        path: Optional[str] = EMBEDDING_CACHE_PATH,
+        max_items: int = EMBEDDING_CACHE_SIZE,
+        max_disk_items: int = EMBEDDING_CACHE_DISK_ITEMS,
+    ) -> None:
+        self.model = model
+        self.dimensions = dimensions
+        self.max_items = max_items
+        self.max_disk_items = max_disk_items
+        self.stats: Dict[str, int] = {"memory_hits": 0, "disk_hits": 0, "misses": 0}
+        self._memory: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        if path:
+            try:
+                os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+                self._db = sqlite3.connect(path, check_same_thread=False)
+                self._db.execute("PRAGMA journal_mode=WAL")
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS embeddings "
+                    "(key TEXT PRIMARY KEY, vector BLOB NOT NULL, created_at REAL NOT NULL DEFAULT 0)"
+                )
+                columns = {row[1] for row in self._db.execute("PRAGMA table_info(embeddings)")}
+                if "created_at" not in columns:  # arquivo criado antes do limite de linhas
+                    self._db.execute("ALTER TABLE embeddings ADD COLUMN created_at REAL NOT NULL DEFAULT 0")
+                self._db.execute(
+                    "CREATE INDEX IF NOT EXISTS embeddings_created_at ON embeddings (created_at)"
+                )
+                self._db.commit()
+            except sqlite3.Error as exc:
+                logger.warning("[embeddings] cache em disco indisponível path=%s error=%s", path, exc)
+                self._db = None
+
+    def _remember(self, key: str, vector: List[float]) -> None:
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_items:
+            self._memory.popitem(last=False)
+
+    def get_many(self, texts: Sequence[str]) -> List[Optional[List[float]]]:
+        keys = [embedding_key(self.model, self.dimensions, t) for t in texts]
+        found: List[Optional[List[float]]] = [None] * len(keys)
+        with self._lock:
+            missing: Dict[str, List[int]] = {}
+            for i, key in enumerate(keys):
+                vector = self._memory.get(key)
+                if vector is not None:
+                    self._memory.move_to_end(key)
+                    found[i] = vector
+                    self.stats["memory_hits"] += 1
+                else:
+                    missing.setdefault(key, []).append(i)
+
+            if missing and self._db is not None:
+                placeholders = ",".join("?" * len(missing))
+                try:
+                    rows = self._db.execute(
+                        f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})",
+                        list(missing),
+                    ).fetchall()
+                except sqlite3.Error as exc:
+                    logger.warning("[embeddings] falha ao ler cache em disco: %s", exc)
+                    rows = []
+                for key, blob in rows:
+                    vector = array.array("f", blob).tolist()
+                    self._remember(key, vector)
+                    for i in missing.pop(key):
+                        found[i] = vector
+                        self.stats["disk_hits"] += 1
+
+            self.stats["misses"] += sum(len(idx) for idx in missing.values())
+        return found
+
+    def put_many(self, texts: Sequence[str], vectors: Sequence[Sequence[float]]) -> None:
+        rows = []
+        now = time.time()
+        with self._lock:
+            for text, vector in zip(texts, vectors):
+                key = embedding_key(self.model, self.dimensions, text)
+                self._remember(key, list(vector))
+                rows.append((key, array.array("f", vector).tobytes(), now))
+            if rows and self._db is not None:
+                try:
+                    self._db.executemany(
+                        "INSERT OR REPLACE INTO embeddings (key, vector, created_at) VALUES (?, ?, ?)", rows
+                    )
+                    self._evict_disk()
+                    self._db.commit()
+                except sqlite3.Error as exc:
+                    logger.warning("[embeddings] falha ao gravar cache em disco: %s", exc)
+
+    def _evict_disk(self) -> None:
+        """Mantém o SQLite em até max_disk_items linhas (chamado com o lock, antes do commit)."""
+        (count,) = self._db.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+        excess = count - self.max_disk_items
+        if excess > 0:
+            self._db.execute(
+                "DELETE FROM embeddings WHERE key IN "
+                "(SELECT key FROM embeddings ORDER BY created_at LIMIT ?)",
+                (excess,),
+            )
+
+    def hit_ratio(self) -> float:
+        hits = self.stats["memory_hits"] + self.stats["disk_hits"]
+        total = hits + self.stats["misses"]
+        return hits / total if total else 0.0
+
+
+__all__ = ["EmbeddingCache", "embedding_key"]
@@ -1,23 +1,96 @@
 import os
+import math
+import asyncio
 import logging
+import threading
 import requests
-from typing import Any, Dict, Optional
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from typing import Any, Callable, Dict, List, Optional
+from urllib.parse import urlencode
 from dotenv import load_dotenv
 
+try:  # httpx é opcional: só é necessário para o AsyncHttpClient
+    import httpx
+except ImportError:  # pragma: no cover - depende do ambiente
+    httpx = None  # type: ignore[assignment]
+
+try:
+    import h2  # noqa: F401
+
+    _HTTP2_AVAILABLE = True
+except ImportError:  # pragma: no cover - depende do ambiente
+    _HTTP2_AVAILABLE = False
+
 load_dotenv()
 
 
 logger = logging.getLogger(__name__)
 
+HTTP_PAGE_CONCURRENCY = int(os.getenv("HTTP_PAGE_CONCURRENCY", "4"))
+HTTP_MAX_PAGES = int(os.getenv("HTTP_MAX_PAGES", "20"))
+# GETs idênticos simultâneos compartilham uma única requisição (single-flight)
+HTTP_COALESCE_GETS = os.getenv("HTTP_COALESCE_GETS", "true").lower() not in ("0", "false", "no")
+
 
 class HttpClientError(Exception):
     """Erro específico para chamadas HTTP do agente SVIM."""
 
 
-class HttpClient:
-    """HTTP client com configuração fixa e validações de segurança."""
+class _Flight:
+    __slots__ = ("done", "result", "error", "waiters")
+
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Chamadas concorrentes com a mesma chave esperam a execução já em andamento.
+
+    Todos recebem o mesmo objeto de resposta (como no cache do catálogo): não
+    o modifique. Erros também são compartilhados.
+    """
 
     def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._flights: Dict[str, _Flight] = {}
+        self.coalesced = 0
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+            else:
+                flight.waiters += 1
+                self.coalesced += 1
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = fn()
+            return flight.result
+        except BaseException as exc:
+            flight.error = exc
+            raise
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.done.set()
+
+
+class _BaseHttpClient:
+    """Configuração comum (URL base, headers, timeout e pool) dos clientes HTTP."""
+
+    def __init__(self, pool_size: Optional[int] = None) -> None:
         base_url = os.getenv("URL_BASE", "").rstrip("/")
         if not base_url:
             raise ValueError("URL_BASE não definida para o cliente HTTP da SVIM")
@@ -31,6 +104,7 @@ class HttpClient:
         }
 
         self.timeout = float(os.getenv("HTTP_TIMEOUT", 10))
+        self.pool_size = pool_size or int(os.getenv("HTTP_POOL_SIZE", 10))
 
     def _full_url(self, path: str) -> str:
         if path.startswith("http://") or path.startswith("https://"):
@@ -41,11 +115,81 @@ class HttpClient:
             path = f"/{path}"
         return f"{self.base_url}{path}"
 
+    @staticmethod
+    def _clean_params(params: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        # requests ignora parâmetros None; httpx os enviaria vazios.
+        return {k: v for k, v in (params or {}).items() if v is not None}
+
+    def _flight_key(self, path: str, params: Optional[Dict[str, Any]]) -> str:
+        query = urlencode(sorted(self._clean_params(params).items()), doseq=True)
+        return f"GET {self._full_url(path)}?{query}"
+
+    @staticmethod
+    def _page_params(params: Optional[Dict[str, Any]], page: int, page_size: int) -> Dict[str, Any]:
+        return {**(params or {}), "page": page, "pageSize": page_size}
+
+    @staticmethod
+    def _remaining_pages(first: Any, page_size: int, max_pages: int) -> Optional[List[int]]:
+        """Páginas que faltam segundo o `total` da primeira resposta.
+
+        None quando não há `total`: o chamador segue página a página.
+        """
+        data = first.get("data") if isinstance(first, dict) else None
+        if not isinstance(data, list) or len(data) < page_size:
+            return []
+        total = first.get("total")
+        if not isinstance(total, int):
+            return None
+        last = min(math.ceil(total / page_size), max_pages)
+        return list(range(2, last + 1))
+
+    @staticmethod
+    def _merge_pages(responses: List[Any], max_pages: int) -> Dict[str, Any]:
+        """Concatena `data` das páginas (em ordem) em uma única resposta."""
+        first = responses[0] if responses else {}
+        if not isinstance(first, dict) or first.get("error") or not isinstance(first.get("data"), list):
+            return first
+        items: List[Any] = []
+        for resp in responses:
+            data = resp.get("data") if isinstance(resp, dict) else None
+            if isinstance(data, list):
+                items.extend(data)
+        total = first.get("total")
+        merged: Dict[str, Any] = {"data": items, "total": total if isinstance(total, int) else len(items)}
+        if merged["total"] > len(items):
+            merged["message"] = f"Resultado limitado a {max_pages} páginas; restrinja o período"
+        return merged
+
+
+class HttpClient(_BaseHttpClient):
+    """HTTP client com configuração fixa e validações de segurança.
+
+    Reaproveita conexões (keep-alive) por meio de uma requests.Session com pool
+    de tamanho configurável (HTTP_POOL_SIZE).
+    """
+
+    def __init__(self, pool_size: Optional[int] = None) -> None:
+        super().__init__(pool_size)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.coalesce_gets = HTTP_COALESCE_GETS
+        self._single_flight = SingleFlight()
+
+    @property
+    def coalesced_requests(self) -> int:
+        """GETs atendidos por uma requisição idêntica que já estava em andamento."""
+        return self._single_flight.coalesced
+
+    def close(self) -> None:
+        self.session.close()
+
     def _request(self, method: str, path: str, **kwargs: Any) -> Dict[str, Any]:
         url = self._full_url(path)
         headers = {**self.headers, **kwargs.pop("headers", {})}
         try:
-            resp = requests.request(
+            resp = self.session.request(
                 method,
                 url,
                 headers=headers,
@@ -77,13 +221,145 @@ class HttpClient:
             raise HttpClientError("INVALID_JSON_RESPONSE")
 
     def get(self, path: str, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
-        return self._request("GET", path, params=params or {})
+        if not self.coalesce_gets:
+            return self._request("GET", path, params=params or {})
+        return self._single_flight.do(
+            self._flight_key(path, params),
+            lambda: self._request("GET", path, params=params or {}),
+        )
 
     def post(self, path: str, json: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
         return self._request("POST", path, json=json or {})
 
+    def get_all_pages(
+        self,
+        path: str,
+        params: Optional[Dict[str, Any]] = None,
+        page_size: int = 50,
+        max_pages: int = HTTP_MAX_PAGES,
+        concurrency: int = HTTP_PAGE_CONCURRENCY,
+    ) -> Dict[str, Any]:
+        """GET de todas as páginas: lê `total` da primeira e busca o resto em paralelo."""
+        first = self.get(path, self._page_params(params, 1, page_size))
+        responses = [first]
+        remaining = self._remaining_pages(first, page_size, max_pages)
+        if remaining is None:
+            # Sem total: segue em sequência até uma página incompleta
+            for page in range(2, max_pages + 1):
+                resp = self.get(path, self._page_params(params, page, page_size))
+                responses.append(resp)
+                data = resp.get("data") if isinstance(resp, dict) else None
+                if not isinstance(data, list) or len(data) < page_size:
+                    break
+        elif remaining:
+            workers = max(1, min(concurrency, self.pool_size, len(remaining)))
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="http-pages") as pool:
+                responses.extend(
+                    pool.map(
+                        lambda page: self.get(path, self._page_params(params, page, page_size)),
+                        remaining,
+                    )
+                )
+        return self._merge_pages(responses, max_pages)
+
+
+class AsyncHttpClient(_BaseHttpClient):
+    """Variante assíncrona do HttpClient (httpx), com HTTP/2 quando disponível."""
+
+    def __init__(self, pool_size: Optional[int] = None) -> None:
+        if httpx is None:
+            raise HttpClientError("httpx não instalado; AsyncHttpClient indisponível")
+        super().__init__(pool_size)
+        self.client = httpx.AsyncClient(
+            headers=self.headers,
+            timeout=self.timeout,
+            http2=_HTTP2_AVAILABLE,
+            limits=httpx.Limits(
+                max_connections=self.pool_size,
+                max_keepalive_connections=self.pool_size,
+            ),
+        )
+        self.coalesce_gets = HTTP_COALESCE_GETS
+        self._in_flight: Dict[str, "asyncio.Task[Dict[str, Any]]"] = {}
+        self.coalesced_requests = 0
+
+    async def aclose(self) -> None:
+        await self.client.aclose()
+
+    async def _request(self, method: str, path: str, **kwargs: Any) -> Dict[str, Any]:
+        url = self._full_url(path)
+        try:
+            resp = await self.client.request(method, url, **kwargs)
+            resp.raise_for_status()
+            return resp.json()
+        except httpx.HTTPStatusError as exc:  # pragma: no cover - comportamento de rede
+            response = exc.response
+            body = (response.text or "") if response is not None else ""
+            body_preview = body.replace("\n", " ")[:500]
+            print(
+                f"[SVIM] HTTP error method={method} url={url} "
+                f"status={response.status_code if response is not None else None} "
+                f"body={body_preview}"
+            )
+            raise HttpClientError(f"{exc} | body={body_preview}") from exc
+        except httpx.HTTPError as exc:  # pragma: no cover - comportamento de rede
+            logger.error("HTTP client error", exc_info=exc)
+            raise HttpClientError(str(exc))
+        except ValueError as exc:  # pragma: no cover - JSON inválido
+            logger.error("Invalid JSON from HTTP client", exc_info=exc)
+            raise HttpClientError("INVALID_JSON_RESPONSE")
+
+    async def get(self, path: str, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        if not self.coalesce_gets:
+            return await self._request("GET", path, params=self._clean_params(params))
+        key = self._flight_key(path, params)
+        task = self._in_flight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(
+                self._request("GET", path, params=self._clean_params(params))
+            )
+            self._in_flight[key] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        else:
+            self.coalesced_requests += 1
+        # shield: cancelar um dos chamadores não cancela a requisição dos outros
+        return await asyncio.shield(task)
+
+    async def post(self, path: str, json: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        return await self._request("POST", path, json=json or {})
+
+    async def get_all_pages(
+        self,
+        path: str,
+        params: Optional[Dict[str, Any]] = None,
+        page_size: int = 50,
+        max_pages: int = HTTP_MAX_PAGES,
+        concurrency: int = HTTP_PAGE_CONCURRENCY,
+    ) -> Dict[str, Any]:
+        """Versão assíncrona de HttpClient.get_all_pages (paralelismo por semáforo)."""
+        first = await self.get(path, self._page_params(params, 1, page_size))
+        responses = [first]
+        remaining = self._remaining_pages(first, page_size, max_pages)
+        if remaining is None:
+            for page in range(2, max_pages + 1):
+                resp = await self.get(path, self._page_params(params, page, page_size))
+                responses.append(resp)
+                data = resp.get("data") if isinstance(resp, dict) else None
+                if not isinstance(data, list) or len(data) < page_size:
+                    break
+        elif remaining:
+            semaphore = asyncio.Semaphore(max(1, min(concurrency, self.pool_size)))
+
+            async def _fetch(page: int) -> Dict[str, Any]:
+                async with semaphore:
+                    return await self.get(path, self._page_params(params, page, page_size))
+
+            responses.extend(await asyncio.gather(*(_fetch(page) for page in remaining)))
+        return self._merge_pages(responses, max_pages)
+
 
 _default_client: Optional[HttpClient] = None
+_default_async_client: Optional[AsyncHttpClient] = None
 
 
 def get_http_client() -> HttpClient:
@@ -93,4 +369,19 @@ def get_http_client() -> HttpClient:
     return _default_client
 
 
-__all__ = ["HttpClient", "HttpClientError", "get_http_client"]
+def get_async_http_client() -> AsyncHttpClient:
+    """AsyncHttpClient compartilhado; deve ser usado sempre no mesmo event loop."""
+    global _default_async_client
+    if _default_async_client is None:
+        _default_async_client = AsyncHttpClient()
+    return _default_async_client
+
+
+__all__ = [
+    "AsyncHttpClient",
+    "HttpClient",
+    "HttpClientError",
+    "SingleFlight",
+    "get_async_http_client",
+    "get_http_client",
+]
@@ -1,19 +1,124 @@
 import os
-from datetime import datetime, UTC
+import re
+import asyncio
+import hashlib
+import unicodedata
+from datetime import datetime, timedelta, UTC
 from typing import Any, Dict, List, Optional
-from uuid import uuid4
+from uuid import NAMESPACE_URL, uuid5
 
-from openai import OpenAI
-from qdrant_client import QdrantClient
+from openai import AsyncOpenAI, OpenAI
+from qdrant_client import AsyncQdrantClient, QdrantClient
+
+from app.utils.embedding_cache import EmbeddingCache
+from app.utils.rate_limit import openai_async_http_client, openai_http_client
 from qdrant_client.models import (
+    CreateAlias,
+    CreateAliasOperation,
+    DeleteAlias,
+    DeleteAliasOperation,
+    Direction,
     Distance,
     FieldCondition,
     Filter,
     MatchValue,
+    OrderBy,
+    PayloadSchemaType,
     PointStruct,
     VectorParams,
 )
 
+# Mensagens sem valor de recuperação: não vale pagar embedding nem ocupar a coleção.
+TRIVIAL_MESSAGES = {
+    "ok",
+    "okay",
+    "oi",
+    "ola",
+    "sim",
+    "nao",
+    "s",
+    "n",
+    "ta",
+    "certo",
+    "beleza",
+    "blz",
+    "valeu",
+    "obrigado",
+    "obrigada",
+    "obg",
+    "brigado",
+    "brigada",
+    "perfeito",
+    "show",
+    "top",
+    "joia",
+    "combinado",
+    "tchau",
+    "bom dia",
+    "boa tarde",
+    "boa noite",
+    "ok obrigado",
+    "ok obrigada",
+    "sim obrigado",
+    "sim obrigada",
+}
+
+# Versão do schema da coleção (coleção + índices de payload). Suba ao mudar
+# PAYLOAD_INDEXES/vetores e rode `make qdrant-migrate`.
+QDRANT_SCHEMA_VERSION = 1
+# "verify": uma chamada barata na construção (migra se o marcador estiver velho);
+# "skip": nenhuma chamada (schema garantido pelo passo de migração do deploy).
+QDRANT_SCHEMA_CHECK = os.getenv("QDRANT_SCHEMA_CHECK", "verify").lower()
+
+# Prazo total para montar o contexto híbrido; o que não chegar a tempo fica de fora.
+MEMORY_CONTEXT_TIMEOUT = float(os.getenv("MEMORY_CONTEXT_TIMEOUT", "2.5"))
+
+_POINT_NAMESPACE = uuid5(NAMESPACE_URL, "svim/qdrant-memory")
+
+
+def _normalize_text(text: str) -> str:
+    text = unicodedata.normalize("NFD", (text or "").lower())
+    text = "".join(c for c in text if unicodedata.category(c) != "Mn")
+    return " ".join(re.sub(r"[^a-z0-9]+", " ", text).split())
+
+
+_EPOCH = datetime.min.replace(tzinfo=UTC)
+
+
+def _created_at(payload: Dict[str, Any]) -> datetime:
+    """Instante de created_at (ISO, com ou sem offset; sem offset = UTC)."""
+    try:
+        value = datetime.fromisoformat(str(payload.get("created_at") or ""))
+    except ValueError:
+        return _EPOCH
+    return value if value.tzinfo else value.replace(tzinfo=UTC)
+
+
+def _turn_created_at(value: Any) -> datetime:
+    """created_at do turno vindo do chamador; inválido ou ausente vira agora (UTC)."""
+    if isinstance(value, datetime):
+        return value if value.tzinfo else value.replace(tzinfo=UTC)
+    if value:
+        try:
+            parsed = datetime.fromisoformat(str(value))
+            return parsed if parsed.tzinfo else parsed.replace(tzinfo=UTC)
+        except ValueError:
+            print(f"[SVIM] created_at inválido no store_batch ({value!r}); usando agora")
+    return datetime.now(UTC)
+
+
+def is_trivial_message(content: Any) -> bool:
+    """Política de admissão: ignora confirmações curtas e mensagens só com emoji."""
+    normalized = _normalize_text(str(content or ""))
+    return not normalized or normalized in TRIVIAL_MESSAGES
+
+
+def message_point_id(scope: Optional[str], role: str, content: str) -> str:
+    """Id determinístico (hash do conteúdo + sessão): regravar é idempotente."""
+    digest = hashlib.sha256(f"{role}\x1f{content}".encode("utf-8")).hexdigest()
+    return str(uuid5(_POINT_NAMESPACE, f"{scope or ''}\x1f{digest}"))
+
+
 def create_qdrant_client(config: Optional[Dict[str, Any]] = None) -> QdrantClient:
     """
     Cria um cliente Qdrant usando URL e API Key do config ou do ambiente.
@@ -38,12 +143,33 @@ def create_qdrant_client(config: Optional[Dict[str, Any]] = None) -> QdrantClien
     return client
 
 
+def create_async_qdrant_client(config: Optional[Dict[str, Any]] = None) -> AsyncQdrantClient:
+    """Versão assíncrona de create_qdrant_client (mesma prioridade de config/ambiente)."""
+    config = config or {}
+
+    url = config.get("qdrant_url") or os.getenv("QDRANT_URL")
+    api_key = config.get("qdrant_api_key") or os.getenv("QDRANT_API_KEY")
+
+    if not url:
+        raise ValueError("Qdrant URL não definida (use config['qdrant_url'] ou QDRANT_URL).")
+
+    return AsyncQdrantClient(url=url, api_key=api_key)
+
+
+PAYLOAD_INDEXES = {
+    "user_id": PayloadSchemaType.KEYWORD,
+    "session_id": PayloadSchemaType.KEYWORD,
+    "created_at": PayloadSchemaType.DATETIME,
+}
+
+
 def ensure_qdrant_collection(
     client: QdrantClient,
     collection_name: str,
     vector_size: int = 1536,
     distance: Distance = Distance.COSINE,
-) -> None:
+) -> List[str]:
+    """Cria a coleção e os índices de payload; devolve os campos cujo índice falhou."""
     collections = client.get_collections()
     existing = {c.name for c in collections.collections}
 
@@ -53,18 +179,84 @@ def ensure_qdrant_collection(
             vectors_config=VectorParams(size=vector_size, distance=distance),
         )
 
-    # Índices para filtros rápidos
-    for field in ("user_id", "session_id", "created_at"):
+    # Índices para filtros rápidos; created_at é datetime para permitir order_by
+    current_schema = client.get_collection(collection_name).payload_schema or {}
+    failed: List[str] = []
+    for field, schema in PAYLOAD_INDEXES.items():
+        current = current_schema.get(field)
+        current_type = getattr(current, "data_type", None)
+        if current_type == schema:
+            continue
         try:
+            if current is not None:
+                # Ex.: created_at indexado como keyword em versões anteriores
+                client.delete_payload_index(collection_name=collection_name, field_name=field)
             client.create_payload_index(
                 collection_name=collection_name,
                 field_name=field,
-                field_schema={"type": "keyword"},
+                field_schema=schema,
             )
         except Exception as e:
             if "already exists" in str(e).lower():
                 continue
             print(f"Qdrant index error ({field}): {e}")
+            failed.append(field)
+    return failed
+
+
+def schema_marker(collection_name: str, version: int = QDRANT_SCHEMA_VERSION) -> str:
+    """Alias que marca a coleção como migrada para `version`."""
+    return f"{collection_name}__schema_v{version}"
+
+
+def qdrant_schema_is_current(client: QdrantClient, collection_name: str) -> bool:
+    """Uma única chamada (aliases da coleção) para saber se o schema está em dia."""
+    try:
+        aliases = client.get_collection_aliases(collection_name).aliases
+    except Exception as e:
+        print(f"[SVIM] Qdrant schema check falhou ({collection_name}): {e}")
+        return False
+    return schema_marker(collection_name) in {a.alias_name for a in aliases}
+
+
+def migrate_qdrant_schema(
+    client: QdrantClient,
+    collection_name: str,
+    vector_size: int = 1536,
+) -> bool:
+    """Cria/atualiza coleção e índices e grava o marcador de versão do schema.
+
+    O marcador só é gravado se todos os índices foram criados; devolve se o
+    schema ficou em dia.
+    """
+    failed = ensure_qdrant_collection(client, collection_name, vector_size=vector_size)
+    if failed:
+        print(
+            f"[SVIM] Qdrant schema v{QDRANT_SCHEMA_VERSION} incompleto ({collection_name}): "
+            f"índices com erro {failed}; marcador não gravado"
+        )
+        return False
+
+    marker = schema_marker(collection_name)
+    existing = {a.alias_name for a in client.get_collection_aliases(collection_name).aliases}
+    stale = [
+        alias
+        for alias in existing
+        if alias.startswith(f"{collection_name}__schema_v") and alias != marker
+    ]
+    operations: List[Any] = [
+        DeleteAliasOperation(delete_alias=DeleteAlias(alias_name=alias)) for alias in stale
+    ]
+    if marker not in existing:
+        operations.append(
+            CreateAliasOperation(
+                create_alias=CreateAlias(collection_name=collection_name, alias_name=marker)
+            )
+        )
+    if operations:
+        client.update_collection_aliases(change_aliases_operations=operations)
+    print(f"[SVIM] Qdrant schema v{QDRANT_SCHEMA_VERSION} ok ({collection_name})")
+    return True
 
 
 
@@ -80,20 +272,157 @@ class QdrantMemory:
     ) -> None:
         self.collection_name = collection_name
         self.embedding_model = embedding_model
+        self.vector_size = vector_size
+        self._config = config
         self.client = create_qdrant_client(config)
-        ensure_qdrant_collection(self.client, collection_name, vector_size=vector_size)
-        self._openai = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        if QDRANT_SCHEMA_CHECK != "skip" and not qdrant_schema_is_current(
+            self.client, collection_name
+        ):
+            # Sem o passo de migração (make qdrant-migrate): migra uma vez aqui;
+            # os próximos processos só verificam o marcador.
+            migrate_qdrant_schema(self.client, collection_name, vector_size=vector_size)
+        self._openai = OpenAI(
+            api_key=os.getenv("OPENAI_API_KEY"),
+            max_retries=0,
+            http_client=openai_http_client(),
+        )
+        self.embedding_cache = EmbeddingCache(embedding_model, vector_size)
+        self._async_client: Optional[AsyncQdrantClient] = None
+        self._async_openai: Optional[AsyncOpenAI] = None
+
+    @property
+    def async_client(self) -> AsyncQdrantClient:
+        if self._async_client is None:
+            self._async_client = create_async_qdrant_client(self._config)
+        return self._async_client
+
+    @property
+    def async_openai(self) -> AsyncOpenAI:
+        if self._async_openai is None:
+            self._async_openai = AsyncOpenAI(
+                api_key=os.getenv("OPENAI_API_KEY"),
+                max_retries=0,
+                http_client=openai_async_http_client(),
+            )
+        return self._async_openai
 
     def _embed(self, texts: List[str]) -> List[List[float]]:
-        resp = self._openai.embeddings.create(
-            model=self.embedding_model,
-            input=texts,
+        """Embeddings com cache: só textos nunca vistos vão para a OpenAI."""
+        vectors = self.embedding_cache.get_many(texts)
+        missing = list(dict.fromkeys(t for t, v in zip(texts, vectors) if v is None))
+        if missing:
+            resp = self._openai.embeddings.create(
+                model=self.embedding_model,
+                input=missing,
+            )
+            vectors = self._fill_embeddings(texts, vectors, missing, resp)
+        self._log_embed_stats(texts, missing)
+        return vectors  # type: ignore[return-value]
+
+    async def _aembed(self, texts: List[str]) -> List[List[float]]:
+        vectors = self.embedding_cache.get_many(texts)
+        missing = list(dict.fromkeys(t for t, v in zip(texts, vectors) if v is None))
+        if missing:
+            resp = await self.async_openai.embeddings.create(
+                model=self.embedding_model,
+                input=missing,
+            )
+            vectors = self._fill_embeddings(texts, vectors, missing, resp)
+        self._log_embed_stats(texts, missing)
+        return vectors  # type: ignore[return-value]
+
+    def _fill_embeddings(
+        self,
+        texts: List[str],
+        vectors: List[Optional[List[float]]],
+        missing: List[str],
+        resp: Any,
+    ) -> List[Optional[List[float]]]:
+        fresh = [item.embedding for item in resp.data]
+        self.embedding_cache.put_many(missing, fresh)
+        by_text = dict(zip(missing, fresh))
+        return [v if v is not None else by_text[t] for t, v in zip(texts, vectors)]
+
+    def _log_embed_stats(self, texts: List[str], missing: List[str]) -> None:
+        stats = self.embedding_cache.stats
+        print(
+            f"[SVIM] embeddings requested={len(texts)} fetched={len(missing)} "
+            f"cache memory_hits={stats['memory_hits']} disk_hits={stats['disk_hits']} "
+            f"misses={stats['misses']}"
         )
-        return [item.embedding for item in resp.data]
 
     def _is_valid_id(self, value: Optional[str]) -> bool:
         return bool(value and value.strip() and value not in ("anon", "anon-session"))
 
+    def _recent_filter(self, session_id: Optional[str], user_id: Optional[str]) -> Optional[Filter]:
+        """Filtro de recência: session_id (se presente), senão user_id."""
+        if self._is_valid_id(session_id):
+            return Filter(must=[FieldCondition(key="session_id", match=MatchValue(value=session_id))])
+        if self._is_valid_id(user_id):
+            return Filter(must=[FieldCondition(key="user_id", match=MatchValue(value=user_id))])
+        return None
+
+    @staticmethod
+    def _user_filter(user_id: str) -> Filter:
+        return Filter(must=[FieldCondition(key="user_id", match=MatchValue(value=user_id))])
+
+    @staticmethod
+    def _recent_messages(points: Any, k: int) -> List[Dict[str, Any]]:
+        payloads = [p.payload for p in points if getattr(p, "payload", None)]
+
+        # Ordem cronológica, últimos k (os pontos já chegam ordenados do servidor
+        # no caminho com order_by; o sort aqui é barato e cobre o fallback).
+        # Pelo instante, não pelo texto: há pontos em UTC e em -03:00.
+        payloads.sort(key=_created_at)
+        payloads = payloads[-k:]
+
+        return [{"role": p.get("role", "user"), "content": p.get("content", "")} for p in payloads]
+
+    @staticmethod
+    def _recent_order() -> OrderBy:
+        return OrderBy(key="created_at", direction=Direction.DESC)
+
+    @staticmethod
+    def _to_messages(results: Any) -> List[Dict[str, Any]]:
+        payloads = [r.payload for r in results if r.payload]
+        return [
+            {"role": p.get("role", "user"), "content": p.get("content", "")}
+            for p in payloads
+        ]
+
+    @staticmethod
+    def _merge_context(
+        recent: List[Dict[str, Any]],
+        semantic: List[Dict[str, Any]],
+    ) -> List[Dict[str, Any]]:
+        """Recência primeiro, depois semântica, sem duplicatas (role+content)."""
+        seen = set()
+        merged: List[Dict[str, Any]] = []
+
+        def _add(msg: Dict[str, Any]):
+            content = msg.get("content")
+            if isinstance(content, list):
+                content = " ".join(str(item) for item in content)
+            elif content is None:
+                content = ""
+            else:
+                content = str(content)
+
+            key = (msg.get("role", ""), content.strip())
+            if not key[1]:
+                return
+            if key in seen:
+                return
+            seen.add(key)
+            merged.append({"role": key[0], "content": key[1]})
+
+        for m in recent:
+            _add(m)
+        for m in semantic:
+            _add(m)
+
+        return merged
+
     def get_recent_context(
         self,
         session_id: Optional[str],
@@ -105,16 +434,23 @@ class QdrantMemory:
         - session_id (se presente)
         - senão user_id
         """
-        must = []
-
-        if self._is_valid_id(session_id):
-            must.append(FieldCondition(key="session_id", match=MatchValue(value=session_id)))
-        elif self._is_valid_id(user_id):
-            must.append(FieldCondition(key="user_id", match=MatchValue(value=user_id)))
-        else:
+        query_filter = self._recent_filter(session_id, user_id)
+        if query_filter is None:
             return []
 
-        query_filter = Filter(must=must)
+        # Ordenação no servidor pelo índice datetime: custo O(k) independente
+        # do tamanho do histórico.
+        try:
+            points, _ = self.client.scroll(
+                collection_name=self.collection_name,
+                scroll_filter=query_filter,
+                with_payload=True,
+                limit=k,
+                order_by=self._recent_order(),
+            )
+            return self._recent_messages(points, k)
+        except Exception as exc:
+            print(f"[SVIM] Qdrant order_by indisponível, usando fallback: {exc}")
 
         # Compatibilidade com versões diferentes do client
         if hasattr(self.client, "scroll"):
@@ -134,13 +470,36 @@ class QdrantMemory:
         else:
             raise AttributeError("QdrantClient não possui métodos scroll/scroll_points")
 
-        payloads = [p.payload for p in points if getattr(p, "payload", None)]
+        return self._recent_messages(points, k)
 
-        # Ordenar por created_at (ISO) e pegar os últimos k
-        payloads.sort(key=lambda x: x.get("created_at", ""))
-        payloads = payloads[-k:]
+    async def aget_recent_context(
+        self,
+        session_id: Optional[str],
+        user_id: Optional[str],
+        k: int = 10,
+    ) -> List[Dict[str, Any]]:
+        """Versão assíncrona de get_recent_context."""
+        query_filter = self._recent_filter(session_id, user_id)
+        if query_filter is None:
+            return []
 
-        return [{"role": p.get("role", "user"), "content": p.get("content", "")} for p in payloads]
+        try:
+            points, _ = await self.async_client.scroll(
+                collection_name=self.collection_name,
+                scroll_filter=query_filter,
+                with_payload=True,
+                limit=k,
+                order_by=self._recent_order(),
+            )
+        except Exception as exc:
+            print(f"[SVIM] Qdrant order_by indisponível, usando fallback: {exc}")
+            points, _ = await self.async_client.scroll(
+                collection_name=self.collection_name,
+                scroll_filter=query_filter,
+                with_payload=True,
+                limit=max(k * 5, 50),
+            )
+        return self._recent_messages(points, k)
 
     def get_hybrid_context(
         self,
@@ -161,52 +520,66 @@ class QdrantMemory:
 
         # 2) Semântico (lembranças antigas úteis)
         semantic: List[Dict[str, Any]] = []
-        if query and query.strip():
-            # Aqui é importante: semântica por USER_ID (memória "do cliente", atravessa sessões)
-            if self._is_valid_id(user_id):
-                semantic = self.get_user_context(user_id=user_id, query=query, k=semantic_k)
-            else:
-                # se não tiver user_id válido, tenta semântica por session_id (melhor que nada)
-                # (usa o mesmo método, mas com "user_id" = session_id não rola porque o filtro do get_user_context é por user_id)
-                # então, nesse fallback, a gente simplesmente não faz semântico.
-                semantic = []
+        # Semântica por USER_ID (memória "do cliente", atravessa sessões); sem
+        # user_id válido não há busca semântica.
+        if query and query.strip() and self._is_valid_id(user_id):
+            semantic = self.get_user_context(user_id=user_id, query=query, k=semantic_k)
 
-        # Deduplicação (role+content)
-        seen = set()
-        merged: List[Dict[str, Any]] = []
+        return self._merge_context(recent, semantic)
 
-        def _add(msg: Dict[str, Any]):
-            content = msg.get("content")
-            if isinstance(content, list):
-                content = " ".join(str(item) for item in content)
-            elif content is None:
-                content = ""
-            else:
-                content = str(content)
+    async def aget_hybrid_context(
+        self,
+        session_id: Optional[str],
+        user_id: Optional[str],
+        query: str,
+        recent_k: int = 6,
+        semantic_k: int = 4,
+        timeout: float = MEMORY_CONTEXT_TIMEOUT,
+    ) -> List[Dict[str, Any]]:
+        """
+        Memória híbrida assíncrona: o scroll de recência roda em paralelo com
+        a cadeia embed -> search. Tudo compartilha um único prazo (timeout);
+        a parte que não terminar a tempo é cancelada e o contexto sai parcial.
+        """
+        tasks = set()
+        recent_task: Optional[asyncio.Task] = None
+        if recent_k > 0:
+            recent_task = asyncio.create_task(
+                self.aget_recent_context(session_id=session_id, user_id=user_id, k=recent_k)
+            )
+            tasks.add(recent_task)
+        semantic_task: Optional[asyncio.Task] = None
+        if query and query.strip() and self._is_valid_id(user_id):
+            semantic_task = asyncio.create_task(
+                self.aget_user_context(user_id=user_id, query=query, k=semantic_k)  # type: ignore[arg-type]
+            )
+            tasks.add(semantic_task)
 
-            key = (msg.get("role", ""), content.strip())
-            if not key[1]:
-                return
-            if key in seen:
-                return
-            seen.add(key)
-            merged.append({"role": key[0], "content": key[1]})
+        if not tasks:
+            return []
 
-        # Ordem: primeiro recência, depois semântica (sem repetir)
-        for m in recent:
-            _add(m)
-        for m in semantic:
-            _add(m)
+        done, pending = await asyncio.wait(tasks, timeout=timeout)
+        for task in pending:
+            task.cancel()
+        if pending:
+            print(f"[SVIM] hybrid context deadline {timeout}s: {len(pending)} parte(s) descartada(s)")
 
-        return merged
+        def _result(task: Optional[asyncio.Task]) -> List[Dict[str, Any]]:
+            if task is None or task not in done:
+                return []
+            exc = task.exception()
+            if exc is not None:
+                print(f"[SVIM] hybrid context error: {exc!r}")
+                return []
+            return task.result()
+
+        return self._merge_context(_result(recent_task), _result(semantic_task))
 
     def get_user_context(self, user_id: str, query: str, k: int = 5) -> List[Dict[str, Any]]:
         """Busca os K itens de memória mais relevantes de um usuário."""
         query_vector = self._embed([query or ""])[0]
 
-        query_filter = Filter(
-            must=[FieldCondition(key="user_id", match=MatchValue(value=user_id))]
-        )
+        query_filter = self._user_filter(user_id)
 
         # Compatibilidade com diferentes versões do cliente Qdrant
         if hasattr(self.client, "search"):
@@ -228,36 +601,85 @@ class QdrantMemory:
         else:
             raise AttributeError("QdrantClient não possui métodos search/search_points")
 
-        payloads = [r.payload for r in results if r.payload]
-        return [
-            {"role": p.get("role", "user"), "content": p.get("content", "")}
-            for p in payloads
-        ]
+        return self._to_messages(results)
+
+    async def aget_user_context(self, user_id: str, query: str, k: int = 5) -> List[Dict[str, Any]]:
+        """Versão assíncrona de get_user_context (embed e depois search)."""
+        query_vector = (await self._aembed([query or ""]))[0]
+        results = await self.async_client.search(
+            collection_name=self.collection_name,
+            query_vector=query_vector,
+            limit=k,
+            with_payload=True,
+            query_filter=self._user_filter(user_id),
+        )
+        return self._to_messages(results)
+
+    def _existing_ids(self, ids: List[str]) -> set[str]:
+        try:
+            points = self.client.retrieve(
+                collection_name=self.collection_name,
+                ids=ids,
+                with_payload=False,
+                with_vectors=False,
+            )
+        except Exception as exc:
+            print(f"[SVIM] Qdrant retrieve error: {exc}")
+            return set()
+        return {str(p.id) for p in points}
 
     def store_messages(self, user_id: str, messages: List[Dict[str, str]], session_id: str | None = None) -> None:
         """Persiste mensagens (role/content) no Qdrant."""
-        if not messages:
-            return
+        self.store_batch([{"user_id": user_id, "session_id": session_id, "messages": messages}])
 
-        vectors = self._embed([f"{m.get('role')}: {m.get('content','')}" for m in messages])
-        now = datetime.now(UTC).isoformat()
+    def store_batch(self, items: List[Dict[str, Any]]) -> None:
+        """Persiste as mensagens de vários turnos com um embed e um upsert.
 
-        points = []
-        for msg, vector in zip(messages, vectors):
-            points.append(
-                PointStruct(
-                    id=str(uuid4()),
-                    vector=vector,
-                    payload={
+        Cada item tem user_id, session_id, messages e, opcionalmente,
+        created_at (ISO) do turno. Mensagens triviais são ignoradas e os ids
+        são determinísticos por sessão, então mensagens já gravadas não são
+        embedadas de novo.
+        """
+        pending: Dict[str, Dict[str, Any]] = {}
+        for item in items:
+            user_id = item.get("user_id")
+            session_id = item.get("session_id")
+            scope = session_id if self._is_valid_id(session_id) else user_id
+            created_at = _turn_created_at(item.get("created_at"))
+            for i, msg in enumerate(item.get("messages") or []):
+                content = msg.get("content", "")
+                if is_trivial_message(content):
+                    continue
+                point_id = message_point_id(scope, msg.get("role", "user"), content)
+                pending.setdefault(
+                    point_id,
+                    {
                         "user_id": user_id,
                         "session_id": session_id,
                         "role": msg.get("role", "user"),
-                        "content": msg.get("content", ""),
-                        "created_at": now,
+                        "content": content,
+                        # +i µs preserva a ordem das mensagens do turno no order_by
+                        "created_at": (created_at + timedelta(microseconds=i)).isoformat(),
                     },
                 )
-            )
-        print(f"Storing {len(points)} messages for user {user_id} in Qdrant.")
+
+        if not pending:
+            return
+
+        for point_id in self._existing_ids(list(pending)):
+            pending.pop(point_id, None)
+        if not pending:
+            return
+
+        payloads = list(pending.values())
+        vectors = self._embed([f"{p['role']}: {p['content']}" for p in payloads])
+
+        points = [
+            PointStruct(id=point_id, vector=vector, payload=payload)
+            for point_id, payload, vector in zip(pending, payloads, vectors)
+        ]
+        users = sorted({str(p["user_id"]) for p in payloads})
+        print(f"Storing {len(points)} messages for users {users} in Qdrant.")
         self.client.upsert(
             collection_name=self.collection_name,
             points=points,
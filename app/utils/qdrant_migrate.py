@@ -0,0 +1,58 @@
+"""
+Migração do schema do Qdrant (coleção, índices de payload e marcador de versão).
+
+Roda uma vez por deploy, fora do caminho da mensagem; o QdrantMemory só
+verifica o marcador (QDRANT_SCHEMA_CHECK=verify) ou nem isso (skip).
+
+Uso:
+    python -m app.utils.qdrant_migrate [--collection svim_conversations] [--vector-size 1536] [--check]
+
+Sai com código 1 se algum índice de payload não pôde ser criado.
+"""
+import os
+import sys
+import argparse
+
+from dotenv import load_dotenv
+
+from app.utils.qdrant import (
+    QDRANT_SCHEMA_VERSION,
+    create_qdrant_client,
+    migrate_qdrant_schema,
+    qdrant_schema_is_current,
+)
+
+load_dotenv()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--collection", default=os.getenv("QDRANT_COLLECTION", "svim_conversations")
+    )
+    parser.add_argument(
+        "--vector-size", type=int, default=int(os.getenv("QDRANT_VECTOR_SIZE", "1536"))
+    )
+    parser.add_argument(
+        "--check",
+        action="store_true",
+        help="só verifica o marcador; sai com código 1 se o schema estiver desatualizado",
+    )
+    args = parser.parse_args()
+
+    client = create_qdrant_client()
+    if args.check:
+        current = qdrant_schema_is_current(client, args.collection)
+        print(
+            f"[SVIM] Qdrant schema v{QDRANT_SCHEMA_VERSION} "
+            f"{'ok' if current else 'pendente'} ({args.collection})"
+        )
+        sys.exit(0 if current else 1)
+
+    # Índice com erro: sem marcador e código 1, para o deploy não seguir
+    if not migrate_qdrant_schema(client, args.collection, vector_size=args.vector_size):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
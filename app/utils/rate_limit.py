@@ -0,0 +1,513 @@
+"""
+Limite de taxa adaptativo e retry das chamadas à OpenAI (chat e embeddings).
+
+Um OpenAIRateLimiter por processo fica atrás de um transport httpx usado pelo
+ChatOpenAI (graph.get_model) e pelos clientes de embeddings do QdrantMemory:
+- por modelo, dois token buckets (requisições e tokens por minuto) que começam
+  em OPENAI_RPM/OPENAI_TPM e são corrigidos pelos headers x-ratelimit-* de
+  cada resposta; sem capacidade, a chamada espera na fila em vez de falhar
+- 429/5xx e falhas de conexão são repetidos com backoff exponencial com
+  jitter (respeitando retry-after), dentro do prazo do turno (turn_deadline)
+- concorrência adaptativa (AIMD): +1/limite a cada sucesso, metade a cada 429
+
+Esgotado o prazo ou as tentativas, devolve o último 429 (ou um 429 local), que
+o SDK converte em RateLimitError e o main responde com RATE_LIMIT_FALLBACK.
+Os clientes da OpenAI que usam este transport ficam com max_retries=0.
+"""
+import os
+import re
+import json
+import time
+import random
+import asyncio
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
+
+import httpx
+from dotenv import load_dotenv
+
+from app.utils.logger import get_logger
+from app.utils.token_budget import CHARS_PER_TOKEN
+
+load_dotenv()
+
+logger = get_logger(__name__)
+
+# Limites iniciais por modelo; os headers da OpenAI ajustam na primeira resposta
+OPENAI_RPM = float(os.getenv("OPENAI_RPM", "500"))
+OPENAI_TPM = float(os.getenv("OPENAI_TPM", "30000"))
+OPENAI_MAX_CONCURRENCY = int(os.getenv("OPENAI_MAX_CONCURRENCY", "16"))
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "4"))
+OPENAI_BACKOFF_BASE = float(os.getenv("OPENAI_BACKOFF_BASE", "0.5"))
+OPENAI_BACKOFF_MAX = float(os.getenv("OPENAI_BACKOFF_MAX", "8"))
+# Saída reservada quando a requisição de chat não traz max_tokens
+OPENAI_OUTPUT_TOKENS_ESTIMATE = int(os.getenv("OPENAI_OUTPUT_TOKENS_ESTIMATE", "600"))
+# Tempo total que um turno aceita esperar por fila + retries da OpenAI
+TURN_DEADLINE_SECONDS = float(os.getenv("TURN_DEADLINE_SECONDS", "30"))
+
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+# Espera entre verificações quando todas as vagas de concorrência estão ocupadas
+_SLOT_POLL_SECONDS = 0.05
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+_DURATION_UNITS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+_turn_deadline: ContextVar[Optional[float]] = ContextVar("openai_turn_deadline", default=None)
+
+
+@contextmanager
+def turn_deadline(seconds: float = TURN_DEADLINE_SECONDS) -> Iterator[None]:
+    """Prazo (monotônico) compartilhado por todas as chamadas à OpenAI do turno."""
+    token = _turn_deadline.set(time.monotonic() + seconds)
+    try:
+        yield
+    finally:
+        try:
+            _turn_deadline.reset(token)
+        except ValueError:
+            # gerador (stream_turn) fechado fora do contexto em que começou
+            pass
+
+
+def parse_duration(value: Optional[str]) -> Optional[float]:
+    """'6m0s', '1.5s', '20ms' (headers x-ratelimit-reset-*) em segundos."""
+    if not value:
+        return None
+    parts = _DURATION_PART.findall(value)
+    if not parts:
+        try:
+            return float(value)
+        except ValueError:
+            return None
+    return sum(float(amount) * _DURATION_UNITS[unit] for amount, unit in parts)
+
+
+def _header_float(headers: httpx.Headers, name: str) -> Optional[float]:
+    try:
+        return float(headers[name])
+    except (KeyError, ValueError):
+        return None
+
+
+def request_cost(request: httpx.Request) -> Tuple[str, float]:
+    """(modelo, tokens estimados) de uma requisição: entrada por caracteres + saída reservada."""
+    try:
+        body = json.loads(request.content or b"{}")
+    except (ValueError, httpx.RequestNotRead):
+        body = {}
+    if not isinstance(body, dict):
+        body = {}
+    output = body.get("max_completion_tokens") or body.get("max_tokens")
+    if output is None:
+        output = 0 if "input" in body else OPENAI_OUTPUT_TOKENS_ESTIMATE
+    tokens = len(request.content or b"") / CHARS_PER_TOKEN + output
+    return str(body.get("model") or "default"), tokens
+
+
+class TokenBucket:
+    """Capacidade por minuto reposta continuamente; pode ser corrigida pelo servidor."""
+
+    def __init__(self, per_minute: float, now: float) -> None:
+        self.capacity = per_minute
+        self.level = per_minute
+        self.updated = now
+
+    @property
+    def rate(self) -> float:
+        return self.capacity / 60.0
+
+    def _refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        self._refill(now)
+        # Pedido maior que o balde inteiro espera o balde cheio (e passa)
+        amount = min(amount, self.capacity)
+        return 0.0 if self.level >= amount else (amount - self.level) / self.rate
+
+    def take(self, amount: float, now: float) -> None:
+        self._refill(now)
+        self.level -= min(amount, self.capacity)
+
+    def sync(self, limit: Optional[float], remaining: Optional[float], now: float) -> None:
+        self._refill(now)
+        if limit:
+            self.capacity = limit
+        if remaining is not None:
+            self.level = min(self.capacity, remaining)
+
+
+class OpenAIRateLimiter:
+    """Buckets por modelo, concorrência AIMD e política de retry (thread-safe)."""
+
+    def __init__(
+        self,
+        rpm: float = OPENAI_RPM,
+        tpm: float = OPENAI_TPM,
+        max_concurrency: int = OPENAI_MAX_CONCURRENCY,
+        max_retries: int = OPENAI_MAX_RETRIES,
+        backoff_base: float = OPENAI_BACKOFF_BASE,
+        backoff_max: float = OPENAI_BACKOFF_MAX,
+        clock: Callable[[], float] = time.monotonic,
+        rand: Callable[[], float] = random.random,
+    ) -> None:
+        self.rpm = rpm
+        self.tpm = tpm
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.clock = clock
+        self._rand = rand
+        self._lock = threading.Lock()
+        self._buckets: Dict[str, Tuple[TokenBucket, TokenBucket]] = {}
+        self._concurrency = float(max_concurrency)
+        self._in_flight = 0
+        self._stats: Dict[str, float] = {
+            "requests": 0, "retries": 0, "throttled": 0, "wait_seconds": 0.0, "rejected": 0,
+        }
+
+    @property
+    def concurrency(self) -> int:
+        return max(1, int(self._concurrency))
+
+    def _pair(self, model: str) -> Tuple[TokenBucket, TokenBucket]:
+        pair = self._buckets.get(model)
+        if pair is None:
+            now = self.clock()
+            pair = self._buckets[model] = (TokenBucket(self.rpm, now), TokenBucket(self.tpm, now))
+        return pair
+
+    # -- admissão ----------------------------------------------------------
+    def try_acquire(self, model: str, tokens: float) -> float:
+        """0 = vaga e capacidade reservadas; senão, segundos até tentar de novo."""
+        with self._lock:
+            if self._in_flight >= self.concurrency:
+                wait = _SLOT_POLL_SECONDS
+            else:
+                now = self.clock()
+                requests, budget = self._pair(model)
+                wait = max(requests.wait_time(1, now), budget.wait_time(tokens, now))
+                if not wait:
+                    requests.take(1, now)
+                    budget.take(tokens, now)
+                    self._in_flight += 1
+                    self._stats["requests"] += 1
+                    return 0.0
+            self._stats["throttled"] += 1
+            self._stats["wait_seconds"] += wait
+            return wait
+
+    def release(self) -> None:
+        with self._lock:
+            self._in_flight = max(0, self._in_flight - 1)
+
+    # -- feedback do servidor ----------------------------------------------
+    def observe(self, model: str, status: int, headers: httpx.Headers) -> None:
+        """Ajusta buckets pelos headers x-ratelimit-* e a concorrência pelo status."""
+        with self._lock:
+            now = self.clock()
+            requests, budget = self._pair(model)
+            requests.sync(
+                _header_float(headers, "x-ratelimit-limit-requests"),
+                _header_float(headers, "x-ratelimit-remaining-requests"),
+                now,
+            )
+            budget.sync(
+                _header_float(headers, "x-ratelimit-limit-tokens"),
+                _header_float(headers, "x-ratelimit-remaining-tokens"),
+                now,
+            )
+            if status == 429:
+                self._concurrency = max(1.0, self._concurrency / 2)
+            elif status < 400:
+                self._concurrency = min(
+                    float(self.max_concurrency), self._concurrency + 1 / self._concurrency
+                )
+
+    def backoff(self, attempt: int, status: Optional[int], headers: Optional[httpx.Headers]) -> float:
+        """Espera antes da tentativa `attempt` (1, 2, ...): retry-after do servidor ou exponencial."""
+        hinted = None
+        if headers is not None:
+            hinted = _header_float(headers, "retry-after-ms")
+            hinted = hinted / 1000 if hinted is not None else _header_float(headers, "retry-after")
+            if hinted is None and status == 429:
+                resets = [
+                    parse_duration(headers.get("x-ratelimit-reset-requests")),
+                    parse_duration(headers.get("x-ratelimit-reset-tokens")),
+                ]
+                hinted = max((r for r in resets if r is not None), default=None)
+        if hinted is not None:
+            return min(self.backoff_max, hinted) + self._rand() * self.backoff_base
+        delay = min(self.backoff_max, self.backoff_base * 2 ** (attempt - 1))
+        return delay / 2 + self._rand() * delay / 2
+
+    def count(self, name: str) -> None:
+        with self._lock:
+            self._stats[name] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                **{k: round(v, 3) if isinstance(v, float) else v for k, v in self._stats.items()},
+                "concurrency": self.concurrency,
+                "in_flight": self._in_flight,
+                "models": {
+                    model: {"rpm": requests.capacity, "tpm": budget.capacity}
+                    for model, (requests, budget) in self._buckets.items()
+                },
+            }
+
+
+class _Call:
+    """Uma requisição à OpenAI entre tentativas (comum aos transports sync e async)."""
+
+    def __init__(self, limiter: OpenAIRateLimiter, request: httpx.Request) -> None:
+        self.limiter = limiter
+        self.request = request
+        self.model, self.tokens = request_cost(request)
+        deadline = _turn_deadline.get()
+        self.deadline = deadline if deadline is not None else limiter.clock() + TURN_DEADLINE_SECONDS
+        self.attempt = 0
+
+    def acquire_wait(self) -> Optional[float]:
+        """0 = liberada; >0 = esperar e tentar de novo; None = não cabe no prazo."""
+        wait = self.limiter.try_acquire(self.model, self.tokens)
+        if wait and self.limiter.clock() + wait > self.deadline:
+            return None
+        return wait
+
+    def retry_delay(self, status: Optional[int], headers: Optional[httpx.Headers], body: str = "") -> Optional[float]:
+        """Espera antes de repetir, ou None para devolver a resposta/erro como está."""
+        self.attempt += 1
+        if status == 429 and "insufficient_quota" in body:
+            return None  # cota esgotada: esperar não resolve
+        if self.attempt > self.limiter.max_retries:
+            return None
+        delay = self.limiter.backoff(self.attempt, status, headers)
+        if self.limiter.clock() + delay > self.deadline:
+            return None
+        self.limiter.count("retries")
+        logger.warning(
+            "[openai] status=%s model=%s tentativa=%d nova tentativa em %.2fs",
+            status or "conexão", self.model, self.attempt, delay,
+        )
+        return delay
+
+    def rejected(self) -> httpx.Response:
+        """429 local (sem chamar a API) quando a fila não cabe no prazo do turno."""
+        self.limiter.count("rejected")
+        return httpx.Response(
+            429,
+            json={"error": {
+                "message": "Limite de taxa local: sem capacidade dentro do prazo do turno",
+                "type": "requests",
+                "code": "rate_limit_exceeded",
+            }},
+            request=self.request,
+        )
+
+    def releasing(self, response: httpx.Response) -> httpx.Response:
+        """Mantém a vaga até o corpo ser fechado (já lido pelo transport: libera agora)."""
+        if response.is_closed:
+            self.limiter.release()
+        else:
+            response.stream = _ReleasingStream(response.stream, self.limiter.release)
+        return response
+
+    def buffered(self, response: httpx.Response) -> httpx.Response:
+        """Cópia da resposta de erro já lida (e decodificada), que o SDK ainda pode ler."""
+        headers = [
+            (name, value) for name, value in response.headers.multi_items()
+            if name not in ("content-encoding", "content-length", "transfer-encoding")
+        ]
+        return httpx.Response(
+            response.status_code,
+            headers=headers,
+            content=response.content,
+            extensions=response.extensions,
+            request=self.request,
+        )
+
+
+class _ReleasingStream(httpx.SyncByteStream, httpx.AsyncByteStream):
+    """Devolve a vaga de concorrência quando o corpo (ex.: stream SSE) é fechado."""
+
+    def __init__(self, stream: Any, release: Callable[[], None]) -> None:
+        self._stream = stream
+        self._release = release
+        self._released = False
+
+    def __iter__(self) -> Iterator[bytes]:
+        yield from self._stream
+
+    async def __aiter__(self):  # type: ignore[override]
+        async for chunk in self._stream:
+            yield chunk
+
+    def _done(self) -> None:
+        if not self._released:
+            self._released = True
+            self._release()
+
+    def close(self) -> None:
+        try:
+            self._stream.close()
+        finally:
+            self._done()
+
+    async def aclose(self) -> None:
+        try:
+            await self._stream.aclose()
+        finally:
+            self._done()
+
+
+class RateLimitedTransport(httpx.BaseTransport):
+    """Transport síncrono (cliente de embeddings do QdrantMemory)."""
+
+    def __init__(
+        self,
+        limiter: Optional["OpenAIRateLimiter"] = None,
+        transport: Optional[httpx.BaseTransport] = None,
+    ) -> None:
+        self.limiter = limiter or get_rate_limiter()
+        self._transport = transport or httpx.HTTPTransport()
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        call = _Call(self.limiter, request)
+        while True:
+            wait = call.acquire_wait()
+            while wait:
+                time.sleep(wait)
+                wait = call.acquire_wait()
+            if wait is None:
+                return call.rejected()
+            try:
+                response = self._transport.handle_request(request)
+            except httpx.TransportError:
+                self.limiter.release()
+                delay = call.retry_delay(None, None)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+                continue
+            except BaseException:
+                # Erro inesperado: a vaga volta antes de propagar
+                self.limiter.release()
+                raise
+            self.limiter.observe(call.model, response.status_code, response.headers)
+            if response.status_code not in RETRY_STATUSES:
+                return call.releasing(response)
+            try:
+                response.read()
+            finally:
+                response.close()
+                self.limiter.release()
+            replay = call.buffered(response)
+            delay = call.retry_delay(response.status_code, response.headers, response.text)
+            if delay is None:
+                return replay
+            time.sleep(delay)
+
+    def close(self) -> None:
+        self._transport.close()
+
+
+class AsyncRateLimitedTransport(httpx.AsyncBaseTransport):
+    """Transport assíncrono (ChatOpenAI no grafo e embeddings async)."""
+
+    def __init__(
+        self,
+        limiter: Optional["OpenAIRateLimiter"] = None,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ) -> None:
+        self.limiter = limiter or get_rate_limiter()
+        self._transport = transport or httpx.AsyncHTTPTransport()
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        call = _Call(self.limiter, request)
+        while True:
+            wait = call.acquire_wait()
+            while wait:
+                await asyncio.sleep(wait)
+                wait = call.acquire_wait()
+            if wait is None:
+                return call.rejected()
+            try:
+                response = await self._transport.handle_async_request(request)
+            except httpx.TransportError:
+                self.limiter.release()
+                delay = call.retry_delay(None, None)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                continue
+            except BaseException:
+                # Cancelamento (ex.: prazo do aget_hybrid_context) ou erro inesperado:
+                # a vaga volta antes de propagar, senão fica presa para sempre
+                self.limiter.release()
+                raise
+            self.limiter.observe(call.model, response.status_code, response.headers)
+            if response.status_code not in RETRY_STATUSES:
+                return call.releasing(response)
+            try:
+                await response.aread()
+            finally:
+                await response.aclose()
+                self.limiter.release()
+            replay = call.buffered(response)
+            delay = call.retry_delay(response.status_code, response.headers, response.text)
+            if delay is None:
+                return replay
+            await asyncio.sleep(delay)
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
+
+
+_default: Optional[OpenAIRateLimiter] = None
+_default_lock = threading.Lock()
+
+
+def get_rate_limiter() -> OpenAIRateLimiter:
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = OpenAIRateLimiter()
+        return _default
+
+
+def openai_http_client() -> httpx.Client:
+    """httpx.Client para OpenAI(..., max_retries=0) passando pelo limitador do processo."""
+    from openai import DefaultHttpxClient
+
+    return DefaultHttpxClient(transport=RateLimitedTransport())
+
+
+def openai_async_http_client() -> httpx.AsyncClient:
+    """httpx.AsyncClient para AsyncOpenAI/ChatOpenAI passando pelo limitador do processo."""
+    from openai import DefaultAsyncHttpxClient
+
+    return DefaultAsyncHttpxClient(transport=AsyncRateLimitedTransport())
+
+
+def rate_limit_stats() -> Dict[str, Any]:
+    return get_rate_limiter().stats()
+
+
+__all__ = [
+    "AsyncRateLimitedTransport",
+    "OpenAIRateLimiter",
+    "RateLimitedTransport",
+    "TokenBucket",
+    "get_rate_limiter",
+    "openai_async_http_client",
+    "openai_http_client",
+    "parse_duration",
+    "rate_limit_stats",
+    "request_cost",
+    "turn_deadline",
+]
@@ -1,6 +1,6 @@
 import json
 from datetime import datetime, UTC
-from typing import Any, Dict, Optional
+from typing import Any, Dict, Iterable, Optional
 
 from psycopg import Connection
 
@@ -58,3 +58,69 @@ def log_interaction(
                 datetime.now(UTC),
             ),
         )
+
+
+def upsert_sessions(conn: Connection, sessions: Iterable[Dict[str, Any]]) -> int:
+    """
+    Versão em lote de upsert_session: vários toques na mesma session_id
+    dentro do lote viram uma única linha (vale o último). Devolve quantas
+    sessões foram gravadas.
+    """
+    coalesced: Dict[str, tuple] = {}
+    for session in sessions:
+        user_identifier = session.get("user_identifier")
+        session_id = session.get("session_id")
+        if not user_identifier or not session_id:
+            continue
+        coalesced.pop(session_id, None)
+        coalesced[session_id] = (user_identifier, session_id, session.get("status", "open"))
+
+    if not coalesced:
+        return 0
+
+    values = ", ".join(["(%s, %s, %s, NOW(), NOW())"] * len(coalesced))
+    params = [value for row in coalesced.values() for value in row]
+    with conn.cursor() as cur:
+        cur.execute(
+            f"""
+            INSERT INTO svim_sessions (user_identifier, session_id, status, last_used_at, updated_at)
+            VALUES {values}
+            ON CONFLICT (session_id)
+            DO UPDATE SET
+              status = EXCLUDED.status,
+              last_used_at = NOW(),
+              updated_at = NOW();
+            """,
+            params,
+        )
+    return len(coalesced)
+
+
+def log_interactions(conn: Connection, rows: Iterable[Dict[str, Any]]) -> int:
+    """
+    Versão em lote de log_interaction via COPY. Cada linha aceita os mesmos
+    campos de log_interaction e, opcionalmente, created_at (datetime ou ISO).
+    Devolve quantas linhas foram gravadas.
+    """
+    count = 0
+    with conn.cursor() as cur:
+        with cur.copy(
+            "COPY interaction_logs (user_id, session_id, intent, request_json, response_json, created_at) "
+            "FROM STDIN"
+        ) as copy:
+            for row in rows:
+                created_at = row.get("created_at") or datetime.now(UTC)
+                if isinstance(created_at, str):
+                    created_at = datetime.fromisoformat(created_at)
+                copy.write_row(
+                    (
+                        row.get("user_id"),
+                        row.get("session_id"),
+                        row.get("intent"),
+                        json.dumps(row.get("request_json") or {}, ensure_ascii=False),
+                        json.dumps(row.get("response_json") or {}, ensure_ascii=False),
+                        created_at,
+                    )
+                )
+                count += 1
+    return count
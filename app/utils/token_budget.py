@@ -0,0 +1,236 @@
+"""
+Orçamento de tokens do contexto enviado ao modelo.
+
+Conta tokens com o tokenizer do modelo (tiktoken, encodings em cache por
+processo; na imagem Docker o arquivo BPE é baixado no build) e divide um
+orçamento de entrada entre:
+- fixo: system prompt, bloco do turno e schemas das ferramentas (nunca cortado)
+- ferramentas: reserva para as respostas de tools do loop ReAct
+- conversa: mensagens mais novas primeiro (a última do cliente sempre entra)
+- histórico recuperado do Qdrant: o que sobrar (menor prioridade)
+
+Sem o tiktoken (ou sem o arquivo do encoding) usa uma estimativa por caracteres.
+"""
+import os
+import json
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from dotenv import load_dotenv
+from langchain_core.messages import BaseMessage, ToolMessage
+
+from app.utils.logger import get_logger
+
+load_dotenv()
+
+logger = get_logger(__name__)
+
+TOKEN_MODEL = os.getenv("TOKEN_MODEL", "gpt-4.1")
+CONTEXT_INPUT_BUDGET_TOKENS = int(os.getenv("CONTEXT_INPUT_BUDGET_TOKENS", "8000"))
+# Fração do que sobra após o bloco fixo
+CONTEXT_TOOLS_SHARE = float(os.getenv("CONTEXT_TOOLS_SHARE", "0.45"))
+CONTEXT_HISTORY_SHARE = float(os.getenv("CONTEXT_HISTORY_SHARE", "0.15"))
+# Mínimo preservado de cada resposta de ferramenta ao cortar
+MIN_TOOL_TOKENS = int(os.getenv("CONTEXT_MIN_TOOL_TOKENS", "96"))
+
+# Overhead aproximado de cada mensagem no formato de chat da OpenAI
+MESSAGE_OVERHEAD_TOKENS = 4
+CHARS_PER_TOKEN = 3.5
+TRUNCATED_MARK = "…[truncado]"
+
+
+@lru_cache(maxsize=8)
+def get_encoding(model: str = TOKEN_MODEL) -> Optional[Any]:
+    """Encoding do tiktoken para o modelo, carregado uma vez por processo."""
+    try:
+        import tiktoken
+    except ImportError:  # pragma: no cover - depende do ambiente
+        return None
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("o200k_base")
+    except Exception as exc:
+        logger.warning("[tokens] encoding indisponível (%s), usando estimativa: %s", model, exc)
+        return None
+
+
+def _content_text(content: Any) -> str:
+    if content is None:
+        return ""
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        return " ".join(
+            item.get("text", "") if isinstance(item, dict) else str(item) for item in content
+        )
+    return str(content)
+
+
+class TokenCounter:
+    """Contagem/corte por tokens; `encoding` precisa de encode/decode (tiktoken)."""
+
+    def __init__(self, model: str = TOKEN_MODEL, encoding: Any = None) -> None:
+        self.model = model
+        self.encoding = encoding if encoding is not None else get_encoding(model)
+
+    def count(self, text: str) -> int:
+        if not text:
+            return 0
+        if self.encoding is None:
+            return int(len(text) / CHARS_PER_TOKEN) + 1
+        return len(self.encoding.encode(text, disallowed_special=()))
+
+    def truncate(self, text: str, max_tokens: int, mark: bool = True) -> str:
+        """Mantém o início de `text` com no máximo `max_tokens` tokens."""
+        if max_tokens <= 0:
+            return ""
+        if self.count(text) <= max_tokens:
+            return text
+        marker = TRUNCATED_MARK if mark else ""
+        keep = max(max_tokens - self.count(marker), 1)
+        if self.encoding is None:
+            head = text[: int(keep * CHARS_PER_TOKEN)]
+        else:
+            head = self.encoding.decode(self.encoding.encode(text, disallowed_special=())[:keep])
+        return head + marker
+
+    def count_message(self, message: BaseMessage) -> int:
+        tokens = MESSAGE_OVERHEAD_TOKENS + self.count(_content_text(message.content))
+        for call in getattr(message, "tool_calls", None) or []:
+            tokens += self.count(call.get("name", "")) + self.count(
+                json.dumps(call.get("args", {}), ensure_ascii=False)
+            )
+        return tokens
+
+    def count_messages(self, messages: Sequence[BaseMessage]) -> int:
+        return sum(self.count_message(m) for m in messages)
+
+    def count_tools(self, tools: Sequence[Any]) -> int:
+        """Tokens dos schemas de ferramentas enviados em toda chamada ao modelo."""
+        from langchain_core.utils.function_calling import convert_to_openai_tool
+
+        return sum(
+            self.count(json.dumps(convert_to_openai_tool(tool), ensure_ascii=False))
+            for tool in tools
+        )
+
+
+class ContextBudget:
+    """Divide CONTEXT_INPUT_BUDGET_TOKENS entre as partes do contexto, por prioridade."""
+
+    def __init__(
+        self,
+        total: int = CONTEXT_INPUT_BUDGET_TOKENS,
+        tools_share: float = CONTEXT_TOOLS_SHARE,
+        history_share: float = CONTEXT_HISTORY_SHARE,
+        counter: Optional[TokenCounter] = None,
+        min_tool_tokens: int = MIN_TOOL_TOKENS,
+    ) -> None:
+        self.total = total
+        self.tools_share = tools_share
+        self.history_share = history_share
+        self.min_tool_tokens = min_tool_tokens
+        self.counter = counter or TokenCounter()
+
+    def fit_turn(
+        self,
+        fixed: Sequence[BaseMessage],
+        history: str,
+        conversation: Sequence[BaseMessage],
+        fixed_extra: int = 0,
+    ) -> Tuple[str, List[BaseMessage], Dict[str, int]]:
+        """Corta histórico e conversa antiga para caber no orçamento do turno.
+
+        `fixed_extra` soma tokens que não são mensagens (schemas das tools).
+        Devolve (histórico, conversa, relatório de tokens por parte).
+        """
+        fixed_tokens = self.counter.count_messages(fixed) + fixed_extra
+        available = max(self.total - fixed_tokens, 0)
+        tools_reserve = int(available * self.tools_share)
+        history_tokens = self.counter.count(history)
+        history_floor = min(history_tokens, int(available * self.history_share))
+
+        # Conversa: das mais novas para as mais antigas, até o limite
+        conversation_budget = max(available - tools_reserve - history_floor, 0)
+        kept: List[BaseMessage] = []
+        used = 0
+        for message in reversed(conversation):
+            tokens = self.counter.count_message(message)
+            if kept and used + tokens > conversation_budget:
+                break
+            if not kept and tokens > conversation_budget:
+                # A última mensagem do cliente sempre entra, cortada se preciso
+                message = message.model_copy(
+                    update={
+                        "content": self.counter.truncate(
+                            _content_text(message.content),
+                            max(conversation_budget - MESSAGE_OVERHEAD_TOKENS, 1),
+                        )
+                    }
+                )
+                tokens = self.counter.count_message(message)
+            kept.append(message)
+            used += tokens
+        kept.reverse()
+
+        history_budget = max(available - tools_reserve - used, 0)
+        trimmed_history = self.counter.truncate(history, history_budget) if history else ""
+
+        report = {
+            "fixed": fixed_tokens,
+            "history": self.counter.count(trimmed_history),
+            "conversation": used,
+            "tools_reserve": tools_reserve,
+            "dropped_messages": len(conversation) - len(kept),
+        }
+        return trimmed_history, kept, report
+
+    def fit_model_input(
+        self,
+        messages: Sequence[BaseMessage],
+        fixed_extra: int = 0,
+    ) -> Tuple[List[BaseMessage], Dict[str, int]]:
+        """Corta respostas de ferramentas (das mais antigas) até caber no orçamento.
+
+        Usado antes de cada chamada do modelo no loop ReAct; o estado não muda.
+        """
+        tool_positions = [i for i, m in enumerate(messages) if isinstance(m, ToolMessage)]
+        other_tokens = fixed_extra + self.counter.count_messages(
+            [m for m in messages if not isinstance(m, ToolMessage)]
+        )
+        sizes = {i: self.counter.count_message(messages[i]) for i in tool_positions}
+        excess = other_tokens + sum(sizes.values()) - self.total
+
+        result = list(messages)
+        trimmed: set[int] = set()
+        # Primeiro preserva MIN_TOOL_TOKENS de cada resposta; se não bastar, corta abaixo disso
+        for floor in (self.min_tool_tokens, MESSAGE_OVERHEAD_TOKENS + 1):
+            for i in tool_positions:
+                if excess <= 0:
+                    break
+                target = max(sizes[i] - excess, floor)
+                if target >= sizes[i]:
+                    continue
+                result[i] = result[i].model_copy(
+                    update={
+                        "content": self.counter.truncate(
+                            _content_text(result[i].content), target - MESSAGE_OVERHEAD_TOKENS
+                        )
+                    }
+                )
+                new_size = self.counter.count_message(result[i])
+                excess -= sizes[i] - new_size
+                sizes[i] = new_size
+                trimmed.add(i)
+
+        report = {
+            "input": other_tokens + sum(sizes.values()),
+            "tools": sum(sizes.values()),
+            "trimmed_tool_messages": len(trimmed),
+        }
+        return result, report
+
+
+__all__ = ["ContextBudget", "TokenCounter", "get_encoding"]
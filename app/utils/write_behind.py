@@ -0,0 +1,315 @@
+"""
+Pipeline write-behind para efeitos colaterais do turno (memória e logs).
+
+O turno só enfileira; uma thread de fundo agrupa os itens em lotes por tipo
+e chama o handler registrado. Se o destino (Qdrant/Postgres) falhar ou a
+fila estiver cheia, os itens vão para um arquivo local (JSONL) e são
+reprocessados depois. Na saída do processo a fila é esvaziada (atexit).
+
+No reprocessamento, um lote que falha é tentado item a item (um item ruim não
+segura os outros); cada item conta as tentativas e, depois de
+WRITE_BEHIND_MAX_ATTEMPTS falhas, vai para `<kind>.dead.jsonl` em vez de
+voltar à fila. O arquivo `.replaying` só é removido depois que todos os
+itens foram entregues ou regravados; se sobrar de um processo que caiu, é
+reprocessado quando o worker sobe (entrega pelo menos uma vez). Linhas
+ilegíveis (ex.: processo morto no meio da escrita) vão para o dead-letter
+como {"raw": ...}.
+"""
+import os
+import json
+import time
+import queue
+import atexit
+import threading
+from collections import defaultdict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from app.utils.logger import get_logger
+
+load_dotenv()
+
+logger = get_logger(__name__)
+
+WRITE_BEHIND_QUEUE_SIZE = int(os.getenv("WRITE_BEHIND_QUEUE_SIZE", "1000"))
+WRITE_BEHIND_BATCH_SIZE = int(os.getenv("WRITE_BEHIND_BATCH_SIZE", "50"))
+WRITE_BEHIND_LINGER_SECONDS = float(os.getenv("WRITE_BEHIND_LINGER_SECONDS", "0.2"))
+WRITE_BEHIND_RETRY_SECONDS = float(os.getenv("WRITE_BEHIND_RETRY_SECONDS", "30"))
+WRITE_BEHIND_SHUTDOWN_TIMEOUT = float(os.getenv("WRITE_BEHIND_SHUTDOWN_TIMEOUT", "10"))
+WRITE_BEHIND_SPILL_DIR = os.getenv("WRITE_BEHIND_SPILL_DIR", ".cache/spill")
+WRITE_BEHIND_MAX_ATTEMPTS = int(os.getenv("WRITE_BEHIND_MAX_ATTEMPTS", "5"))
+
+Handler = Callable[[List[Dict[str, Any]]], None]
+
+
+class WriteBehind:
+    """Fila limitada com worker em thread, lotes por tipo e spill em disco."""
+
+    def __init__(
+        self,
+        spill_dir: str = WRITE_BEHIND_SPILL_DIR,
+        max_queue: int = WRITE_BEHIND_QUEUE_SIZE,
+        batch_size: int = WRITE_BEHIND_BATCH_SIZE,
+        linger: float = WRITE_BEHIND_LINGER_SECONDS,
+        retry_interval: float = WRITE_BEHIND_RETRY_SECONDS,
+        max_attempts: int = WRITE_BEHIND_MAX_ATTEMPTS,
+    ) -> None:
+        self.spill_dir = spill_dir
+        self.max_attempts = max_attempts
+        self.batch_size = batch_size
+        self.linger = linger
+        self.retry_interval = retry_interval
+        self.stats: Dict[str, int] = defaultdict(int)
+        self._queue: "queue.Queue[Tuple[str, Dict[str, Any]]]" = queue.Queue(max_queue)
+        self._handlers: Dict[str, Handler] = {}
+        self._spill_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._last_replay = 0.0
+
+    def register(self, kind: str, handler: Handler) -> None:
+        self._handlers[kind] = handler
+
+    def submit(self, kind: str, payload: Dict[str, Any]) -> None:
+        """Enfileira sem bloquear; com a fila cheia o item vai direto para o disco."""
+        self._ensure_started()
+        try:
+            self._queue.put_nowait((kind, payload))
+            self.stats["submitted"] += 1
+        except queue.Full:
+            logger.warning("[write-behind] fila cheia, spill kind=%s", kind)
+            self._spill(kind, [payload])
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Espera a fila esvaziar; devolve False se o prazo acabar antes."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self._queue.unfinished_tasks:
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def close(self, timeout: float = WRITE_BEHIND_SHUTDOWN_TIMEOUT) -> None:
+        if self._thread is None:
+            return
+        if not self.flush(timeout):
+            logger.warning("[write-behind] prazo de shutdown esgotado; spill do restante")
+            self._drain_to_spill()
+        self._stop.set()
+        self._thread.join(timeout=1)
+        self._thread = None
+
+    def _ensure_started(self) -> None:
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is not None:
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+            self._thread.start()
+            atexit.register(self.close)
+
+    def _run(self) -> None:
+        # Sobras de um processo anterior (inclusive .replaying de uma queda)
+        self._replay_safely()
+        while not self._stop.is_set():
+            try:
+                self._step()
+            except Exception:
+                # Um lote ou replay com problema não pode matar o worker
+                logger.exception("[write-behind] erro inesperado no worker")
+
+    def _step(self) -> None:
+        try:
+            first = self._queue.get(timeout=self.retry_interval)
+        except queue.Empty:
+            self._replay_safely()
+            return
+
+        batch = [first]
+        deadline = time.monotonic() + self.linger
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+
+        try:
+            self._process(batch)
+        finally:
+            for _ in batch:
+                self._queue.task_done()
+
+        if time.monotonic() - self._last_replay >= self.retry_interval:
+            self._replay_safely()
+
+    def _replay_safely(self) -> None:
+        try:
+            self._replay_spilled()
+        except Exception:
+            logger.exception("[write-behind] replay falhou")
+
+    def _process(self, batch: List[Tuple[str, Dict[str, Any]]]) -> None:
+        grouped: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+        for kind, payload in batch:
+            grouped[kind].append(payload)
+        for kind, payloads in grouped.items():
+            if self._deliver(kind, payloads):
+                self.stats["written"] += len(payloads)
+            else:
+                self._spill(kind, [(1, p) for p in payloads])
+
+    def _deliver(self, kind: str, payloads: List[Dict[str, Any]]) -> bool:
+        handler = self._handlers.get(kind)
+        if handler is None:
+            logger.warning("[write-behind] sem handler kind=%s", kind)
+            return False
+        try:
+            handler(payloads)
+            self.stats["batches"] += 1
+            return True
+        except Exception as exc:
+            logger.warning("[write-behind] falha kind=%s itens=%s error=%s", kind, len(payloads), exc)
+            return False
+
+    def _spill_path(self, kind: str) -> str:
+        return os.path.join(self.spill_dir, f"{kind}.jsonl")
+
+    def _write_lines(self, path: str, records: List[Dict[str, Any]]) -> None:
+        os.makedirs(self.spill_dir, exist_ok=True)
+        with open(path, "a", encoding="utf-8") as fh:
+            for record in records:
+                fh.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+
+    def _spill(self, kind: str, items: List[Any]) -> None:
+        """Grava no disco; itens são payloads (0 tentativas) ou (tentativas, payload)."""
+        records = [
+            {"attempts": item[0], "payload": item[1]} if isinstance(item, tuple)
+            else {"attempts": 0, "payload": item}
+            for item in items
+        ]
+        with self._spill_lock:
+            try:
+                self._write_lines(self._spill_path(kind), records)
+                self.stats["spilled"] += len(records)
+            except OSError as exc:
+                logger.error("[write-behind] spill falhou kind=%s error=%s", kind, exc)
+                self.stats["dropped"] += len(records)
+
+    def _dead_letter(
+        self,
+        kind: str,
+        items: List[Tuple[int, Dict[str, Any]]],
+        corrupt: Optional[List[str]] = None,
+    ) -> None:
+        """Tira do replay os itens que esgotaram as tentativas e as linhas ilegíveis (raw)."""
+        records = [{"attempts": attempts, "payload": payload} for attempts, payload in items]
+        records += [{"raw": line} for line in corrupt or []]
+        logger.error("[write-behind] dead-letter kind=%s itens=%s", kind, len(records))
+        with self._spill_lock:
+            try:
+                self._write_lines(os.path.join(self.spill_dir, f"{kind}.dead.jsonl"), records)
+                self.stats["dead_lettered"] += len(records)
+            except OSError as exc:
+                logger.error("[write-behind] dead-letter falhou kind=%s error=%s", kind, exc)
+                self.stats["dropped"] += len(records)
+
+    def _drain_to_spill(self) -> None:
+        pending: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+        while True:
+            try:
+                kind, payload = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            pending[kind].append(payload)
+            self._queue.task_done()
+        for kind, payloads in pending.items():
+            self._spill(kind, payloads)
+
+    @staticmethod
+    def _read_spilled(path: str) -> Tuple[List[Tuple[int, Dict[str, Any]]], List[str]]:
+        """(itens, linhas ilegíveis) do arquivo; linha truncada/corrompida não para o replay."""
+        items: List[Tuple[int, Dict[str, Any]]] = []
+        corrupt: List[str] = []
+        with open(path, encoding="utf-8", errors="replace") as fh:
+            for line in fh:
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                    # Formato antigo: a linha é o próprio payload
+                    if isinstance(record, dict) and set(record) == {"attempts", "payload"}:
+                        items.append((int(record["attempts"]), record["payload"]))
+                    else:
+                        items.append((0, record))
+                except (ValueError, TypeError):
+                    corrupt.append(line.rstrip("\n"))
+        return items, corrupt
+
+    def _replay_items(
+        self, kind: str, items: List[Tuple[int, Dict[str, Any]]]
+    ) -> Tuple[List[Tuple[int, Dict[str, Any]]], List[Tuple[int, Dict[str, Any]]]]:
+        """Entrega em lotes; lote com falha vai item a item. Devolve (regravar, dead-letter)."""
+        retry: List[Tuple[int, Dict[str, Any]]] = []
+        dead: List[Tuple[int, Dict[str, Any]]] = []
+        for start in range(0, len(items), self.batch_size):
+            chunk = items[start : start + self.batch_size]
+            if self._deliver(kind, [payload for _, payload in chunk]):
+                self.stats["replayed"] += len(chunk)
+                continue
+            delivered = 0
+            for attempts, payload in chunk:
+                if self._deliver(kind, [payload]):
+                    delivered += 1
+                    self.stats["replayed"] += 1
+                elif attempts + 1 >= self.max_attempts:
+                    dead.append((attempts + 1, payload))
+                else:
+                    retry.append((attempts + 1, payload))
+            if not delivered:
+                # Nada passou: destino provavelmente fora; o resto espera a próxima rodada
+                retry.extend(items[start + self.batch_size :])
+                break
+        return retry, dead
+
+    def _replay_spilled(self) -> None:
+        """Reenvia o que foi para o disco quando o destino estava indisponível."""
+        self._last_replay = time.monotonic()
+        for kind in list(self._handlers):
+            path = self._spill_path(kind)
+            replaying = f"{path}.replaying"
+            with self._spill_lock:
+                # .replaying que sobrou de uma queda tem prioridade sobre o spill novo
+                if not os.path.exists(replaying):
+                    if not os.path.exists(path):
+                        continue
+                    os.replace(path, replaying)
+            items, corrupt = self._read_spilled(replaying)
+            retry, dead = self._replay_items(kind, items)
+            if retry:
+                self._spill(kind, retry)
+            if dead or corrupt:
+                self._dead_letter(kind, dead, corrupt)
+            # Só depois de tudo entregue ou regravado
+            os.remove(replaying)
+
+
+_default: Optional[WriteBehind] = None
+_default_lock = threading.Lock()
+
+
+def get_write_behind() -> WriteBehind:
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = WriteBehind()
+        return _default
+
+
+__all__ = ["WriteBehind", "get_write_behind"]
@@ -0,0 +1,66 @@
+"""
+Benchmark de gravação de logs no Postgres: INSERT por linha vs lote (COPY).
+
+Precisa de um Postgres local com as migrations de sql/ aplicadas
+(DATABASE_URL). As linhas de teste usam uma session_id própria e são
+removidas no final.
+
+Uso:
+    DATABASE_URL=postgresql://... python -m benchmarks.db_bench [--rows 2000]
+"""
+import argparse
+import time
+import uuid
+
+from app.utils.db import close_pools, get_connection
+from app.utils.session_logger import (
+    log_interaction,
+    log_interactions,
+    upsert_session,
+    upsert_sessions,
+)
+
+
+def _row(session_id: str, i: int) -> dict:
+    return {
+        "user_id": "bench-user",
+        "session_id": session_id,
+        "intent": "bench",
+        "request_json": {"message": f"quero cortar o cabelo {i}"},
+        "response_json": {"reply": "Claro! Qual dia você prefere?", "i": i},
+    }
+
+
+def _report(label: str, rows: int, elapsed: float) -> None:
+    print(f"{label:<34} rows={rows:<6} {elapsed * 1000:9.1f}ms {rows / elapsed:10.0f} rows/s")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=2000)
+    args = parser.parse_args()
+    session_id = f"bench-{uuid.uuid4()}"
+
+    with get_connection() as conn:
+        start = time.perf_counter()
+        for i in range(args.rows):
+            upsert_session(conn, user_identifier="bench-user", session_id=session_id)
+            log_interaction(conn, **_row(session_id, i))
+        _report("upsert_session + log_interaction", args.rows, time.perf_counter() - start)
+
+        start = time.perf_counter()
+        upsert_sessions(
+            conn,
+            [{"user_identifier": "bench-user", "session_id": session_id}] * args.rows,
+        )
+        log_interactions(conn, (_row(session_id, i) for i in range(args.rows)))
+        _report("upsert_sessions + log_interactions", args.rows, time.perf_counter() - start)
+
+        with conn.cursor() as cur:
+            cur.execute("DELETE FROM interaction_logs WHERE session_id = %s", (session_id,))
+            cur.execute("DELETE FROM svim_sessions WHERE session_id = %s", (session_id,))
+    close_pools()
+
+
+if __name__ == "__main__":
+    main()
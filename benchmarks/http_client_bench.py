@@ -0,0 +1,93 @@
+"""
+Micro-benchmark do HttpClient contra um servidor local (benchmarks.stub_server).
+
+Compara a latência por chamada de:
+- requests.request (uma conexão nova por chamada, comportamento anterior)
+- HttpClient com Session/pool (keep-alive)
+- AsyncHttpClient (httpx)
+
+Uso:
+    python -m benchmarks.http_client_bench [--calls 300]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+from typing import Callable, List
+
+import requests
+
+from benchmarks.stub_server import StubServer
+
+
+def _report(label: str, samples: List[float]) -> None:
+    samples_ms = sorted(s * 1000 for s in samples)
+    p95 = samples_ms[int(len(samples_ms) * 0.95) - 1]
+    print(
+        f"{label:<28} mean={statistics.mean(samples_ms):7.3f}ms "
+        f"p50={statistics.median(samples_ms):7.3f}ms p95={p95:7.3f}ms"
+    )
+
+
+def _measure(fn: Callable[[], object], calls: int) -> List[float]:
+    samples = []
+    for _ in range(calls):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+async def _measure_async(client, calls: int) -> List[float]:
+    samples = []
+    for _ in range(calls):
+        start = time.perf_counter()
+        await client.get("/servicos", params={"page": 1, "pageSize": 50})
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--calls", type=int, default=300)
+    args = parser.parse_args()
+
+    with StubServer() as stub:
+        os.environ["URL_BASE"] = stub.url
+        from app.utils.http_client import AsyncHttpClient, HttpClient
+
+        url = f"{stub.url}/servicos"
+        _report(
+            "requests.request (antes)",
+            _measure(
+                lambda: requests.request(
+                    "GET", url, params={"page": 1, "pageSize": 50}, timeout=10
+                ).json(),
+                args.calls,
+            ),
+        )
+
+        client = HttpClient()
+        _report(
+            "HttpClient pooled (depois)",
+            _measure(
+                lambda: client.get("/servicos", params={"page": 1, "pageSize": 50}),
+                args.calls,
+            ),
+        )
+        client.close()
+
+        async def _run_async() -> List[float]:
+            async_client = AsyncHttpClient()
+            try:
+                return await _measure_async(async_client, args.calls)
+            finally:
+                await async_client.aclose()
+
+        _report("AsyncHttpClient (httpx)", asyncio.run(_run_async()))
+        print(f"upstream calls: {dict(stub.calls)}")
+
+
+if __name__ == "__main__":
+    main()
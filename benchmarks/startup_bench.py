@@ -0,0 +1,168 @@
+"""
+Benchmark de cold start do agente (um container/processo por mensagem).
+
+Mede, em processos Python novos:
+- o relatório `python -X importtime` de `import app.agent.main` (maiores módulos)
+- o tempo de import e o tempo até o fim do primeiro `graph.ainvoke`, com a
+  API da OpenAI e da Trinks servidas por benchmarks.stub_server
+
+e compara com o orçamento em benchmarks/startup_budget.json. Sai com código 1
+se algum limite for ultrapassado ou se um módulo pesado proibido for
+importado no import do entrypoint.
+
+Uso:
+    python -m benchmarks.startup_bench [--runs 3] [--top 15]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from typing import Any, Dict, List, Tuple
+
+from benchmarks.stub_server import StubServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BUDGET_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "startup_budget.json")
+
+_CHILD = """
+import time
+_t0 = time.perf_counter()
+import asyncio, json, sys
+import app.agent.main as entry
+_imported = time.perf_counter()
+heavy = [m for m in {forbidden!r} if m in sys.modules]
+asyncio.run(entry.run_turn("oi", client_id="bench", session_id="bench"))
+_done = time.perf_counter()
+print(json.dumps({{
+    "import_ms": (_imported - _t0) * 1000,
+    "first_invoke_ms": (_done - _t0) * 1000,
+    "heavy_on_import": heavy,
+}}))
+"""
+
+
+def _chat_completion(method: str, path: str, params: Dict[str, Any]) -> Dict[str, Any]:
+    if path.endswith("/chat/completions"):
+        return {
+            "id": "chatcmpl-bench",
+            "object": "chat.completion",
+            "created": 0,
+            "model": "gpt-4.1",
+            "choices": [
+                {
+                    "index": 0,
+                    "message": {"role": "assistant", "content": "Oi! Como posso ajudar? 😊"},
+                    "finish_reason": "stop",
+                }
+            ],
+            "usage": {"prompt_tokens": 10, "completion_tokens": 8, "total_tokens": 18},
+        }
+    return {"data": [], "total": 0}
+
+
+def child_env(stub_url: str) -> Dict[str, str]:
+    env = dict(os.environ)
+    env.update(
+        {
+            "PYTHONPATH": ROOT,
+            "OPENAI_API_KEY": "sk-bench",
+            "OPENAI_BASE_URL": stub_url,
+            "OPENAI_API_BASE": stub_url,
+            "URL_BASE": stub_url,
+            "CHECKPOINTER": "memory",
+            "QDRANT_URL": "",
+            "DATABASE_URL": "",
+            "LANGSMITH_TRACING": "false",
+            "LANGCHAIN_TRACING_V2": "false",
+        }
+    )
+    return env
+
+
+def import_report(env: Dict[str, str], top: int) -> Tuple[int, List[Tuple[int, str]]]:
+    """(tempo cumulativo em µs de app.agent.main, maiores módulos por tempo cumulativo)."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app.agent.main"],
+        cwd=ROOT,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    rows: List[Tuple[int, str]] = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = (part.strip() for part in line[len("import time:"):].split("|"))
+        if cumulative.isdigit():
+            rows.append((int(cumulative), name))
+    total = next((us for us, name in rows if name == "app.agent.main"), 0)
+    modules = sorted(
+        ((us, name) for us, name in rows if not name.startswith("app.")), reverse=True
+    )
+    return total, modules[:top]
+
+
+def first_invoke(env: Dict[str, str], forbidden: List[str]) -> Dict[str, Any]:
+    start = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-c", _CHILD.format(forbidden=forbidden)],
+        cwd=ROOT,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    result["process_ms"] = (time.perf_counter() - start) * 1000
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    with open(BUDGET_PATH, encoding="utf-8") as fh:
+        budget = json.load(fh)
+    forbidden = budget.get("forbidden_on_import", [])
+
+    with StubServer(_chat_completion) as stub:
+        env = child_env(stub.url)
+
+        total_us, modules = import_report(env, args.top)
+        print(f"import app.agent.main (importtime): {total_us / 1000:.1f}ms")
+        for us, name in modules:
+            print(f"  {us / 1000:8.1f}ms  {name}")
+
+        runs = [first_invoke(env, forbidden) for _ in range(args.runs)]
+
+    measured = {
+        key: statistics.median(r[key] for r in runs)
+        for key in ("import_ms", "first_invoke_ms", "process_ms")
+    }
+    heavy = sorted({m for r in runs for m in r["heavy_on_import"]})
+
+    failures = []
+    print(f"\nmediana de {args.runs} processos:")
+    for key, value in measured.items():
+        limit = budget.get(key)
+        status = "" if limit is None else ("ok" if value <= limit else "ACIMA DO ORÇAMENTO")
+        if limit is not None and value > limit:
+            failures.append(key)
+        limit_txt = "" if limit is None else f" (orçamento {limit}ms) {status}"
+        print(f"{key:<16} {value:8.1f}ms{limit_txt}")
+    if heavy:
+        failures.append("forbidden_on_import")
+        print(f"módulos pesados importados no import: {', '.join(heavy)}")
+
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Servidor HTTP local que imita a API da Trinks para benchmarks e testes.
+
+Responde JSON a qualquer GET/POST, com HTTP/1.1 keep-alive, e conta quantas
+requisições recebeu por caminho (e de quantas conexões distintas).
+"""
+import json
+import threading
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Optional
+from urllib.parse import parse_qs, urlparse
+
+
+Responder = Callable[[str, str, Dict[str, Any]], Dict[str, Any]]
+
+
+def _default_responder(method: str, path: str, params: Dict[str, Any]) -> Dict[str, Any]:
+    return {"data": [{"id": i, "nome": f"Item {i}"} for i in range(20)], "total": 20}
+
+
+class StubServer:
+    """Sobe um ThreadingHTTPServer em uma porta livre de 127.0.0.1."""
+
+    def __init__(self, responder: Optional[Responder] = None, delay: float = 0.0) -> None:
+        self.responder = responder or _default_responder
+        self.delay = delay
+        self.calls: Counter[str] = Counter()
+        self.peers: set[tuple] = set()
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _handler_class(self) -> type:
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def _respond(self) -> None:
+                parsed = urlparse(self.path)
+                params = {k: v[-1] for k, v in parse_qs(parsed.query).items()}
+                length = int(self.headers.get("Content-Length") or 0)
+                if length:
+                    self.rfile.read(length)
+                with stub._lock:
+                    stub.calls[parsed.path] += 1
+                    stub.peers.add(self.client_address)
+                if stub.delay:
+                    threading.Event().wait(stub.delay)
+                body = json.dumps(stub.responder(self.command, parsed.path, params)).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            do_GET = _respond
+            do_POST = _respond
+
+            def log_message(self, format: str, *args: Any) -> None:
+                pass
+
+        return Handler
+
+    def __enter__(self) -> "StubServer":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self._server.shutdown()
+        self._server.server_close()
@@ -0,0 +1,55 @@
+"""
+Comparação de tokens: respostas de ferramentas em JSON de objetos vs. tabela.
+
+Usa o catálogo real em tests/fixtures/servicos.json, compactado como
+listar_servicos_tool o devolve ao modelo, e conta com o mesmo TokenCounter do
+orçamento de contexto (tiktoken; sem o encoding, estimativa por caracteres).
+
+Uso:
+    python -m benchmarks.tool_result_tokens
+"""
+import json
+import os
+from typing import Any, Dict, List, Tuple
+
+from app.agent.tabular import tabulate_payload
+from app.agent.tools import _compact_response, _compact_service
+from app.utils.token_budget import TokenCounter
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURE = os.path.join(ROOT, "tests", "fixtures", "servicos.json")
+
+
+def _dumps(payload: Any) -> str:
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":"))
+
+
+def compare(counter: TokenCounter) -> List[Tuple[str, int, int]]:
+    """(caso, tokens em JSON de objetos, tokens em tabela) para o fixture do catálogo."""
+    with open(FIXTURE, encoding="utf-8") as fh:
+        catalog: Dict[str, Any] = json.load(fh)
+
+    cases = {
+        "servicos": lambda item: _compact_service(item),
+        "servicos+valor": lambda item: _compact_service(item, include_valor=True),
+    }
+    rows = []
+    for name, mapper in cases.items():
+        payload = _compact_response(catalog, mapper)
+        rows.append(
+            (name, counter.count(_dumps(payload)), counter.count(_dumps(tabulate_payload(payload))))
+        )
+    return rows
+
+
+def main() -> None:
+    counter = TokenCounter()
+    mode = "tiktoken" if counter.encoding is not None else "estimativa por caracteres"
+    print(f"tokens ({mode}, {counter.model})")
+    print(f"{'caso':<26} {'json':>7} {'tabela':>7} {'economia':>9}")
+    for name, as_json, as_table in compare(counter):
+        print(f"{name:<26} {as_json:>7} {as_table:>7} {1 - as_table / as_json:>8.1%}")
+
+
+if __name__ == "__main__":
+    main()
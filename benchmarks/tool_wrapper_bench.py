@@ -0,0 +1,121 @@
+"""
+Overhead por chamada do wrapper de ferramentas (graph._limit_tool_calls).
+
+Usa o catálogo de tests/fixtures/servicos.json replicado até --services itens
+(payload grande, como uma listagem sem filtro) e mede, por chamada:
+- direto: a ferramenta + serialização do ToolResult (custo inevitável)
+- invoke: o mesmo via BaseTool.invoke sem o wrapper (validação de args, callbacks)
+- wrapper (miss) / wrapper (hit): chamada via ToolCall, como o ToolNode faz
+- wrapper (str legado): ferramenta que ainda devolve JSON em texto
+- pipeline antigo: 1 json.dumps + 3 json.loads do payload, como antes do ToolResult
+
+Uso:
+    python -m benchmarks.tool_wrapper_bench [--services 2000] [--calls 200]
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import statistics
+import time
+from typing import Any, Callable, Dict, List
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-bench")
+
+from langchain_core.tools import tool  # noqa: E402
+
+from app.agent import graph as graph_module  # noqa: E402
+from app.agent.tool_result import ToolResult  # noqa: E402
+from app.agent.tools import _compact_response, _compact_service  # noqa: E402
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURE = os.path.join(ROOT, "tests", "fixtures", "servicos.json")
+
+
+def catalog_payload(size: int) -> Dict[str, Any]:
+    with open(FIXTURE, encoding="utf-8") as fh:
+        services = json.load(fh)["data"]
+    data = [
+        {**services[i % len(services)], "id": 10_000_000 + i} for i in range(size)
+    ]
+    return _compact_response({"data": data, "total": size}, _compact_service)
+
+
+def _timed(fn: Callable[[int], Any], calls: int) -> float:
+    """Mediana em µs por chamada."""
+    samples: List[float] = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for i in range(calls):
+            start = time.perf_counter()
+            fn(i)
+            samples.append((time.perf_counter() - start) * 1e6)
+    return statistics.median(samples)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--services", type=int, default=2000)
+    parser.add_argument("--calls", type=int, default=200)
+    args = parser.parse_args()
+
+    payload = catalog_payload(args.services)
+    text = json.dumps(payload, ensure_ascii=False, separators=(",", ":"))
+
+    def listar_servicos_tool(nome: str) -> ToolResult:
+        """Lista serviços (bench)."""
+        return ToolResult(payload, "listar_servicos_tool")
+
+    def listar_servicos_legado_tool(nome: str) -> str:
+        """Lista serviços em JSON (bench)."""
+        return text
+
+    plain = tool(listar_servicos_tool)
+    typed = graph_module._limit_tool_calls(tool(listar_servicos_tool))
+    legacy = graph_module._limit_tool_calls(tool(listar_servicos_legado_tool))
+
+    def _call(wrapped: Any, name: str, thread: str, nome: str) -> Any:
+        return wrapped.invoke(
+            {"name": name, "args": {"nome": nome}, "id": "bench", "type": "tool_call"},
+            config={"configurable": {"thread_id": thread}},
+        )
+
+    def direct(i: int) -> Any:
+        return listar_servicos_tool(f"s{i}").content
+
+    def plain_invoke(i: int) -> Any:
+        return plain.invoke({"nome": f"s{i}"}).content
+
+    def typed_miss(i: int) -> Any:
+        return _call(typed, typed.name, f"bench-miss-{i}", f"s{i}")
+
+    def typed_hit(i: int) -> Any:
+        return _call(typed, typed.name, "bench-hit", "mesmo")
+
+    def legacy_miss(i: int) -> Any:
+        return _call(legacy, legacy.name, f"bench-legacy-{i}", f"s{i}")
+
+    def old_pipeline(i: int) -> Any:
+        raw = json.dumps(payload, ensure_ascii=False, separators=(",", ":"))
+        for _ in range(3):  # _is_error_response, _store_ids, cache
+            json.loads(raw)
+        return raw
+
+    results = {
+        "direto": _timed(direct, args.calls),
+        "invoke": _timed(plain_invoke, args.calls),
+        "wrapper (miss)": _timed(typed_miss, args.calls),
+        "wrapper (hit)": _timed(typed_hit, args.calls),
+        "wrapper (str legado)": _timed(legacy_miss, args.calls),
+        "pipeline antigo": _timed(old_pipeline, args.calls),
+    }
+    graph_module._tool_state.clear()
+
+    print(f"payload: {args.services} serviços, {len(text) / 1024:.0f} KiB; mediana de {args.calls} chamadas")
+    for name, us in results.items():
+        print(f"{name:<22} {us:10.1f}µs")
+    print(f"{'overhead do wrapper':<22} {results['wrapper (miss)'] - results['invoke']:10.1f}µs")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Testes do motor de disponibilidade (sem chamadas externas).
+"""
+from datetime import datetime
+
+from app.agent.availability import BRAZIL_TZ, busy_intervals, free_slots, suggest_slots
+
+# Segunda-feira, antes da abertura (14h)
+NOW = datetime(2025, 12, 15, 13, 0, tzinfo=BRAZIL_TZ)
+
+AGENDAMENTOS = [
+  {"id": 1, "dataHoraInicio": "2025-12-15T14:00:00", "dataHoraFim": "2025-12-15T15:00:00",
+   "profissional": {"id": 1, "nome": "Ana"}},
+  {"id": 2, "dataHoraInicio": "2025-12-15T15:00:00", "duracaoEmMinutos": 30,
+   "profissional": {"id": 1, "nome": "Ana"}},
+  {"id": 3, "dataHoraInicio": "2025-12-15T15:30:00", "duracaoEmMinutos": 60,
+   "status": "Cancelado", "profissional": {"id": 1, "nome": "Ana"}},
+]
+
+
+class FakeProfessionalIndex:
+  """Ana (1) e Bia (2) fazem Corte (10); Carla (3) só Manicure (12)."""
+
+  def lookup(self, servico_id):
+    return {"10": [{"id": 1, "nome": "Ana"}, {"id": 2, "nome": "Bia"}], "12": [{"id": 3, "nome": "Carla"}]}.get(
+      str(servico_id), []
+    )
+
+
+def _starts(slots):
+  return [s[0].strftime("%d %H:%M") for s in slots]
+
+
+def test_busy_intervals_merge_and_skip_cancelled():
+  busy = busy_intervals(AGENDAMENTOS)
+  assert list(busy) == ["1"]
+  assert [(a.strftime("%H:%M"), b.strftime("%H:%M")) for a, b in busy["1"]] == [("14:00", "15:30")]
+
+
+def test_free_slots_skip_bookings():
+  busy = busy_intervals(AGENDAMENTOS)["1"]
+  slots = free_slots(busy, duration=60, start=NOW, limit=3)
+  assert _starts(slots) == ["15 15:30", "15 16:00", "15 16:30"]
+
+
+def test_free_slots_respect_closing_time_and_roll_to_next_day():
+  sunday_evening = datetime(2025, 12, 21, 19, 30, tzinfo=BRAZIL_TZ)
+  slots = free_slots([], duration=60, start=sunday_evening, limit=1)
+  assert _starts(slots) == ["22 14:00"]
+
+
+def test_suggest_slots_merges_professionals_by_time():
+  profissionais = [{"id": 1, "nome": "Ana"}, {"id": 2, "nome": "Bia"}]
+  slots = suggest_slots(AGENDAMENTOS, profissionais, duration=60, limit=4, now=NOW)
+  assert [(s["profissionalId"], s["dataHoraInicio"]) for s in slots] == [
+    ("2", "2025-12-15T14:00:00"),
+    ("2", "2025-12-15T14:30:00"),
+    ("2", "2025-12-15T15:00:00"),
+    ("1", "2025-12-15T15:30:00"),
+  ]
+  assert slots[0]["dataHoraFim"] == "2025-12-15T15:00:00"
+  assert slots[0]["profissional"] == "Bia"
+
+
+def test_sugerir_horarios_rejects_professional_outside_the_service(monkeypatch):
+  from app.agent import tools
+
+  monkeypatch.setattr(tools, "get_professional_index", lambda: FakeProfessionalIndex())
+  monkeypatch.setattr(tools, "_fetch_agendamentos", lambda inicio, fim: [])
+  monkeypatch.setattr(tools, "_find_service", lambda servicoId: None)
+
+  invented = tools.sugerir_horarios_tool.invoke({"servicoId": "10", "profissionalId": "999", "duracaoEmMinutos": 30})
+  assert invented.is_error and invented.payload["error"] == "PROFISSIONAL_ID_INVALIDO"
+  assert invented.ids("profissionalId") == set()
+
+  # Carla (3) existe, mas não faz Corte (10)
+  other = tools.sugerir_horarios_tool.invoke({"servicoId": "10", "profissionalId": "3", "duracaoEmMinutos": 30})
+  assert other.payload["error"] == "PROFISSIONAL_ID_INVALIDO"
+
+  ok = tools.sugerir_horarios_tool.invoke({"servicoId": "10", "profissionalId": "2", "duracaoEmMinutos": 30})
+  slots = ok.payload["data"]
+  assert slots and {str(s["profissionalId"]) for s in slots} == {"2"}
+
+
+def test_sugerir_horarios_fetches_bookings_from_the_start_of_the_day(monkeypatch):
+  from app.agent import tools
+
+  windows = []
+
+  def fake_fetch(inicio, fim):
+    windows.append((inicio, fim))
+    return []
+
+  monkeypatch.setattr(tools, "get_professional_index", lambda: FakeProfessionalIndex())
+  monkeypatch.setattr(tools, "_fetch_agendamentos", fake_fetch)
+  monkeypatch.setattr(tools, "_find_service", lambda servicoId: None)
+
+  tools.sugerir_horarios_tool.invoke({"servicoId": "10", "duracaoEmMinutos": 30})
+  tools.sugerir_horarios_tool.invoke({"servicoId": "10", "duracaoEmMinutos": 30, "dataInicio": "2099-03-10T16:00:00"})
+
+  today = datetime.now(BRAZIL_TZ).strftime("%Y-%m-%d")
+  assert windows[0][0] == f"{today}T00:00:00"
+  assert windows[1] == ("2099-03-10T00:00:00", "2099-03-17T16:00:00")
@@ -0,0 +1,100 @@
+"""
+Testes do cache compartilhado do catálogo.
+"""
+import time
+
+from app.agent.catalog import CatalogCache, catalog_key
+
+
+class _Clock:
+  def __init__(self):
+    self.now = 1_000.0
+
+  def __call__(self):
+    return self.now
+
+
+def _wait_for(predicate, timeout=2.0):
+  deadline = time.time() + timeout
+  while time.time() < deadline:
+    if predicate():
+      return True
+    time.sleep(0.01)
+  return False
+
+
+def test_catalog_key_is_order_independent_and_skips_none():
+  assert catalog_key("/servicos", {"pageSize": 50, "page": 1, "nome": None}) == (
+    "/servicos?page=1&pageSize=50"
+  )
+
+
+def test_fresh_hit_does_not_call_loader(tmp_path):
+  clock = _Clock()
+  cache = CatalogCache("1", path=str(tmp_path / "c.json.gz"), ttl=60, stale_ttl=60, clock=clock)
+  calls = []
+  loader = lambda: calls.append(1) or {"data": [len(calls)]}
+
+  assert cache.get("/servicos", loader) == {"data": [1]}
+  clock.now += 30
+  assert cache.get("/servicos", loader) == {"data": [1]}
+  assert len(calls) == 1
+
+
+def test_stale_value_is_served_while_revalidating(tmp_path):
+  clock = _Clock()
+  cache = CatalogCache("1", path=str(tmp_path / "c.json.gz"), ttl=60, stale_ttl=600, clock=clock)
+  cache.get("/servicos", lambda: {"data": ["velho"]})
+
+  clock.now += 120
+  assert cache.get("/servicos", lambda: {"data": ["novo"]}) == {"data": ["velho"]}
+  assert _wait_for(lambda: cache.peek("/servicos") == {"data": ["novo"]})
+
+
+def test_expired_value_is_loaded_synchronously(tmp_path):
+  clock = _Clock()
+  cache = CatalogCache("1", path=str(tmp_path / "c.json.gz"), ttl=60, stale_ttl=60, clock=clock)
+  cache.get("/servicos", lambda: {"data": ["velho"]})
+
+  clock.now += 500
+  assert cache.get("/servicos", lambda: {"data": ["novo"]}) == {"data": ["novo"]}
+
+
+def test_snapshot_warms_a_cold_cache(tmp_path):
+  path = str(tmp_path / "c.json.gz")
+  warm = CatalogCache("1", path=path)
+  warm.set("/profissionais", {"data": [{"id": 7}]})
+  warm.flush_snapshot()
+
+  cold = CatalogCache("1", path=path)
+  assert cold.get("/profissionais", lambda: {"data": []}) == {"data": [{"id": 7}]}
+  assert CatalogCache("2", path=path).peek("/profissionais") is None
+
+
+def test_snapshot_writes_are_batched(tmp_path, monkeypatch):
+  cache = CatalogCache("1", path=str(tmp_path / "c.json.gz"), snapshot_delay=0.05)
+  saves = []
+  original = cache.save_snapshot
+  monkeypatch.setattr(cache, "save_snapshot", lambda: saves.append(1) or original())
+
+  for i in range(50):
+    cache.set(f"/profissionais/{i}/servicos", {"data": [{"id": i}]})
+  assert _wait_for(lambda: saves)
+  time.sleep(0.1)
+  assert len(saves) == 1
+  assert CatalogCache("1", path=str(tmp_path / "c.json.gz")).peek("/profissionais/49/servicos") == {"data": [{"id": 49}]}
+
+  cache.flush_snapshot()  # nada pendente: não regrava
+  assert len(saves) == 1
+
+
+def test_error_bodies_are_not_cached(tmp_path):
+  clock = _Clock()
+  cache = CatalogCache("1", path=str(tmp_path / "c.json.gz"), ttl=60, stale_ttl=600, clock=clock)
+  assert cache.get("/servicos", lambda: {"error": "Unauthorized"}) == {"error": "Unauthorized"}
+  assert cache.peek("/servicos") is None
+
+  cache.get("/servicos", lambda: {"data": ["ok"]})
+  cache._loaders["/servicos"] = lambda: {"error": "timeout"}
+  assert not cache.refresh("/servicos")
+  assert cache.peek("/servicos") == {"data": ["ok"]}
@@ -0,0 +1,50 @@
+"""
+Testes do checkpointer durável.
+"""
+import asyncio
+
+from langchain_core.messages import AIMessage, HumanMessage
+from langgraph.graph import END, StateGraph
+from langgraph.graph.message import add_messages
+from typing_extensions import Annotated, TypedDict
+
+from app.utils.checkpointer import CompressedSerializer, create_sqlite_checkpointer
+
+
+class _State(TypedDict):
+  messages: Annotated[list, add_messages]
+
+
+def _graph(checkpointer):
+  def reply(state):
+    return {"messages": [AIMessage(content="eco " * 100 + state["messages"][-1].content)]}
+
+  builder = StateGraph(_State)
+  builder.add_node("reply", reply)
+  builder.set_entry_point("reply")
+  builder.add_edge("reply", END)
+  return builder.compile(checkpointer=checkpointer)
+
+
+def test_compressed_serializer_roundtrip_and_legacy_payloads():
+  serde = CompressedSerializer(min_bytes=16)
+  obj = {"messages": ["quero cortar o cabelo"] * 50}
+  type_, data = serde.dumps_typed(obj)
+  assert type_.startswith(("zstd:", "zlib:"))
+  assert len(data) < len(serde.inner.dumps_typed(obj)[1])
+  assert serde.loads_typed((type_, data)) == obj
+  assert serde.loads_typed(serde.inner.dumps_typed(obj)) == obj
+
+
+def test_sqlite_checkpoint_survives_a_new_process(tmp_path):
+  path = str(tmp_path / "checkpoints.sqlite")
+  config = {"configurable": {"thread_id": "s1", "checkpoint_ns": "svim"}}
+
+  async def _turn(text):
+    graph = _graph(create_sqlite_checkpointer(path))
+    return await graph.ainvoke({"messages": [HumanMessage(content=text)]}, config=config)
+
+  asyncio.run(_turn("oi"))
+  state = asyncio.run(_turn("quero cortar"))
+  assert [m.type for m in state["messages"]] == ["human", "ai", "human", "ai"]
+  assert state["messages"][0].content == "oi"
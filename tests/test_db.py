@@ -0,0 +1,68 @@
+"""
+Pool de conexões do Postgres (sem banco: ConnectionPool falso).
+"""
+import asyncio
+import threading
+import time
+
+from app.utils import db
+
+
+class FakePool:
+  created = []
+
+  def __init__(self, url, **kwargs):
+    time.sleep(0.05)  # abrir o pool demora: threads concorrentes se sobrepõem
+    self.closed = False
+    FakePool.created.append(self)
+
+  def close(self):
+    self.closed = True
+
+  async def open(self):
+    await asyncio.sleep(0.05)
+
+
+class FakeAsyncPool(FakePool):
+  async def close(self):
+    self.closed = True
+
+
+def test_concurrent_get_pool_creates_a_single_pool(monkeypatch):
+  FakePool.created = []
+  monkeypatch.setenv("DATABASE_URL", "postgresql://fake")
+  monkeypatch.setattr(db, "ConnectionPool", FakePool)
+  monkeypatch.setattr(db, "_pool", None)
+
+  barrier = threading.Barrier(6)
+  pools = []
+
+  def _worker():
+    barrier.wait()
+    pools.append(db.get_pool())
+
+  threads = [threading.Thread(target=_worker) for _ in range(6)]
+  for t in threads:
+    t.start()
+  for t in threads:
+    t.join()
+
+  assert len(FakePool.created) == 1 and all(p is FakePool.created[0] for p in pools)
+  db.close_pools()
+  assert FakePool.created[0].closed and db._pool is None
+
+
+def test_concurrent_get_async_pool_creates_a_single_pool(monkeypatch):
+  FakePool.created = []
+  monkeypatch.setenv("DATABASE_URL", "postgresql://fake")
+  monkeypatch.setattr(db, "AsyncConnectionPool", FakeAsyncPool)
+  monkeypatch.setattr(db, "_async_pool", None)
+
+  async def _run():
+    pools = await asyncio.gather(*[db.get_async_pool() for _ in range(6)])
+    await db.aclose_pools()
+    return pools
+
+  pools = asyncio.run(_run())
+  assert len(FakePool.created) == 1 and all(p is FakePool.created[0] for p in pools)
+  assert FakePool.created[0].closed and db._async_pool is None
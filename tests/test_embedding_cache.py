@@ -0,0 +1,53 @@
+"""
+Testes do cache de embeddings.
+"""
+from app.utils.embedding_cache import EmbeddingCache, embedding_key
+
+
+def test_key_depends_on_model_and_dimensions():
+  assert embedding_key("small", 1536, "oi") != embedding_key("large", 1536, "oi")
+  assert embedding_key("small", 1536, "oi") != embedding_key("small", 512, "oi")
+
+
+def test_memory_lru_and_counters():
+  cache = EmbeddingCache("m", 2, path=None, max_items=2)
+  cache.put_many(["a", "b", "c"], [[1.0, 0.0], [0.0, 1.0], [0.5, 0.5]])
+
+  assert cache.get_many(["a", "c", "c"]) == [None, [0.5, 0.5], [0.5, 0.5]]
+  assert cache.stats == {"memory_hits": 2, "disk_hits": 0, "misses": 1}
+
+
+def test_disk_tier_survives_new_process(tmp_path):
+  path = str(tmp_path / "emb.sqlite")
+  EmbeddingCache("m", 2, path=path).put_many(["quero cortar"], [[0.25, -1.5]])
+
+  cold = EmbeddingCache("m", 2, path=path)
+  assert cold.get_many(["quero cortar", "outro"]) == [[0.25, -1.5], None]
+  assert cold.stats == {"memory_hits": 0, "disk_hits": 1, "misses": 1}
+  assert cold.get_many(["quero cortar"]) == [[0.25, -1.5]]
+  assert cold.stats["memory_hits"] == 1
+  assert EmbeddingCache("outro-modelo", 2, path=path).get_many(["quero cortar"]) == [None]
+
+
+def test_disk_tier_keeps_only_the_newest_rows(tmp_path, monkeypatch):
+  from app.utils import embedding_cache
+
+  clock = iter(range(100))
+  monkeypatch.setattr(embedding_cache.time, "time", lambda: next(clock))
+  path = str(tmp_path / "emb.sqlite")
+  cache = EmbeddingCache("m", 1, path=path, max_disk_items=2)
+  for text in ["a", "b", "c"]:
+    cache.put_many([text], [[1.0]])
+
+  cold = EmbeddingCache("m", 1, path=path)
+  assert cold.get_many(["a", "b", "c"]) == [None, [1.0], [1.0]]
+
+
+def test_disk_errors_count_as_misses(tmp_path):
+  cache = EmbeddingCache("m", 1, path=str(tmp_path / "emb.sqlite"), max_items=1)
+  cache.put_many(["a", "b"], [[1.0], [2.0]])
+  cache._db.execute("DROP TABLE embeddings")
+
+  assert cache.get_many(["a", "b"]) == [None, [2.0]]
+  assert cache.stats["misses"] == 1
+  cache.put_many(["c"], [[3.0]])  # falha de escrita também não propaga
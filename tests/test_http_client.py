@@ -0,0 +1,192 @@
+"""
+Testes do cliente HTTP contra o servidor local de benchmarks.
+"""
+import asyncio
+import threading
+import time
+
+from benchmarks.stub_server import StubServer
+from app.utils.http_client import AsyncHttpClient, HttpClient
+
+
+def test_http_client_reuses_pooled_connection(monkeypatch):
+  with StubServer() as stub:
+    monkeypatch.setenv("URL_BASE", stub.url)
+    client = HttpClient(pool_size=2)
+    for _ in range(5):
+      assert client.get("/servicos", params={"page": 1})["total"] == 20
+    assert len(stub.peers) == 1
+    client.close()
+
+
+def test_async_http_client_get_and_post(monkeypatch):
+  with StubServer() as stub:
+    monkeypatch.setenv("URL_BASE", stub.url)
+
+    async def _run():
+      client = AsyncHttpClient()
+      try:
+        got = await client.get("/servicos", params={"page": 1, "nome": None})
+        posted = await client.post("/agendamentos", json={"servicoId": "1"})
+        return got, posted
+      finally:
+        await client.aclose()
+
+    got, posted = asyncio.run(_run())
+    assert got["total"] == 20
+    assert posted["total"] == 20
+    assert stub.calls == {"/servicos": 1, "/agendamentos": 1}
+
+
+class PagedResponder:
+  """Responde /agendamentos paginado e registra o pico de requisições simultâneas."""
+
+  def __init__(self, total, delay=0.05, with_total=True):
+    self.total = total
+    self.delay = delay
+    self.with_total = with_total
+    self.active = 0
+    self.peak = 0
+    self.lock = threading.Lock()
+
+  def __call__(self, method, path, params):
+    with self.lock:
+      self.active += 1
+      self.peak = max(self.peak, self.active)
+    time.sleep(self.delay)
+    with self.lock:
+      self.active -= 1
+    page, size = int(params["page"]), int(params["pageSize"])
+    ids = range((page - 1) * size, min(page * size, self.total))
+    resp = {"data": [{"id": i} for i in ids], "page": page, "pageSize": size}
+    if self.with_total:
+      resp["total"] = self.total
+    return resp
+
+
+def test_get_all_pages_fetches_remaining_pages_concurrently(monkeypatch):
+  responder = PagedResponder(total=230)
+  with StubServer(responder) as stub:
+    monkeypatch.setenv("URL_BASE", stub.url)
+    client = HttpClient(pool_size=4)
+    resp = client.get_all_pages("/agendamentos", {"dataInicio": "x"}, page_size=50, concurrency=3)
+    client.close()
+
+  assert [item["id"] for item in resp["data"]] == list(range(230))
+  assert resp["total"] == 230
+  assert stub.calls["/agendamentos"] == 5
+  assert 1 < responder.peak <= 3
+
+
+def test_get_all_pages_without_total_is_sequential(monkeypatch):
+  responder = PagedResponder(total=120, delay=0, with_total=False)
+  with StubServer(responder) as stub:
+    monkeypatch.setenv("URL_BASE", stub.url)
+    client = HttpClient()
+    resp = client.get_all_pages("/agendamentos", page_size=50)
+    client.close()
+
+  assert len(resp["data"]) == 120
+  assert stub.calls["/agendamentos"] == 3
+
+
+def test_async_get_all_pages_respects_max_pages(monkeypatch):
+  responder = PagedResponder(total=500, delay=0.01)
+  with StubServer(responder) as stub:
+    monkeypatch.setenv("URL_BASE", stub.url)
+
+    async def _run():
+      client = AsyncHttpClient()
+      try:
+        return await client.get_all_pages("/agendamentos", page_size=50, max_pages=4, concurrency=2)
+      finally:
+        await client.aclose()
+
+    resp = asyncio.run(_run())
+
+  assert len(resp["data"]) == 200
+  assert resp["total"] == 500
+  assert "message" in resp
+  assert stub.calls["/agendamentos"] == 4
+  assert responder.peak <= 2
+
+
+class SlowResponder:
+  """Responde devagar para que chamadas simultâneas se sobreponham."""
+
+  def __init__(self, delay=0.2):
+    self.delay = delay
+
+  def __call__(self, method, path, params):
+    time.sleep(self.delay)
+    return {"data": [{"id": 1, "nome": params.get("nome")}], "total": 1}
+
+
+def test_concurrent_identical_gets_share_one_request(monkeypatch):
+  with StubServer(SlowResponder()) as stub:
+    monkeypatch.setenv("URL_BASE", stub.url)
+    client = HttpClient(pool_size=8)
+    barrier = threading.Barrier(8)
+    results = []
+
+    def _worker(params):
+      barrier.wait()
+      results.append(client.get("/servicos", params))
+
+    # Mesma consulta com ordem de parâmetros e None diferentes: mesma chave
+    variants = [{"nome": "corte", "page": 1}, {"page": 1, "nome": "corte", "x": None}]
+    threads = [threading.Thread(target=_worker, args=(variants[i % 2],)) for i in range(8)]
+    for t in threads:
+      t.start()
+    for t in threads:
+      t.join()
+    coalesced = client.coalesced_requests
+    client.close()
+
+  assert stub.calls["/servicos"] == 1
+  assert len(results) == 8 and all(r == results[0] for r in results)
+  assert coalesced == 7
+
+
+def test_different_params_and_posts_are_not_coalesced(monkeypatch):
+  with StubServer(SlowResponder(delay=0.1)) as stub:
+    monkeypatch.setenv("URL_BASE", stub.url)
+    client = HttpClient(pool_size=4)
+    barrier = threading.Barrier(4)
+
+    def _worker(i):
+      barrier.wait()
+      if i < 2:
+        client.get("/servicos", {"nome": f"s{i}"})
+      else:
+        client.post("/agendamentos", json={"servicoId": "1"})
+
+    threads = [threading.Thread(target=_worker, args=(i,)) for i in range(4)]
+    for t in threads:
+      t.start()
+    for t in threads:
+      t.join()
+    client.close()
+
+  assert stub.calls == {"/servicos": 2, "/agendamentos": 2}
+
+
+def test_async_concurrent_identical_gets_share_one_request(monkeypatch):
+  with StubServer(SlowResponder(delay=0.1)) as stub:
+    monkeypatch.setenv("URL_BASE", stub.url)
+
+    async def _run():
+      client = AsyncHttpClient()
+      try:
+        results = await asyncio.gather(*[client.get("/servicos", {"nome": "corte"}) for _ in range(6)])
+        again = await client.get("/servicos", {"nome": "corte"})
+        return results, again, client.coalesced_requests
+      finally:
+        await client.aclose()
+
+    results, again, coalesced = asyncio.run(_run())
+
+  assert all(r == results[0] for r in results) and again == results[0]
+  assert coalesced == 5
+  # A chamada posterior (após a primeira terminar) faz uma nova requisição
+  assert stub.calls["/servicos"] == 2
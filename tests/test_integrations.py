@@ -5,7 +5,12 @@ from datetime import datetime, UTC
 import pytest
 
 from app.utils.db import get_connection
-from app.utils.session_logger import log_interaction, upsert_session
+from app.utils.session_logger import (
+    log_interaction,
+    log_interactions,
+    upsert_session,
+    upsert_sessions,
+)
 from app.utils.qdrant import QdrantMemory
 
 
@@ -71,6 +76,48 @@ def test_db_session_and_log_roundtrip():
             print(f"[DB] log intent={row[0]} request_msg={row[1]} response_reply={row[2]}")
 
 
+def test_db_batched_sessions_and_logs():
+    db_url = _require_any_env("DATABASE_URL", "DATABASE_URL_MAKE")
+    if not os.getenv("DATABASE_URL"):
+        os.environ["DATABASE_URL"] = db_url
+
+    session_id = f"session-{uuid.uuid4()}"
+    user_id = f"test-user-{uuid.uuid4()}"
+
+    with get_connection() as conn:
+        written = upsert_sessions(
+            conn,
+            [
+                {"user_identifier": user_id, "session_id": session_id, "status": "open"},
+                {"user_identifier": user_id, "session_id": session_id, "status": "closed"},
+            ],
+        )
+        assert written == 1, "repeated session touches were not coalesced"
+        rows = log_interactions(
+            conn,
+            [
+                {
+                    "user_id": user_id,
+                    "session_id": session_id,
+                    "intent": "batch",
+                    "request_json": {"msg": f"m{i}"},
+                    "response_json": {"reply": "ok"},
+                }
+                for i in range(3)
+            ],
+        )
+        assert rows == 3
+
+        with conn.cursor() as cur:
+            cur.execute("SELECT status FROM svim_sessions WHERE session_id = %s", (session_id,))
+            assert cur.fetchone()[0] == "closed"
+            cur.execute(
+                "SELECT count(*) FROM interaction_logs WHERE session_id = %s AND intent = 'batch'",
+                (session_id,),
+            )
+            assert cur.fetchone()[0] == 3
+
+
 def test_qdrant_memory_roundtrip():
     _require_env("QDRANT_URL")
     # API key may be optional depending on deployment
@@ -0,0 +1,77 @@
+"""
+Testes do índice serviço -> profissionais (sem chamadas externas).
+"""
+import threading
+import time
+
+from app.agent.professional_index import ProfessionalIndex
+
+PROFISSIONAIS = [{"id": 1, "nome": "Ana"}, {"id": 2, "nome": "Bia"}, {"id": 3, "nome": "Carla"}]
+SERVICOS = {
+  1: [{"id": 10, "nome": "Corte"}, {"id": 11, "nome": "Escova"}],
+  2: [{"id": 10, "nome": "Corte"}],
+  3: [{"id": 12, "nome": "Manicure"}],
+}
+
+
+class FakeCatalog:
+  def __init__(self, delay=0.0, failing=()):
+    self.delay = delay
+    self.failing = set(failing)
+    self.calls = 0
+    self.active = 0
+    self.peak = 0
+    self.lock = threading.Lock()
+
+  def professionals(self):
+    return list(PROFISSIONAIS)
+
+  def services(self, profissional_id):
+    with self.lock:
+      self.calls += 1
+      self.active += 1
+      self.peak = max(self.peak, self.active)
+    time.sleep(self.delay)
+    with self.lock:
+      self.active -= 1
+    if profissional_id in self.failing:
+      raise RuntimeError("indisponível")
+    return SERVICOS[profissional_id]
+
+
+def test_lookup_builds_once_and_answers_from_memory():
+  catalog = FakeCatalog()
+  index = ProfessionalIndex(catalog.professionals, catalog.services)
+
+  assert [p["nome"] for p in index.lookup(10)] == ["Ana", "Bia"]
+  assert [p["nome"] for p in index.lookup("12")] == ["Carla"]
+  assert index.lookup(99) == []
+  assert catalog.calls == 3
+
+
+def test_build_fans_out_concurrently():
+  catalog = FakeCatalog(delay=0.05)
+  index = ProfessionalIndex(catalog.professionals, catalog.services, concurrency=3)
+  index.build()
+  assert catalog.peak == 3
+
+
+def test_failing_professional_does_not_break_index():
+  catalog = FakeCatalog(failing={3})
+  index = ProfessionalIndex(catalog.professionals, catalog.services)
+  assert [p["nome"] for p in index.lookup(10)] == ["Ana", "Bia"]
+  assert index.lookup(12) == []
+
+
+def test_background_refresh_builds_and_rebuilds():
+  catalog = FakeCatalog()
+  index = ProfessionalIndex(catalog.professionals, catalog.services)
+  index.start_background_refresh(interval=0.05)
+  try:
+    deadline = time.time() + 2
+    while catalog.calls < 6 and time.time() < deadline:
+      time.sleep(0.01)
+  finally:
+    index.stop_background_refresh()
+  assert catalog.calls >= 6
+  assert [p["nome"] for p in index.lookup(11)] == ["Ana"]
@@ -0,0 +1,79 @@
+"""
+Layout do prompt amigável ao cache de prefixo e contabilidade de tokens em cache.
+"""
+import os
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, ToolMessage  # noqa: E402
+
+from app.agent import graph as graph_module  # noqa: E402
+
+
+def _inject(monkeypatch, messages, **state):
+  monkeypatch.setattr(graph_module, "_tool_schema_tokens", 0)
+  result = graph_module.inject_system({"messages": messages, **state})
+  return result["messages"][1:]  # sem o RemoveMessage
+
+
+def test_static_prefix_first_and_dynamic_block_before_current_message(monkeypatch):
+  messages = [
+    HumanMessage(content="oi"),
+    AIMessage(content="Olá! Como posso ajudar?"),
+    HumanMessage(content="quero cortar o cabelo"),
+  ]
+  out = _inject(monkeypatch, messages, cliente_id="42", cliente_nome="Ana", history="gosta de franja")
+
+  assert isinstance(out[0], SystemMessage) and out[0].content == graph_module.SYSTEM_PROMPT
+  assert [m.content for m in out[1:3]] == ["oi", "Olá! Como posso ajudar?"]
+  assert isinstance(out[3], SystemMessage)
+  assert "ID: 42" in out[3].content and "gosta de franja" in out[3].content
+  assert out[-1].content == "quero cortar o cabelo"
+
+
+def test_prefix_is_identical_across_clients_and_turns(monkeypatch):
+  first = _inject(monkeypatch, [HumanMessage(content="oi")], cliente_id="1", cliente_nome="Ana")
+  second = _inject(
+    monkeypatch,
+    [HumanMessage(content="oi"), AIMessage(content="Olá!"), HumanMessage(content="e amanhã?")],
+    cliente_id="2",
+    cliente_nome="Bia",
+  )
+  assert first[0].content == second[0].content
+  assert "Ana" not in graph_module.SYSTEM_PROMPT and "DATA/HORA ATUAL:" not in graph_module.SYSTEM_PROMPT
+
+
+def test_turn_usage_reports_cached_ratio():
+  messages = [
+    HumanMessage(content="antiga"),
+    AIMessage(content="x", usage_metadata={"input_tokens": 999, "output_tokens": 1, "total_tokens": 1000}),
+    HumanMessage(content="atual"),
+    AIMessage(
+      content="",
+      tool_calls=[{"name": "t", "args": {}, "id": "1"}],
+      usage_metadata={
+        "input_tokens": 1000,
+        "output_tokens": 10,
+        "total_tokens": 1010,
+        "input_token_details": {"cache_read": 768},
+      },
+    ),
+    ToolMessage(content="{}", tool_call_id="1"),
+    AIMessage(
+      content="pronto",
+      usage_metadata={
+        "input_tokens": 1000,
+        "output_tokens": 20,
+        "total_tokens": 1020,
+        "input_token_details": {"cache_read": 1000},
+      },
+    ),
+  ]
+  usage = graph_module.turn_usage(messages)
+  assert usage == {
+    "calls": 2,
+    "input_tokens": 2000,
+    "cached_tokens": 1768,
+    "output_tokens": 30,
+    "cache_ratio": 0.884,
+  }
@@ -0,0 +1,222 @@
+"""
+Testes do QdrantMemory com um cliente Qdrant em memória (sem rede).
+"""
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from app.utils.qdrant import QdrantMemory, is_trivial_message, message_point_id
+
+
+class FakeQdrantClient:
+  def __init__(self):
+    self.points = {}
+
+  def retrieve(self, collection_name, ids, with_payload=False, with_vectors=False):
+    return [SimpleNamespace(id=i) for i in ids if i in self.points]
+
+  def upsert(self, collection_name, points, wait=True):
+    for p in points:
+      self.points[str(p.id)] = p
+
+
+def _memory():
+  mem = object.__new__(QdrantMemory)
+  mem.collection_name = "test"
+  mem.embedding_model = "fake"
+  mem.client = FakeQdrantClient()
+  mem.embedded = []
+
+  def _embed(texts):
+    mem.embedded.extend(texts)
+    return [[0.0] for _ in texts]
+
+  mem._embed = _embed
+  return mem
+
+
+
+def test_store_batch_survives_bad_created_at():
+  mem = _memory()
+  mem.store_batch([
+    {"user_id": "u1", "session_id": "s1", "created_at": "ontem à tarde",
+     "messages": [{"role": "user", "content": "quero cortar o cabelo"}]},
+    {"user_id": "u2", "session_id": "s2", "created_at": "2025-01-01T12:00:00",
+     "messages": [{"role": "user", "content": "tem escova amanhã?"}]},
+  ])
+
+  created = sorted(p.payload["created_at"] for p in mem.client.points.values())
+  assert len(created) == 2
+  assert created[0] == "2025-01-01T12:00:00+00:00"
+  assert created[1] > "2025"
+
+def test_trivial_messages_are_not_admitted():
+  assert is_trivial_message("Ok!")
+  assert is_trivial_message("obrigada 😊")
+  assert is_trivial_message("👍👍")
+  assert not is_trivial_message("quero cortar o cabelo amanhã")
+
+
+def test_point_ids_are_deterministic_per_session():
+  assert message_point_id("s1", "user", "oi") == message_point_id("s1", "user", "oi")
+  assert message_point_id("s1", "user", "oi") != message_point_id("s2", "user", "oi")
+
+
+def test_store_messages_is_idempotent_and_skips_trivial():
+  mem = _memory()
+  turn = [
+    {"role": "user", "content": "quero cortar o cabelo"},
+    {"role": "assistant", "content": "Claro! Qual dia você prefere?"},
+    {"role": "user", "content": "ok"},
+  ]
+  mem.store_messages(user_id="u1", session_id="s1", messages=turn)
+  mem.store_messages(user_id="u1", session_id="s1", messages=turn)
+
+  assert len(mem.client.points) == 2
+  assert len(mem.embedded) == 2
+
+
+class FakeAsyncQdrantClient:
+  def __init__(self, search_delay=0.0):
+    self.search_delay = search_delay
+
+  async def scroll(self, collection_name, scroll_filter, with_payload, limit):
+    payloads = [
+      {"role": "user", "content": "quero cortar", "created_at": "2025-01-01T10:00:00"},
+      {"role": "assistant", "content": "Qual dia?", "created_at": "2025-01-01T10:00:01"},
+    ]
+    return [SimpleNamespace(payload=p) for p in payloads], None
+
+  async def search(self, collection_name, query_vector, limit, with_payload, query_filter):
+    await asyncio.sleep(self.search_delay)
+    return [SimpleNamespace(payload={"role": "user", "content": "prefiro a Ana"})]
+
+
+def _async_memory(search_delay):
+  mem = _memory()
+  mem._async_client = FakeAsyncQdrantClient(search_delay)
+
+  async def _aembed(texts):
+    return [[0.0] for _ in texts]
+
+  mem._aembed = _aembed
+  return mem
+
+
+def test_async_hybrid_context_merges_recent_and_semantic():
+  mem = _async_memory(search_delay=0.0)
+  ctx = asyncio.run(mem.aget_hybrid_context("s1", "u1", "corte", recent_k=2, semantic_k=1))
+  assert [m["content"] for m in ctx] == ["quero cortar", "Qual dia?", "prefiro a Ana"]
+
+
+def test_async_hybrid_context_degrades_on_deadline():
+  mem = _async_memory(search_delay=1.0)
+  ctx = asyncio.run(
+    mem.aget_hybrid_context("s1", "u1", "corte", recent_k=2, semantic_k=1, timeout=0.05)
+  )
+  assert [m["content"] for m in ctx] == ["quero cortar", "Qual dia?"]
+
+
+def test_recent_context_is_ordered_server_side_past_50_points():
+  from qdrant_client import QdrantClient
+  from app.utils.qdrant import ensure_qdrant_collection
+
+  mem = _memory()
+  mem.client = QdrantClient(":memory:")
+  mem.collection_name = "recent"
+  ensure_qdrant_collection(mem.client, "recent", vector_size=1)
+  for i in range(40):
+    mem.store_messages(
+      user_id="u1",
+      session_id="s1",
+      messages=[
+        {"role": "user", "content": f"pergunta {i}"},
+        {"role": "assistant", "content": f"resposta {i}"},
+      ],
+    )
+
+  ctx = mem.get_recent_context("s1", "u1", k=3)
+  assert [m["content"] for m in ctx] == ["resposta 38", "pergunta 39", "resposta 39"]
+
+
+def test_recent_messages_sort_by_instant_across_offsets():
+  points = [
+    # 10:30 em São Paulo = 13:30 UTC: é a mais nova, apesar do texto "menor"
+    SimpleNamespace(payload={"role": "assistant", "content": "c", "created_at": "2025-01-01T10:30:00-03:00"}),
+    SimpleNamespace(payload={"role": "user", "content": "b", "created_at": "2025-01-01T13:00:00+00:00"}),
+    SimpleNamespace(payload={"role": "user", "content": "a", "created_at": "2025-01-01T12:00:00"}),
+  ]
+  ctx = QdrantMemory._recent_messages(points, 2)
+  assert [m["content"] for m in ctx] == ["b", "c"]
+
+
+class CountingClient:
+  def __init__(self, client):
+    self.client = client
+    self.calls = []
+
+  def __getattr__(self, name):
+    attr = getattr(self.client, name)
+    if not callable(attr):
+      return attr
+
+    def _call(*args, **kwargs):
+      self.calls.append(name)
+      return attr(*args, **kwargs)
+
+    return _call
+
+
+def test_schema_migration_sets_marker_and_verification_is_one_call():
+  from qdrant_client import QdrantClient
+  from app.utils import qdrant as qdrant_module
+
+  client = CountingClient(QdrantClient(":memory:"))
+  assert not qdrant_module.qdrant_schema_is_current(client, "svim")
+
+  assert qdrant_module.migrate_qdrant_schema(client, "svim", vector_size=1)
+  assert client.calls.count("create_payload_index") == len(qdrant_module.PAYLOAD_INDEXES)
+
+  client.calls.clear()
+  assert qdrant_module.qdrant_schema_is_current(client, "svim")
+  assert client.calls == ["get_collection_aliases"]
+
+
+def test_schema_migration_replaces_older_marker(monkeypatch):
+  from qdrant_client import QdrantClient
+  from app.utils import qdrant as qdrant_module
+
+  client = QdrantClient(":memory:")
+  qdrant_module.migrate_qdrant_schema(client, "svim", vector_size=1)
+  monkeypatch.setattr(qdrant_module, "QDRANT_SCHEMA_VERSION", 2)
+  monkeypatch.setattr(
+    qdrant_module, "schema_marker", lambda name, version=2: f"{name}__schema_v{version}"
+  )
+  assert not qdrant_module.qdrant_schema_is_current(client, "svim")
+
+  qdrant_module.migrate_qdrant_schema(client, "svim", vector_size=1)
+  aliases = [a.alias_name for a in client.get_collection_aliases("svim").aliases]
+  assert aliases == ["svim__schema_v2"]
+
+
+def test_schema_migration_without_every_index_leaves_no_marker(monkeypatch):
+  from qdrant_client import QdrantClient
+  from app.utils import qdrant as qdrant_module
+  from app.utils import qdrant_migrate
+
+  class FailingIndexClient(CountingClient):
+    def create_payload_index(self, collection_name, field_name, field_schema):
+      if field_name == "created_at":
+        raise RuntimeError("timeout")
+      return self.client.create_payload_index(collection_name, field_name, field_schema)
+
+  client = FailingIndexClient(QdrantClient(":memory:"))
+  assert not qdrant_module.migrate_qdrant_schema(client, "svim", vector_size=1)
+  assert not qdrant_module.qdrant_schema_is_current(client, "svim")
+
+  monkeypatch.setattr(qdrant_migrate, "create_qdrant_client", lambda: client)
+  monkeypatch.setattr("sys.argv", ["qdrant_migrate", "--collection", "svim", "--vector-size", "1"])
+  with pytest.raises(SystemExit) as exit_info:
+    qdrant_migrate.main()
+  assert exit_info.value.code == 1
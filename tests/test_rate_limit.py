@@ -0,0 +1,211 @@
+"""
+Limitador da OpenAI: token buckets, headers x-ratelimit-*, retry com prazo e AIMD.
+"""
+import asyncio
+import time
+
+import httpx
+import pytest
+from openai import OpenAI, RateLimitError
+
+from app.utils.rate_limit import (
+  AsyncRateLimitedTransport,
+  OpenAIRateLimiter,
+  RateLimitedTransport,
+  parse_duration,
+  request_cost,
+  turn_deadline,
+)
+
+URL = "https://api.openai.com/v1/embeddings"
+BODY = {"model": "text-embedding-3-small", "input": ["oi"]}
+EMBEDDING = {"object": "list", "data": [{"object": "embedding", "index": 0, "embedding": [0.1]}],
+             "model": "text-embedding-3-small", "usage": {"prompt_tokens": 1, "total_tokens": 1}}
+
+
+class FakeClock:
+  def __init__(self):
+    self.now = 0.0
+
+  def __call__(self):
+    return self.now
+
+
+class Upstream:
+  """Handler do MockTransport que devolve as respostas em ordem (a última se repete)."""
+
+  def __init__(self, *responses):
+    self.responses = list(responses)
+    self.calls = 0
+
+  def __call__(self, request):
+    self.calls += 1
+    status, headers, body = self.responses[min(self.calls, len(self.responses)) - 1]
+    return httpx.Response(status, headers=headers, json=body)
+
+
+def _limiter(**kwargs):
+  kwargs.setdefault("rand", lambda: 0.0)
+  kwargs.setdefault("backoff_base", 0.01)
+  return OpenAIRateLimiter(**kwargs)
+
+
+def test_parse_duration_and_request_cost():
+  assert parse_duration("6m0s") == 360
+  assert parse_duration("1.5s") == 1.5
+  assert parse_duration("20ms") == pytest.approx(0.02)
+  assert parse_duration(None) is None
+
+  chat = httpx.Request("POST", URL, json={"model": "gpt-4.1", "messages": [], "max_tokens": 100})
+  model, tokens = request_cost(chat)
+  assert model == "gpt-4.1" and tokens > 100
+  assert request_cost(httpx.Request("POST", URL, json=BODY))[1] < 50
+
+
+def test_buckets_queue_by_requests_and_tokens():
+  clock = FakeClock()
+  limiter = _limiter(rpm=60, tpm=1000, clock=clock)
+  assert limiter.try_acquire("m", 10) == 0.0
+  limiter.release()
+
+  # Servidor diz que não sobrou nada: espera a reposição (1 req/s)
+  limiter.observe("m", 200, httpx.Headers({"x-ratelimit-remaining-requests": "0"}))
+  assert limiter.try_acquire("m", 10) == pytest.approx(1.0)
+  clock.now = 1.0
+  assert limiter.try_acquire("m", 10) == 0.0
+  limiter.release()
+
+  # Orçamento de tokens: 900 tokens com 1000/min restantes menos os 20 já usados
+  wait = limiter.try_acquire("m", 1000)
+  assert wait > 0 and limiter.stats()["throttled"] == 2
+
+
+def test_headers_update_limits_and_429_halves_concurrency():
+  limiter = _limiter(max_concurrency=8)
+  limiter.observe("gpt-4.1", 200, httpx.Headers({
+    "x-ratelimit-limit-requests": "5000", "x-ratelimit-limit-tokens": "800000",
+  }))
+  assert limiter.stats()["models"]["gpt-4.1"] == {"rpm": 5000, "tpm": 800000}
+
+  limiter.observe("gpt-4.1", 429, httpx.Headers())
+  limiter.observe("gpt-4.1", 429, httpx.Headers())
+  assert limiter.concurrency == 2
+  for _ in range(10):
+    limiter.observe("gpt-4.1", 200, httpx.Headers())
+  assert 2 < limiter.concurrency <= 8
+
+
+def test_backoff_prefers_server_hints_and_is_jittered():
+  limiter = OpenAIRateLimiter(backoff_base=1, backoff_max=8, rand=lambda: 0.5)
+  assert limiter.backoff(1, 429, httpx.Headers({"retry-after-ms": "200"})) == pytest.approx(0.7)
+  assert limiter.backoff(1, 429, httpx.Headers({"x-ratelimit-reset-tokens": "2s"})) == pytest.approx(2.5)
+  assert limiter.backoff(3, 503, None) == pytest.approx(3.0)  # 4s com jitter [2, 4]
+  assert limiter.backoff(10, 503, None) <= 8
+
+
+def test_retries_429_then_succeeds_through_openai_sdk():
+  upstream = Upstream((429, {"retry-after-ms": "10"}, {"error": {"message": "slow down"}}), (200, {}, EMBEDDING))
+  limiter = _limiter()
+  client = OpenAI(
+    api_key="sk-test",
+    max_retries=0,
+    http_client=httpx.Client(transport=RateLimitedTransport(limiter, httpx.MockTransport(upstream))),
+  )
+  resp = client.embeddings.create(model="text-embedding-3-small", input=["oi"])
+
+  assert resp.data[0].embedding == [0.1]
+  assert upstream.calls == 2
+  stats = limiter.stats()
+  assert stats["retries"] == 1 and stats["in_flight"] == 0
+
+
+def test_gives_up_at_turn_deadline_with_rate_limit_error():
+  upstream = Upstream((429, {"retry-after": "5"}, {"error": {"message": "slow down"}}))
+  client = OpenAI(
+    api_key="sk-test",
+    max_retries=0,
+    http_client=httpx.Client(transport=RateLimitedTransport(_limiter(), httpx.MockTransport(upstream))),
+  )
+  start = time.monotonic()
+  with turn_deadline(0.5), pytest.raises(RateLimitError):
+    client.embeddings.create(model="text-embedding-3-small", input=["oi"])
+  assert time.monotonic() - start < 0.5
+  assert upstream.calls == 1
+
+
+def test_insufficient_quota_is_not_retried():
+  upstream = Upstream((429, {}, {"error": {"code": "insufficient_quota"}}))
+  transport = RateLimitedTransport(_limiter(), httpx.MockTransport(upstream))
+  with httpx.Client(transport=transport) as client:
+    assert client.post(URL, json=BODY).status_code == 429
+  assert upstream.calls == 1
+
+
+def test_queue_briefly_instead_of_failing_when_bucket_is_empty():
+  upstream = Upstream((200, {}, EMBEDDING))
+  limiter = _limiter(rpm=600)
+  limiter.observe("text-embedding-3-small", 200, httpx.Headers({"x-ratelimit-remaining-requests": "0"}))
+  transport = RateLimitedTransport(limiter, httpx.MockTransport(upstream))
+  start = time.monotonic()
+  with turn_deadline(2), httpx.Client(transport=transport) as client:
+    assert client.post(URL, json=BODY).status_code == 200
+  assert time.monotonic() - start >= 0.08  # 10 req/s: ~0,1s na fila
+  assert limiter.stats()["throttled"] >= 1
+
+  # Sem folga no prazo: 429 local, sem chamar a API
+  limiter.observe("text-embedding-3-small", 200, httpx.Headers({"x-ratelimit-remaining-requests": "0"}))
+  with turn_deadline(0.01), httpx.Client(transport=transport) as client:
+    assert client.post(URL, json=BODY).status_code == 429
+  assert upstream.calls == 1 and limiter.stats()["rejected"] == 1
+
+
+def test_async_transport_caps_concurrency_until_streams_close():
+  limiter = _limiter(max_concurrency=2)
+  active = {"now": 0, "peak": 0}
+
+  async def handler(request):
+    active["now"] += 1
+    active["peak"] = max(active["peak"], active["now"])
+    await asyncio.sleep(0.02)
+    active["now"] -= 1
+    return httpx.Response(200, json=EMBEDDING)
+
+  async def _run():
+    transport = AsyncRateLimitedTransport(limiter, httpx.MockTransport(handler))
+    async with httpx.AsyncClient(transport=transport) as client:
+      return await asyncio.gather(*[client.post(URL, json=BODY) for _ in range(6)])
+
+  responses = asyncio.run(_run())
+  assert all(r.status_code == 200 for r in responses)
+  assert active["peak"] <= 2
+  assert limiter.stats()["in_flight"] == 0
+
+
+def test_cancelled_and_failed_requests_give_the_slot_back():
+  limiter = _limiter(max_concurrency=2)
+
+  async def slow(request):
+    await asyncio.sleep(10)
+    return httpx.Response(200, json=EMBEDDING)
+
+  async def _run():
+    transport = AsyncRateLimitedTransport(limiter, httpx.MockTransport(slow))
+    async with httpx.AsyncClient(transport=transport) as client:
+      for _ in range(3):
+        task = asyncio.ensure_future(client.post(URL, json=BODY))
+        await asyncio.sleep(0.01)
+        assert limiter.stats()["in_flight"] == 1
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+          await task
+
+  asyncio.run(_run())
+  assert limiter.stats()["in_flight"] == 0
+
+  def broken(request):
+    raise RuntimeError("bug no transport")
+
+  with httpx.Client(transport=RateLimitedTransport(limiter, httpx.MockTransport(broken))) as client:
+    with pytest.raises(RuntimeError):
+      client.post(URL, json=BODY)
+  assert limiter.stats()["in_flight"] == 0
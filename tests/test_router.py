@@ -0,0 +1,242 @@
+"""
+Roteamento do turno: intenção, modelo pequeno para turnos simples, custo e log.
+"""
+import asyncio
+import os
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+
+import pytest  # noqa: E402
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel  # noqa: E402
+from langchain_core.messages import AIMessage, HumanMessage  # noqa: E402
+from langchain_core.tools import tool  # noqa: E402
+from langgraph.checkpoint.memory import MemorySaver  # noqa: E402
+from langgraph.prebuilt import create_react_agent  # noqa: E402
+
+from app.agent import graph as graph_module  # noqa: E402
+from app.agent import main as main_module  # noqa: E402
+from app.agent import router  # noqa: E402
+
+
+class FakeModel(GenericFakeChatModel):
+  calls: int = 0
+
+  def bind_tools(self, tools, **kwargs):
+    return self
+
+  def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+    self.calls += 1
+    return super()._generate(messages, stop=stop, run_manager=run_manager, **kwargs)
+
+
+def _reply(text, model_name, input_tokens=1000, output_tokens=20):
+  return AIMessage(
+    content=text,
+    usage_metadata={"input_tokens": input_tokens, "output_tokens": output_tokens, "total_tokens": input_tokens + output_tokens},
+    response_metadata={"model_name": model_name},
+  )
+
+
+@tool
+def listar_servicos_tool(nome: str) -> str:
+  """Fake."""
+  return '{"data":[{"id":1,"nome":"Corte"}]}'
+
+
+@pytest.mark.parametrize(
+  "message, intent",
+  [
+    ("oi", router.INTENT_GREETING),
+    ("Boa tarde, tudo bem?", router.INTENT_GREETING),
+    ("obrigada!!", router.INTENT_THANKS),
+    ("valeu, até mais", router.INTENT_THANKS),
+    ("que horas vocês abrem no domingo?", router.INTENT_INFO),
+    ("oi, vocês aceitam pix?", router.INTENT_INFO),
+    ("quero agendar um corte", router.INTENT_BOOKING),
+    ("quanto custa escova?", router.INTENT_BOOKING),
+    ("tem horário amanhã às 15h?", router.INTENT_BOOKING),
+    ("sim", router.INTENT_BOOKING),
+    ("👍", router.INTENT_BOOKING),
+    # Respostas no meio do agendamento: palavras de tempo não são cumprimento
+    ("amanhã de tarde", router.INTENT_BOOKING),
+    ("amanhã", router.INTENT_BOOKING),
+    ("e amanhã?", router.INTENT_BOOKING),
+    ("de tarde", router.INTENT_BOOKING),
+    ("à noite", router.INTENT_BOOKING),
+    ("tá bom", router.INTENT_BOOKING),
+    ("ta bom, obrigada", router.INTENT_BOOKING),
+    ("bom dia", router.INTENT_GREETING),
+    ("obrigada, até amanhã", router.INTENT_THANKS),
+  ],
+)
+def test_classify_intent(message, intent):
+  assert router.classify_intent(message) == intent
+
+
+@pytest.mark.parametrize(
+  "history, booking_in_progress, route",
+  [
+    ([], False, router.ROUTE_SMALL),
+    ([HumanMessage(content="oi"), AIMessage(content="Oi! Tudo certo por aqui.")], False, router.ROUTE_SMALL),
+    ([HumanMessage(content="oi"), AIMessage(content="Oi! Qual serviço você deseja?")], False, router.ROUTE_AGENT),
+    ([], True, router.ROUTE_AGENT),
+  ],
+)
+def test_route_turn_keeps_booking_conversations_on_the_agent(history, booking_in_progress, route):
+  state = {
+    "messages": [*history, HumanMessage(content="obrigada!")],
+    "booking_in_progress": booking_in_progress,
+  }
+  result = graph_module.route_turn(state)
+  assert result["intent"] == router.INTENT_THANKS
+  assert result["route"] == route
+
+
+def test_message_cost_uses_dated_model_names_and_cache():
+  msg = _reply("x", "gpt-4.1-mini-2025-04-14", input_tokens=1000, output_tokens=100)
+  msg.usage_metadata["input_token_details"] = {"cache_read": 500}
+  # 500 * 0.40 + 500 * 0.10 + 100 * 1.60 por 1M
+  assert router.message_cost(msg) == pytest.approx(0.00041)
+  assert router.model_prices("gpt-4.1-2025-04-14") == router.MODEL_PRICES["gpt-4.1"]
+  assert router.message_cost(_reply("x", "modelo-desconhecido")) == 0.0
+
+
+def test_simple_turns_use_small_model_and_booking_uses_agent(monkeypatch):
+  logged = []
+
+  class FakeWriteBehind:
+    def submit(self, kind, payload):
+      if kind == "interaction":
+        logged.append(payload)
+
+  monkeypatch.setenv("DATABASE_URL", "postgresql://fake")
+  monkeypatch.setattr(main_module, "get_write_behind", lambda: FakeWriteBehind())
+  monkeypatch.setattr(graph_module, "_tool_schema_tokens", 0)
+  monkeypatch.setattr(graph_module, "_route_stats", router.RouteStats())
+
+  agent_model = FakeModel(messages=iter([_reply("Temos Corte! Qual dia?", "gpt-4.1-2025-04-14")]))
+  small_model = FakeModel(messages=iter([_reply("De nada! 😊", "gpt-4.1-mini-2025-04-14")]))
+  agent = create_react_agent(agent_model, tools=[listar_servicos_tool])
+  monkeypatch.setattr(
+    graph_module,
+    "_graph",
+    graph_module.build_graph(agent=agent, checkpointer=MemorySaver(), small_model=small_model),
+  )
+
+  thanks = asyncio.run(main_module.run_turn("obrigada!", client_id="1", session_id="route-1"))
+  booking = asyncio.run(main_module.run_turn("quero agendar um corte", client_id="1", session_id="route-1"))
+
+  assert (thanks["reply"], thanks["intent"], thanks["route"]) == ("De nada! 😊", "agradecimento", "small")
+  assert (booking["reply"], booking["intent"], booking["route"]) == ("Temos Corte! Qual dia?", "agendamento", "agent")
+  assert small_model.calls == 1 and agent_model.calls == 1
+  assert thanks["usage"]["cost_usd"] < booking["usage"]["cost_usd"]
+  assert [entry["intent"] for entry in logged] == ["agradecimento", "agendamento"]
+
+  stats = graph_module.route_stats()
+  assert stats["intents"] == {"agradecimento": 1, "agendamento": 1}
+  assert stats["routes"]["small"]["turns"] == 1 and stats["routes"]["agent"]["turns"] == 1
+  assert stats["routes"]["small"]["cost_usd"] == pytest.approx(thanks["usage"]["cost_usd"])
+
+
+def test_small_route_gets_the_no_tools_note_before_the_customer_message():
+  seen = []
+
+  class RecordingModel(FakeModel):
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+      seen.extend(messages)
+      return super()._generate(messages, stop=stop, run_manager=run_manager, **kwargs)
+
+  respond = graph_module._responder(RecordingModel(messages=iter([AIMessage(content="Oi!")])))
+  result = asyncio.run(respond({"messages": [HumanMessage(content="oi")]}))
+
+  assert result["messages"][0].content == "Oi!"
+  assert [m.type for m in seen] == ["system", "human"]
+  assert seen[0].content == graph_module.SMALL_ROUTE_NOTE
+
+
+def test_small_route_reply_is_streamed(monkeypatch):
+  monkeypatch.delenv("DATABASE_URL", raising=False)
+  monkeypatch.setattr(graph_module, "_tool_schema_tokens", 0)
+  agent_model = FakeModel(messages=iter([]))
+  small_model = FakeModel(messages=iter([AIMessage(content="Oi! Como posso ajudar?")]))
+  agent = create_react_agent(agent_model, tools=[listar_servicos_tool])
+  monkeypatch.setattr(
+    graph_module,
+    "_graph",
+    graph_module.build_graph(agent=agent, checkpointer=MemorySaver(), small_model=small_model),
+  )
+
+  async def _collect():
+    return [event async for event in main_module.stream_turn("oi", client_id="1", session_id="route-stream")]
+
+  events = asyncio.run(_collect())
+  deltas = [data["text"] for event, data in events if event == "delta"]
+  assert len(deltas) > 1 and "".join(deltas) == "Oi! Como posso ajudar?"
+  assert events[-1][1]["route"] == "small"
+
+
+@tool
+def criar_agendamento_tool(servicoId: str) -> str:
+  """Fake."""
+  return '{"data":{"id":99}}'
+
+
+def test_tool_calls_mark_the_session_as_booking(monkeypatch):
+  monkeypatch.delenv("DATABASE_URL", raising=False)
+  monkeypatch.setattr(graph_module, "_tool_schema_tokens", 0)
+  agent_model = FakeModel(messages=iter([
+    AIMessage(content="", tool_calls=[{"name": "listar_servicos_tool", "args": {"nome": "corte"}, "id": "c1"}]),
+    AIMessage(content="Agendado para amanhã às 15h."),
+    AIMessage(content="Por nada, até amanhã!"),
+  ]))
+  small_model = FakeModel(messages=iter([]))
+  agent = create_react_agent(agent_model, tools=[listar_servicos_tool])
+  monkeypatch.setattr(
+    graph_module,
+    "_graph",
+    graph_module.build_graph(agent=agent, checkpointer=MemorySaver(), small_model=small_model),
+  )
+
+  asyncio.run(main_module.run_turn("quero agendar um corte", client_id="1", session_id="route-booking"))
+  thanks = asyncio.run(main_module.run_turn("obrigada!", client_id="1", session_id="route-booking"))
+
+  assert thanks["intent"] == router.INTENT_THANKS and thanks["route"] == router.ROUTE_AGENT
+  assert thanks["reply"] == "Por nada, até amanhã!"
+  assert small_model.calls == 0
+
+
+@pytest.mark.parametrize(
+  "first_turn",
+  [
+    # Turno seguinte sem ferramentas: o agendamento não está mais em andamento
+    [
+      AIMessage(content="", tool_calls=[{"name": "listar_servicos_tool", "args": {"nome": "corte"}, "id": "c1"}]),
+      AIMessage(content="Temos Corte."),
+      AIMessage(content="Por nada!"),
+    ],
+    # Agendamento criado: a próxima mensagem já pode ir para o modelo pequeno
+    [
+      AIMessage(content="", tool_calls=[{"name": "criar_agendamento_tool", "args": {"servicoId": "1"}, "id": "c1"}]),
+      AIMessage(content="Agendado para amanhã às 15h."),
+    ],
+  ],
+)
+def test_booking_flag_is_cleared_after_the_booking(monkeypatch, first_turn):
+  monkeypatch.delenv("DATABASE_URL", raising=False)
+  monkeypatch.setattr(graph_module, "_tool_schema_tokens", 0)
+  agent_model = FakeModel(messages=iter(first_turn))
+  small_model = FakeModel(messages=iter([AIMessage(content="De nada! 😊")]))
+  agent = create_react_agent(agent_model, tools=[listar_servicos_tool, criar_agendamento_tool])
+  monkeypatch.setattr(
+    graph_module,
+    "_graph",
+    graph_module.build_graph(agent=agent, checkpointer=MemorySaver(), small_model=small_model),
+  )
+
+  session = f"route-clear-{first_turn[0].tool_calls[0]['name']}"
+  asyncio.run(main_module.run_turn("quero agendar um corte", client_id="1", session_id=session))
+  if len(first_turn) == 3:
+    assert asyncio.run(main_module.run_turn("obrigada!", client_id="1", session_id=session))["route"] == "agent"
+  last = asyncio.run(main_module.run_turn("valeu!", client_id="1", session_id=session))
+
+  assert last["route"] == router.ROUTE_SMALL and last["reply"] == "De nada! 😊"
@@ -0,0 +1,59 @@
+"""
+Testes do índice local de serviços.
+"""
+import json
+from pathlib import Path
+
+import pytest
+
+from app.agent.search import ServiceIndex, edit_distance, fold
+
+FIXTURES = Path(__file__).parent / "fixtures"
+
+
+@pytest.fixture(scope="module")
+def index():
+  services = json.loads((FIXTURES / "servicos.json").read_text())["data"]
+  return ServiceIndex(services)
+
+
+def _names(results, n=3):
+  return [s["nome"] for s in results[:n]]
+
+
+def test_fold_removes_accents_and_punctuation():
+  assert fold("Hidratação-Capilar!") == "hidratacao capilar"
+
+
+def test_edit_distance_is_bounded():
+  assert edit_distance("escova", "escvoa", 2) == 2
+  assert edit_distance("corte", "manicure", 2) == 3
+
+
+def test_exact_match_ranks_shortest_name_first(index):
+  assert _names(index.search("manicure"))[0] == "Manicure"
+
+
+def test_accents_and_typos(index):
+  assert _names(index.search("hidratacao"))[0] == "Hidratação Capilar"
+  assert _names(index.search("hidrataçao capilar"))[0] == "Hidratação Capilar"
+  assert "Balayage" in _names(index.search("balaiage"))
+
+
+def test_prefix_match(index):
+  assert "Escova Simples" in _names(index.search("escov"))
+
+
+def test_alias_expansion(index):
+  assert _names(index.search("cortar cabelo"))[0].startswith("Corte")
+  assert "Barba" in _names(index.search("barbear"))
+
+
+def test_categoria_filter(index):
+  results = index.search(categoria="unhas")
+  assert results and all(s["categoria"] == "Unhas" for s in results)
+  assert set(_names(index.search("gel", categoria="Unhas"), 2)) == {"Esmaltação em Gel", "Remoção de Gel"}
+
+
+def test_no_match_returns_empty(index):
+  assert index.search("tatuagem") == []
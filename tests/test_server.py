@@ -0,0 +1,66 @@
+"""
+Testes do servidor residente (sem chamadas externas).
+"""
+import asyncio
+import os
+
+import pytest
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+
+from app.agent import server  # noqa: E402
+
+
+def test_parse_payload_maps_webhook_fields():
+  payload = server._parse_payload(
+    b'{"user_id": 42, "name": "Ana", "phone": "5511", "session_id": "s1", "message": " oi "}'
+  )
+  assert payload == {
+    "message": "oi",
+    "client_id": "42",
+    "session_id": "s1",
+    "client_nome": "Ana",
+    "client_whatsapp": "5511",
+  }
+
+
+def test_parse_payload_requires_message():
+  with pytest.raises(server._BadRequest):
+    server._parse_payload(b'{"user_id": "1"}')
+
+
+@pytest.mark.parametrize("length", ["abc", "-1", "10, 10"])
+def test_invalid_content_length_is_bad_request(length):
+  async def _run():
+    reader = asyncio.StreamReader()
+    reader.feed_data(f"POST /invoke HTTP/1.1\r\nContent-Length: {length}\r\n\r\n{{}}".encode("latin-1"))
+    reader.feed_eof()
+    return await server._read_request(reader)
+
+  with pytest.raises(server._BadRequest) as exc_info:
+    asyncio.run(_run())
+  assert exc_info.value.status == 400
+
+
+def test_handle_invoke_serializes_same_session(monkeypatch):
+  active = 0
+  peak = 0
+
+  async def fake_run_turn(**kwargs):
+    nonlocal active, peak
+    active += 1
+    peak = max(peak, active)
+    await asyncio.sleep(0.01)
+    active -= 1
+    return {"reply": kwargs["message"]}
+
+  monkeypatch.setattr(server, "run_turn", fake_run_turn)
+  payload = {"message": "oi", "client_id": "1", "session_id": "s1"}
+
+  async def _run():
+    return await asyncio.gather(*(server.handle_invoke(dict(payload)) for _ in range(3)))
+
+  results = asyncio.run(_run())
+  assert [r["reply"] for r in results] == ["oi", "oi", "oi"]
+  assert peak == 1
+  assert server._session_locks == {}
@@ -0,0 +1,42 @@
+"""
+Cold start: importar o entrypoint não pode carregar SDKs pesados nem criar clientes.
+"""
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BUDGET_PATH = os.path.join(ROOT, "benchmarks", "startup_budget.json")
+
+
+def test_import_main_defers_heavy_modules():
+  with open(BUDGET_PATH, encoding="utf-8") as fh:
+    forbidden = json.load(fh)["forbidden_on_import"]
+  env = dict(os.environ, OPENAI_API_KEY="", QDRANT_URL="", DATABASE_URL="", PYTHONPATH=ROOT)
+  code = (
+    "import json, sys\n"
+    "import app.agent.main, app.agent.graph as g\n"
+    f"print(json.dumps([m for m in {forbidden!r} if m in sys.modules] + [g._model, g._graph]))\n"
+  )
+  proc = subprocess.run(
+    [sys.executable, "-c", code], cwd=ROOT, env=env, capture_output=True, text=True, check=True
+  )
+  assert json.loads(proc.stdout.strip().splitlines()[-1]) == [None, None]
+
+
+def test_graph_attribute_is_built_on_first_access(monkeypatch):
+  monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+  from app.agent import graph as graph_module
+
+  built = []
+
+  def fake_build_graph():
+    built.append(True)
+    return "compiled"
+
+  monkeypatch.setattr(graph_module, "build_graph", fake_build_graph)
+  monkeypatch.setattr(graph_module, "_graph", None)
+  assert graph_module.graph == "compiled"
+  assert graph_module.graph == "compiled"
+  assert built == [True]
@@ -0,0 +1,165 @@
+"""
+Streaming da resposta: stream_turn, rota SSE do servidor e CLI.
+"""
+import asyncio
+import io
+import json
+import os
+import re
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel  # noqa: E402
+from langchain_core.messages import AIMessage, AIMessageChunk  # noqa: E402
+from langchain_core.outputs import ChatGenerationChunk  # noqa: E402
+from langchain_core.tools import tool  # noqa: E402
+from langgraph.checkpoint.memory import MemorySaver  # noqa: E402
+from langgraph.prebuilt import create_react_agent  # noqa: E402
+
+from app.agent import cli  # noqa: E402
+from app.agent import graph as graph_module  # noqa: E402
+from app.agent import main as main_module  # noqa: E402
+from app.agent import server  # noqa: E402
+
+
+class FakeToolModel(GenericFakeChatModel):
+  """Streama o texto palavra a palavra e as tool calls como tool_call_chunks, como a OpenAI."""
+
+  def bind_tools(self, tools, **kwargs):
+    return self
+
+  def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+    message = next(self.messages)
+    pieces = [AIMessageChunk(content=token) for token in re.split(r"(\s)", message.content) if token]
+    if message.tool_calls:
+      # Texto antes das tool calls na mesma chamada, como a OpenAI pode fazer
+      pieces += [
+        AIMessageChunk(
+          content="",
+          tool_call_chunks=[
+            {"name": call["name"], "args": json.dumps(call["args"]), "id": call["id"], "index": i}
+            for i, call in enumerate(message.tool_calls)
+          ],
+        )
+      ]
+    for piece in pieces:
+      chunk = ChatGenerationChunk(message=piece)
+      if run_manager:
+        run_manager.on_llm_new_token(piece.content, chunk=chunk)
+      yield chunk
+
+
+@tool
+def listar_servicos_tool(nome: str) -> str:
+  """Fake."""
+  return '{"data":[{"id":1,"nome":"Corte"}]}'
+
+
+def _use_fake_graph(monkeypatch, replies):
+  monkeypatch.delenv("DATABASE_URL", raising=False)
+  monkeypatch.setattr(graph_module, "_tool_schema_tokens", 0)
+  agent = create_react_agent(FakeToolModel(messages=iter(replies)), tools=[listar_servicos_tool])
+  monkeypatch.setattr(
+    graph_module, "_graph", graph_module.build_graph(agent=agent, checkpointer=MemorySaver())
+  )
+
+
+async def _collect(**kwargs):
+  return [event async for event in main_module.stream_turn(**kwargs)]
+
+
+def test_stream_turn_emits_only_final_answer_text(monkeypatch):
+  _use_fake_graph(
+    monkeypatch,
+    [
+      AIMessage(content="", tool_calls=[{"name": "listar_servicos_tool", "args": {"nome": "corte"}, "id": "c1"}]),
+      AIMessage(content="Temos Corte! Qual dia fica melhor?"),
+    ],
+  )
+  events = asyncio.run(_collect(message="tem corte?", client_id="1", session_id="stream-1"))
+
+  deltas = [data["text"] for event, data in events if event == "delta"]
+  assert len(deltas) > 1
+  assert "".join(deltas) == "Temos Corte! Qual dia fica melhor?"
+  event, result = events[-1]
+  assert event == "done"
+  assert result["reply"] == "Temos Corte! Qual dia fica melhor?"
+  assert [m["type"] for m in result["messages"]][-2:] == ["tool", "ai"]
+
+
+def test_stream_turn_drops_text_of_model_calls_that_request_tools(monkeypatch):
+  _use_fake_graph(
+    monkeypatch,
+    [
+      AIMessage(
+        content="Vou verificar os serviços.",
+        tool_calls=[{"name": "listar_servicos_tool", "args": {"nome": "corte"}, "id": "c1"}],
+      ),
+      AIMessage(content="Temos Corte!"),
+    ],
+  )
+  events = asyncio.run(_collect(message="tem corte?", client_id="1", session_id="stream-pre-tool"))
+
+  deltas = [data["text"] for event, data in events if event == "delta"]
+  assert "".join(deltas) == "Temos Corte!"
+  assert events[-1][1]["reply"] == "Temos Corte!"
+
+
+def _read_chunked(raw: bytes) -> bytes:
+  head, _, rest = raw.partition(b"\r\n\r\n")
+  assert b"Transfer-Encoding: chunked" in head
+  body = b""
+  while True:
+    size_line, _, rest = rest.partition(b"\r\n")
+    size = int(size_line, 16)
+    if size == 0:
+      return body
+    body += rest[:size]
+    rest = rest[size + 2:]
+
+
+def test_server_stream_route_sends_sse_events(monkeypatch):
+  async def fake_stream_turn(**kwargs):
+    yield "delta", {"text": "Oi"}
+    yield "delta", {"text": "!"}
+    yield "done", {"reply": "Oi!"}
+
+  monkeypatch.setattr(server, "stream_turn", fake_stream_turn)
+
+  async def _run():
+    srv = await asyncio.start_server(server._handle_connection, "127.0.0.1", 0)
+    port = srv.sockets[0].getsockname()[1]
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    body = json.dumps({"message": "oi", "user_id": "1"}).encode()
+    writer.write(
+      b"POST /invoke/stream HTTP/1.1\r\nHost: x\r\nConnection: close\r\n"
+      + f"Content-Length: {len(body)}\r\n\r\n".encode()
+      + body
+    )
+    await writer.drain()
+    raw = await reader.read()
+    writer.close()
+    srv.close()
+    await srv.wait_closed()
+    return raw
+
+  events = [
+    block.split("\n")
+    for block in _read_chunked(asyncio.run(_run())).decode().strip().split("\n\n")
+  ]
+  assert [e[0] for e in events] == ["event: delta", "event: delta", "event: done"]
+  assert json.loads(events[-1][1][len("data: "):]) == {"reply": "Oi!"}
+  assert server._session_locks == {}
+
+
+def test_cli_prints_incremental_output(monkeypatch):
+  async def fake_stream_turn(message, **kwargs):
+    for piece in ("Ol", "á"):
+      yield "delta", {"text": piece}
+    yield "done", {"reply": "Olá"}
+
+  monkeypatch.setattr(cli, "stream_turn", fake_stream_turn)
+  out = io.StringIO()
+  result = asyncio.run(cli.chat("oi", out))
+  assert out.getvalue() == "Olá\n"
+  assert result == {"reply": "Olá"}
@@ -0,0 +1,79 @@
+"""
+Codificação tabular das respostas das ferramentas.
+"""
+import json
+import os
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+
+from langchain_core.tools import tool  # noqa: E402
+
+from app.agent import graph as graph_module  # noqa: E402
+from app.agent import tabular  # noqa: E402
+from app.agent import tools as tools_module  # noqa: E402
+from app.utils.token_budget import TokenCounter  # noqa: E402
+from benchmarks.tool_result_tokens import compare  # noqa: E402
+
+
+AGENDAMENTOS = [
+  {"id": 1, "dataHoraInicio": "2025-01-10T15:00:00", "servico": {"id": 7, "nome": "Corte"}},
+  {"id": 2, "dataHoraInicio": "2025-01-10T16:00:00", "status": "confirmado",
+   "profissional": {"id": 3, "nome": "Ana", "especialidades": ["cor", "corte"]}},
+]
+
+
+def test_to_table_flattens_nested_objects_and_round_trips():
+  table = tabular.to_table(AGENDAMENTOS)
+  assert table["columns"] == [
+    "id", "dataHoraInicio", "servico.id", "servico.nome", "status",
+    "profissional.id", "profissional.nome", "profissional.especialidades",
+  ]
+  assert table["rows"][0] == [1, "2025-01-10T15:00:00", 7, "Corte", None, None, None, None]
+  assert tabular.from_table(table) == AGENDAMENTOS
+
+
+def test_tabulate_payload_keeps_errors_and_metadata():
+  error = {"error": "TOOL_EXCEPTION", "data": [{"id": 1}]}
+  assert tabular.tabulate_payload(error) is error
+  assert tabular.tabulate_payload({"data": []}) == {"data": []}
+
+  out = tabular.tabulate_payload({"data": [{"id": 1, "nome": "Corte"}], "total": 1})
+  assert out == {"data": {"columns": ["id", "nome"], "rows": [[1, "Corte"]]}, "total": 1}
+
+
+def test_tool_result_is_tabular_only_for_selected_tools(monkeypatch):
+  monkeypatch.setattr(tabular, "TOOL_RESULT_TABULAR", {"listar_servicos_tool"})
+  payload = {"data": [{"id": 1, "nome": "Corte"}]}
+
+  assert tabular.is_table(json.loads(tools_module._tool_result(payload, "listar_servicos_tool").content)["data"])
+  assert json.loads(tools_module._tool_result(payload, "listar_profissionais_tool").content) == payload
+  assert json.loads(tools_module._tool_result(payload).content) == payload
+
+
+def test_store_ids_understands_tabular_results(monkeypatch):
+  monkeypatch.setattr(tabular, "TOOL_RESULT_TABULAR", {"all"})
+
+  @tool
+  def sugerir_horarios_tool(servicoId: str) -> str:
+    """Fake."""
+    return tools_module._tool_result(
+      {"data": [{"profissionalId": "3", "dataHoraInicio": "x"}, {"profissionalId": "9"}]},
+      "sugerir_horarios_tool",
+    )
+
+  wrapped = graph_module._limit_tool_calls(sugerir_horarios_tool)
+  thread = "tabular-thread"
+  graph_module._reset_tool_counts(thread)
+  message = wrapped.invoke(
+    {"name": sugerir_horarios_tool.name, "args": {"servicoId": "1"}, "id": "c1", "type": "tool_call"},
+    config={"configurable": {"thread_id": thread}},
+  )
+
+  assert tabular.is_table(json.loads(message.content)["data"])
+  assert graph_module._tool_state.peek(thread).ids["sugerir_horarios_tool"] == {3, 9}
+  graph_module._reset_tool_counts(thread)
+
+
+def test_tabular_uses_fewer_tokens_on_catalog_fixture():
+  for name, as_json, as_table in compare(TokenCounter()):
+    assert as_table < as_json * 0.8, name
@@ -0,0 +1,81 @@
+"""
+Testes do orçamento de tokens do contexto (encoding falso: um token por palavra).
+"""
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, ToolMessage
+
+from app.utils.token_budget import MESSAGE_OVERHEAD_TOKENS, ContextBudget, TokenCounter
+
+
+class WordEncoding:
+  def encode(self, text, disallowed_special=()):
+    return text.split()
+
+  def decode(self, tokens):
+    return " ".join(tokens)
+
+
+def _budget(total, tools_share=0.0, history_share=0.0):
+  return ContextBudget(
+    total=total,
+    tools_share=tools_share,
+    history_share=history_share,
+    counter=TokenCounter(encoding=WordEncoding()),
+  )
+
+
+def _words(n, prefix="w"):
+  return " ".join(f"{prefix}{i}" for i in range(n))
+
+
+def test_counter_counts_and_truncates_by_tokens():
+  counter = TokenCounter(encoding=WordEncoding())
+  assert counter.count(_words(10)) == 10
+  assert counter.truncate(_words(10), 4, mark=False) == "w0 w1 w2 w3"
+  assert counter.count(counter.truncate(_words(10), 4)) <= 4
+  assert counter.count_message(HumanMessage(content=_words(3))) == 3 + MESSAGE_OVERHEAD_TOKENS
+
+
+def test_fit_turn_keeps_newest_conversation_and_trims_history_first():
+  budget = _budget(total=100, tools_share=0.2, history_share=0.25)
+  fixed = [SystemMessage(content=_words(16))]  # 20 tokens com overhead
+  conversation = [
+    HumanMessage(content=_words(20, "old")),
+    AIMessage(content=_words(20, "reply")),
+    HumanMessage(content=_words(10, "new")),
+  ]
+  history, kept, report = budget.fit_turn(fixed, _words(50, "h"), conversation)
+
+  # 80 disponíveis: 16 de reserva para tools e 20 garantidos ao histórico -> 44 para a conversa
+  assert [m.content.split()[0] for m in kept] == ["reply0", "new0"]
+  assert report["dropped_messages"] == 1
+  assert report["fixed"] + report["tools_reserve"] + report["conversation"] + report["history"] <= 100
+  assert 20 <= report["history"] <= 80 - 16 - 38
+  assert history.startswith("h0")
+
+
+def test_fit_turn_always_keeps_last_customer_message():
+  budget = _budget(total=30)
+  fixed = [SystemMessage(content=_words(16))]
+  history, kept, report = budget.fit_turn(fixed, "", [HumanMessage(content=_words(40))])
+  assert len(kept) == 1
+  assert report["conversation"] <= 10
+  assert history == ""
+
+
+def test_fit_model_input_trims_oldest_tool_outputs():
+  budget = _budget(total=120)
+  messages = [
+    SystemMessage(content=_words(16)),
+    HumanMessage(content=_words(6)),
+    AIMessage(content="", tool_calls=[{"name": "t", "args": {}, "id": "1"}]),
+    ToolMessage(content=_words(100, "a"), tool_call_id="1"),
+    AIMessage(content="", tool_calls=[{"name": "t", "args": {}, "id": "2"}]),
+    ToolMessage(content=_words(30, "b"), tool_call_id="2"),
+  ]
+  fitted, report = budget.fit_model_input(messages)
+
+  assert report["input"] <= 120 + 1
+  assert report["trimmed_tool_messages"] == 1
+  assert fitted[5].content == messages[5].content
+  assert fitted[3].content.startswith("a0")
+  assert messages[3].content == _words(100, "a")
@@ -0,0 +1,99 @@
+"""
+Pipeline de resultado das ferramentas: ToolResult e o wrapper _limit_tool_calls.
+"""
+import asyncio
+import json
+import os
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+
+from langchain_core.tools import tool  # noqa: E402
+
+from app.agent import graph as graph_module  # noqa: E402
+from app.agent.tool_result import ToolResult  # noqa: E402
+
+
+def _call(args, call_id="c1"):
+  return {"name": "listar_servicos_tool", "args": args, "id": call_id, "type": "tool_call"}
+
+
+def _wrapped(fn):
+  return graph_module._limit_tool_calls(tool(fn))
+
+
+def test_tool_result_serializes_once_and_extracts_ids():
+  result = ToolResult({"data": [{"id": 1}, {"id": 2}, {"nome": "sem id"}]}, "listar_servicos_tool")
+  assert result.ids() == {1, 2}
+  assert result.content is result.content
+  assert json.loads(result.content)["data"][0] == {"id": 1}
+
+  parsed = ToolResult.from_content('{"error":"X"}')
+  assert parsed.is_error and parsed.ids() == set()
+  assert ToolResult.from_content("texto livre").payload is None
+
+
+def test_wrapper_does_not_parse_typed_results(monkeypatch):
+  calls = []
+
+  def listar_servicos_tool(nome: str) -> ToolResult:
+    """Fake."""
+    calls.append(nome)
+    return ToolResult({"data": [{"id": 7, "nome": "Corte"}]}, "listar_servicos_tool")
+
+  wrapped = _wrapped(listar_servicos_tool)
+  thread = "tool-result-typed"
+  config = {"configurable": {"thread_id": thread}}
+  graph_module._reset_tool_counts(thread)
+
+  def _no_loads(*args, **kwargs):
+    raise AssertionError("json.loads no caminho do ToolResult")
+
+  monkeypatch.setattr(json, "loads", _no_loads)
+  first = wrapped.invoke(_call({"nome": "corte"}), config=config)
+  cached = wrapped.invoke(_call({"nome": "corte"}, "c2"), config=config)
+  monkeypatch.undo()
+
+  assert calls == ["corte"]
+  assert first.status == "success" and first.tool_call_id == "c1"
+  assert cached.content == first.content and cached.tool_call_id == "c2"
+  assert graph_module._tool_state.peek(thread).ids["listar_servicos_tool"] == {7}
+  graph_module._reset_tool_counts(thread)
+
+
+def test_sync_and_async_paths_share_behavior():
+  def listar_servicos_tool(nome: str) -> ToolResult:
+    """Fake."""
+    if nome == "erro":
+      return ToolResult({"error": "FALHOU"}, "listar_servicos_tool")
+    return ToolResult({"data": [{"id": 1}]}, "listar_servicos_tool")
+
+  wrapped = _wrapped(listar_servicos_tool)
+  thread = "tool-result-paths"
+  config = {"configurable": {"thread_id": thread}}
+  graph_module._reset_tool_counts(thread)
+
+  sync_ok = wrapped.invoke(_call({"nome": "a"}), config=config)
+  async_ok = asyncio.run(wrapped.ainvoke(_call({"nome": "b"}), config=config))
+  assert (sync_ok.content, sync_ok.status) == (async_ok.content, async_ok.status)
+  assert graph_module._tool_state.peek(thread).count("listar_servicos_tool") == 2
+
+  async_error = asyncio.run(wrapped.ainvoke(_call({"nome": "erro"}), config=config))
+  assert async_error.status == "error"
+  assert graph_module._tool_state.peek(thread) is None
+
+
+def test_legacy_string_results_are_parsed_once_for_ids():
+  def listar_profissionais_tool(page: int = 1) -> str:
+    """Fake."""
+    return '{"data":[{"id":3},{"id":4}]}'
+
+  wrapped = _wrapped(listar_profissionais_tool)
+  thread = "tool-result-legacy"
+  graph_module._reset_tool_counts(thread)
+  message = wrapped.invoke(
+    {"name": "listar_profissionais_tool", "args": {}, "id": "c1", "type": "tool_call"},
+    config={"configurable": {"thread_id": thread}},
+  )
+  assert message.content == '{"data":[{"id":3},{"id":4}]}'
+  assert graph_module._tool_state.peek(thread).ids["listar_profissionais_tool"] == {3, 4}
+  graph_module._reset_tool_counts(thread)
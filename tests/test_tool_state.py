@@ -0,0 +1,73 @@
+"""
+Estado das ferramentas por thread: LRU, TTL, teto de memória e ids compactos.
+"""
+from app.agent.tool_result import ToolResult, id_key
+from app.agent.tool_state import ToolStateStore
+
+
+class FakeClock:
+  def __init__(self):
+    self.now = 0.0
+
+  def __call__(self):
+    return self.now
+
+
+def test_peek_does_not_create_entries():
+  store = ToolStateStore()
+  assert store.peek("t1") is None
+  assert store.stats()["threads"] == 0
+
+
+def test_lru_evicts_least_recently_used_thread():
+  store = ToolStateStore(max_threads=2)
+  store.bump("a", "tool")
+  store.bump("b", "tool")
+  store.bump("a", "tool")  # "a" passa a ser o mais recente
+  store.bump("c", "tool")
+
+  assert store.peek("b") is None
+  assert store.peek("a").count("tool") == 2
+  assert store.stats()["evictions"]["lru"] == 1
+
+
+def test_ttl_expires_idle_threads():
+  clock = FakeClock()
+  store = ToolStateStore(ttl_seconds=10, clock=clock)
+  store.bump("a", "tool")
+  clock.now = 5
+  store.bump("b", "tool")
+  clock.now = 12
+
+  assert store.peek("a") is None
+  assert store.peek("b").count("tool") == 1
+  store.bump("c", "tool")
+  assert store.stats()["evictions"]["ttl"] == 1
+
+
+def test_memory_cap_evicts_old_threads_then_current_cache():
+  big = ToolResult({"data": "x" * 4000})
+  store = ToolStateStore(max_bytes=10_000)
+  store.put_cache("a", "tool", "k", big)
+  store.put_cache("b", "tool", "k", big)
+  store.put_cache("c", "tool", "k", big)
+
+  stats = store.stats()
+  assert stats["bytes"] <= 10_000
+  assert store.peek("a") is None and store.peek("c").cached("tool", "k") is big
+  assert stats["evictions"]["memory"] >= 1
+
+  store.put_cache("c", "tool", "k2", ToolResult({"data": "y" * 20_000}))
+  assert store.peek("c").cache == {}
+  assert store.stats()["bytes"] <= 10_000
+
+
+def test_ids_are_stored_compactly_and_reset_frees_bytes():
+  store = ToolStateStore()
+  store.put_ids("a", "listar_servicos_tool", {id_key("11334606"), id_key(7), id_key("abc")})
+  state = store.peek("a")
+
+  assert state.ids["listar_servicos_tool"] == frozenset({11334606, 7, "abc"})
+  assert id_key("11334606") in state.known_ids(["listar_servicos_tool", "outra"])
+  store.reset("a")
+  assert store.stats() == {"threads": 0, "bytes": 0, "cache_entries": 0, "evictions": {"lru": 0, "ttl": 0, "memory": 0}}
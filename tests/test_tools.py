@@ -12,14 +12,14 @@ future = now + timedelta(days=3)
 
 def test_listar_profissionais_tool():
   raw = t.listar_profissionais_tool.invoke({})
-  response = json.loads(raw)
+  response = json.loads(raw.content)
   # print(response)
   assert response.get("error") is None
   assert isinstance(response.get("data"), list), "data is not an array (list)"
 
 def test_listar_servicos_profissional_tool():
   raw = t.listar_servicos_profissional_tool.invoke({"profissionalId":"664608"})
-  response = json.loads(raw)
+  response = json.loads(raw.content)
   # print(response)
   assert response.get("error") is None
 
@@ -30,7 +30,7 @@ def test_listar_servicos_tool():
     "pageSize": 100,
     "page": 1
     })
-  response = json.loads(raw)
+  response = json.loads(raw.content)
   # for service in response["data"]:
   #   print(f"{service["nome"]} -> {service["id"]}")
   assert response.get("error") is None
@@ -46,7 +46,7 @@ def test_criar_agendamento_tool():
     "observacoes": "Sem observações",
     "confirmado": False,
   })
-  response = json.loads(raw)
+  response = json.loads(raw.content)
   # print(response)
   assert response.get("error") is None
 
@@ -55,7 +55,7 @@ def test_listar_agendamentos_tool():
     "dataInicio": now.isoformat(),
     "dataFim": future.isoformat()
   })
-  response = json.loads(raw)
+  response = json.loads(raw.content)
   # print(response)
   # for agendamento in response["data"]:
   #   print(f"Cliente: {agendamento["cliente"]["nome"]} -> {agendamento["cliente"]["id"]}")
@@ -64,3 +64,23 @@ def test_listar_agendamentos_tool():
   #   print(f"Horário: {agendamento["dataHoraInicio"]} -> {agendamento["duracaoEmMinutos"]}")
   #   print(" --- ")
   assert response.get("error") is None
+
+def test_sugerir_horarios_tool():
+  raw = t.sugerir_horarios_tool.invoke({
+    "servicoId": "11334669",
+    "profissionalId": "664608",
+    "duracaoEmMinutos": 60,
+  })
+  response = json.loads(raw.content)
+  # for horario in response["data"]:
+  #   print(f"{horario["profissionalId"]} -> {horario["dataHoraInicio"]}")
+  assert response.get("error") is None
+  assert isinstance(response.get("data"), list), "data is not an array (list)"
+
+def test_listar_profissionais_servico_tool():
+  raw = t.listar_profissionais_servico_tool.invoke({"servicoId": "11334669"})
+  response = json.loads(raw.content)
+  # for profissional in response["data"]:
+  #   print(f"{profissional["nome"]} -> {profissional["id"]}")
+  assert response.get("error") is None
+  assert isinstance(response.get("data"), list), "data is not an array (list)"
@@ -0,0 +1,180 @@
+"""
+Testes do pipeline write-behind.
+"""
+import json
+import os
+
+from app.utils.write_behind import WriteBehind
+
+
+def test_items_are_batched_per_kind(tmp_path):
+  batches = []
+  wb = WriteBehind(spill_dir=str(tmp_path), linger=0.1)
+  wb.register("memory", lambda items: batches.append(("memory", items)))
+  wb.register("interaction", lambda items: batches.append(("interaction", items)))
+
+  for i in range(3):
+    wb.submit("memory", {"i": i})
+  wb.submit("interaction", {"i": 9})
+  assert wb.flush(timeout=2)
+  wb.close()
+
+  assert ("memory", [{"i": 0}, {"i": 1}, {"i": 2}]) in batches
+  assert ("interaction", [{"i": 9}]) in batches
+  assert wb.stats["written"] == 4
+
+
+def test_failures_spill_to_disk_and_are_replayed(tmp_path):
+  delivered = []
+  healthy = False
+
+  def handler(items):
+    if not healthy:
+      raise ConnectionError("postgres fora")
+    delivered.extend(items)
+
+  wb = WriteBehind(spill_dir=str(tmp_path), linger=0.0, retry_interval=0.05, max_attempts=1000)
+  wb.register("interaction", handler)
+  wb.submit("interaction", {"reply": "oi"})
+  assert wb.flush(timeout=2)
+  spilled = json.loads((tmp_path / "interaction.jsonl").read_text().splitlines()[0])
+  assert spilled["payload"] == {"reply": "oi"} and spilled["attempts"] >= 1
+
+  healthy = True
+  wb.submit("interaction", {"reply": "tudo bem?"})
+  assert wb.flush(timeout=2)
+  wb._replay_spilled()
+  wb.close()
+
+  assert sorted(d["reply"] for d in delivered) == ["oi", "tudo bem?"]
+  assert not (tmp_path / "interaction.jsonl").exists()
+
+
+def test_full_queue_spills_instead_of_blocking(tmp_path):
+  wb = WriteBehind(spill_dir=str(tmp_path), max_queue=1)
+  wb._ensure_started = lambda: None  # sem worker: a fila não esvazia
+  wb.submit("memory", {"i": 1})
+  wb.submit("memory", {"i": 2})
+  assert wb.stats["spilled"] == 1
+  assert json.loads((tmp_path / "memory.jsonl").read_text()) == {"attempts": 0, "payload": {"i": 2}}
+
+
+def test_poison_items_go_to_dead_letter_after_max_attempts(tmp_path):
+  delivered = []
+
+  def handler(items):
+    if any(item.get("bad") for item in items):
+      raise ValueError("violação de constraint")
+    delivered.extend(items)
+
+  wb = WriteBehind(spill_dir=str(tmp_path), max_attempts=2)
+  wb.register("interaction", handler)
+  wb._spill("interaction", [{"i": 1}, {"i": 2, "bad": True}, {"i": 3}])
+
+  wb._replay_spilled()
+  # O lote falhou; item a item, os bons passam e só o ruim volta ao disco
+  assert [d["i"] for d in delivered] == [1, 3]
+  assert json.loads((tmp_path / "interaction.jsonl").read_text())["attempts"] == 1
+
+  wb._replay_spilled()
+  assert not (tmp_path / "interaction.jsonl").exists()
+  dead = [json.loads(line) for line in (tmp_path / "interaction.dead.jsonl").read_text().splitlines()]
+  assert dead == [{"attempts": 2, "payload": {"i": 2, "bad": True}}]
+  assert wb.stats["dead_lettered"] == 1
+
+
+def test_outage_does_not_consume_attempts_of_untried_chunks(tmp_path):
+  def handler(items):
+    raise ConnectionError("postgres fora")
+
+  wb = WriteBehind(spill_dir=str(tmp_path), batch_size=2, max_attempts=5)
+  wb.register("interaction", handler)
+  wb._spill("interaction", [{"i": i} for i in range(5)])
+  wb._replay_spilled()
+
+  attempts = [json.loads(line)["attempts"] for line in (tmp_path / "interaction.jsonl").read_text().splitlines()]
+  assert sorted(attempts) == [0, 0, 0, 1, 1]
+
+
+def test_leftover_replaying_file_is_replayed_on_start(tmp_path):
+  delivered = []
+  # Queda entre o rename e a entrega: sobrou o .replaying (formato antigo, sem envelope)
+  (tmp_path / "memory.jsonl.replaying").write_text('{"i": 1}\n{"i": 2}\n')
+
+  wb = WriteBehind(spill_dir=str(tmp_path), retry_interval=5)
+  wb.register("memory", delivered.extend)
+  wb.submit("memory", {"i": 3})
+  assert wb.flush(timeout=2)
+  wb.close()
+
+  assert sorted(d["i"] for d in delivered) == [1, 2, 3]
+  assert not os.path.exists(tmp_path / "memory.jsonl.replaying")
+
+
+def test_corrupt_spill_line_is_dead_lettered_and_the_worker_survives(tmp_path):
+  delivered = []
+  # Processo morto no meio da escrita: última linha truncada
+  (tmp_path / "memory.jsonl.replaying").write_text('{"attempts": 0, "payload": {"i": 1}}\n{"attempts": 0, "pay\n')
+
+  wb = WriteBehind(spill_dir=str(tmp_path), retry_interval=5)
+  wb.register("memory", delivered.extend)
+  wb.submit("memory", {"i": 2})
+  assert wb.flush(timeout=2)
+  assert wb._thread.is_alive()
+  wb.close()
+
+  assert sorted(d["i"] for d in delivered) == [1, 2]
+  assert not (tmp_path / "memory.jsonl.replaying").exists()
+  dead = json.loads((tmp_path / "memory.dead.jsonl").read_text())
+  assert dead == {"raw": '{"attempts": 0, "pay'}
+
+
+def test_worker_survives_a_failing_replay(tmp_path, monkeypatch):
+  delivered = []
+  wb = WriteBehind(spill_dir=str(tmp_path), retry_interval=5)
+  wb.register("memory", delivered.extend)
+
+  def broken():
+    raise OSError("disco somiu")
+
+  monkeypatch.setattr(wb, "_replay_spilled", broken)
+  wb.submit("memory", {"i": 1})
+  assert wb.flush(timeout=2)
+  assert wb._thread.is_alive()
+  wb.close()
+  assert delivered == [{"i": 1}]
+
+
+def test_session_upsert_failure_does_not_block_interaction_logs(tmp_path, monkeypatch):
+  monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+  from app.agent import main as main_module
+
+  logged = []
+
+  class FakeConnection:
+    def __enter__(self):
+      return self
+
+    def __exit__(self, *exc):
+      return False
+
+  def failing_upsert(conn, sessions):
+    raise ValueError("violação de constraint em svim_sessions")
+
+  monkeypatch.setattr(main_module, "get_connection", FakeConnection)
+  monkeypatch.setattr(main_module, "upsert_sessions", failing_upsert)
+  monkeypatch.setattr(main_module, "log_interactions", lambda conn, rows: logged.extend(rows))
+  monkeypatch.setenv("DATABASE_URL", "postgresql://fake")
+
+  wb = WriteBehind(spill_dir=str(tmp_path), linger=0.0, retry_interval=60)
+  wb.register("session", main_module._write_sessions)
+  wb.register("interaction", main_module._write_interactions)
+  monkeypatch.setattr(main_module, "get_write_behind", lambda: wb)
+
+  main_module._turn_result({"messages": [], "intent": "saudacao"}, "oi", "1", "s-1")
+  assert wb.flush(timeout=2)
+  wb.close()
+
+  assert [row["session_id"] for row in logged] == ["s-1"]
+  assert not (tmp_path / "interaction.jsonl").exists()
+  assert json.loads((tmp_path / "session.jsonl").read_text())["payload"]["session_id"] == "s-1"